@@ -1,4 +1,5 @@
 ﻿using System;
+using System.Linq;
 
 namespace Analysis
 {
@@ -6,7 +7,11 @@ namespace Analysis
     {
         static void Main(string[] args)
         {
-            RemoveCardAnalysis rca = new RemoveCardAnalysis(args[0], args[1]);
+            // --surrogate-toml also writes the surrogate predictions as one
+            // TOML file per incomplete deck
+            bool writeSurrogateToml = args.Contains("--surrogate-toml");
+            RemoveCardAnalysis rca = new RemoveCardAnalysis(
+                args[0], args[1], writeSurrogateToml);
             rca.Run();
         }
     }
@@ -8,10 +8,11 @@ namespace Analysis
         private RemoveCardAnalysisManager _rcaManager;
         public RemoveCardAnalysis(
             string expLogDir,
-            string configFilename)
+            string configFilename,
+            bool writeSurrogateToml = false)
         {
-            _rcaManager =
-                new RemoveCardAnalysisManager(expLogDir, configFilename);
+            _rcaManager = new RemoveCardAnalysisManager(
+                expLogDir, configFilename, writeSurrogateToml);
         }
 
         public void Run()
@@ -25,7 +26,7 @@ namespace Analysis
                 _rcaManager.DispatchEvalJobsToWorkers();
                 _rcaManager.FindDoneWorkers();
                 _rcaManager.FindOvertimeWorkers();
-                Thread.Sleep(1000);
+                _rcaManager.WaitForWorkers();
             }
 
             _rcaManager.AnnounceWorkersDone();
@@ -43,11 +43,59 @@ namespace Analysis
         /// </summary>
         private const string SURR_SIM_DIR = "surrogate_sim";
 
+        /// <summary>
+        /// File of the predictions of the surrogate model, in the log
+        /// directory of the analysis.
+        /// </summary>
+        private const string SURR_SIM_FILE = "surrogate_sim.csv";
+
+        /// <summary>
+        /// Also write the predictions of the surrogate model as one TOML
+        /// file per incomplete deck in SURR_SIM_DIR.
+        /// </summary>
+        private bool writeSurrogateToml;
+
         /// <summary>
         /// All incomplete decks to run evaluations.
         /// </summary>
         private Queue<Individual> allIncompDeckInds;
 
+        /// <summary>
+        /// Incomplete decks to play more games with, dispatched before the
+        /// ones not played yet.
+        /// </summary>
+        private Queue<Individual> nextRoundInds;
+
+        /// <summary>
+        /// Parameters of the adaptive analysis, null if every incomplete
+        /// deck is played with all its games at once.
+        /// </summary>
+        private AdaptiveAnalysisParams adaptive;
+
+        /// <summary>
+        /// Maximum number of games per strategy of an incomplete deck in
+        /// the adaptive analysis.
+        /// </summary>
+        private int maxGames;
+
+        /// <summary>
+        /// Incomplete decks of every elite, by ID of the elite.
+        /// </summary>
+        private Dictionary<int, List<Individual>> incompDeckIndsByElite;
+
+        /// <summary>
+        /// Incomplete decks of every elite queued or being played, by ID of
+        /// the elite. The results of a deck not listed are those of a job
+        /// redispatched from an overtime worker that was already processed.
+        /// The next round of an elite starts once it is empty.
+        /// </summary>
+        private Dictionary<int, HashSet<Individual>> pendingIndsByElite;
+
+        /// <summary>
+        /// Results of all the games played with every incomplete deck.
+        /// </summary>
+        private Dictionary<Individual, ResultsMessage> realResults;
+
         /// <summary>
         /// Total number of evaluations
         /// </summary>
@@ -115,32 +163,85 @@ namespace Analysis
         }
 
         /// <summary>
-        /// Evaluate solution decks on surrogate model.
+        /// Evaluate the incomplete decks on the surrogate model in one
+        /// batch. The predictions are written to a single csv file in
+        /// `analysisLogDir`, one row per incomplete deck, and also to a TOML
+        /// file per deck in surrogate_sim/elite#ID/ if `writeToml` is true.
         /// </summary>
-        public static void EvaluateOnSurrogate(
-            List<string> incompleteDeck,
+        /// <returns>The predictions, one row per incomplete deck.</returns>
+        public static double[,] EvaluateOnSurrogate(
+            List<Individual> incompDeckInds,
             SurrogateBaseModel model,
-            string currSurrIndLogDir,
-            string cardRemoved)
+            string analysisLogDir,
+            bool writeToml)
         {
             // evaluate on surrogate for comparasons
-            var inCompLogIndividuals = new List<LogIndividual>();
-            var inCompLogIndividual = new LogIndividual();
-            inCompLogIndividual.Deck = String.Join("*", incompleteDeck);
-            inCompLogIndividuals.Add(inCompLogIndividual);
-            var result = model.Predict(inCompLogIndividuals);
-
-            // store result
-            var stats = new OverallStatistics();
-            stats.AverageHealthDifference = result[0, 0];
-            stats.NumTurns = result[0, 1];
-            stats.HandSize = result[0, 2];
+            int numCards = CardReader._cardSet.Count;
+            var cardCounts = new int[incompDeckInds.Count, numCards];
+            for (int i = 0; i < incompDeckInds.Count; i++)
+            {
+                int[] counts = incompDeckInds[i].GetCardCounts();
+                for (int j = 0; j < numCards; j++)
+                {
+                    cardCounts[i, j] = counts[j];
+                }
+            }
+            var result = model.Predict(cardCounts);
 
             // write result
-            string gameLogPath = System.IO.Path.Combine(
-                currSurrIndLogDir,
-                String.Format("remove_card-{0}.tml", cardRemoved));
-            Toml.WriteFile<OverallStatistics>(stats, gameLogPath);
+            System.IO.Directory.CreateDirectory(analysisLogDir);
+            string surrSimPath = System.IO.Path.Combine(
+                analysisLogDir, SURR_SIM_FILE);
+            using (var writer = new StreamWriter(surrSimPath))
+            {
+                writer.WriteLine(String.Join(",",
+                    new string[] { "Elite", "CardRemoved" }
+                    .Concat(model.model_targets)));
+                for (int i = 0; i < incompDeckInds.Count; i++)
+                {
+                    // card names may contain commas
+                    var row = new List<string>
+                    {
+                        incompDeckInds[i].ParentID.ToString(),
+                        "\"" + incompDeckInds[i].CardRemoved.Replace(
+                            "\"", "\"\"") + "\"",
+                    };
+                    for (int j = 0; j < model.model_targets.Length; j++)
+                    {
+                        row.Add(result[i, j].ToString());
+                    }
+                    writer.WriteLine(String.Join(",", row));
+                }
+            }
+
+            if (!writeToml)
+            {
+                return result;
+            }
+
+            var targetProperties = model.model_targets
+                .Select(target => typeof(OverallStatistics).GetProperty(target))
+                .ToArray();
+            for (int i = 0; i < incompDeckInds.Count; i++)
+            {
+                // store result
+                var stats = new OverallStatistics();
+                for (int j = 0; j < targetProperties.Length; j++)
+                {
+                    targetProperties[j].SetValue(stats, result[i, j]);
+                }
+
+                string currSurrIndLogDir = System.IO.Path.Combine(
+                    analysisLogDir, SURR_SIM_DIR,
+                    String.Format("elite#{0}", incompDeckInds[i].ParentID));
+                System.IO.Directory.CreateDirectory(currSurrIndLogDir);
+                string gameLogPath = System.IO.Path.Combine(
+                    currSurrIndLogDir,
+                    String.Format("remove_card-{0}.tml",
+                                  incompDeckInds[i].CardRemoved));
+                Toml.WriteFile<OverallStatistics>(stats, gameLogPath);
+            }
+            return result;
         }
 
         /// <summary>
@@ -148,9 +249,11 @@ namespace Analysis
         /// </summary>
         public RemoveCardAnalysisManager(
             string expLogDir,
-            string configFilename
+            string configFilename,
+            bool writeSurrogateToml = false
             ) : base(configFilename)
         {
+            this.writeSurrogateToml = writeSurrogateToml;
             string expConfigPath = System.IO.Path.Combine(
                            expLogDir, "experiment_config.tml");
             string indsLogPath = System.IO.Path.Combine(
@@ -190,8 +293,13 @@ namespace Analysis
             }
             model.LoadModel(modelSavePath);
 
-            // read all logged individuals
-            List<LogIndividual> inds = DataProcessor.readLogIndividuals(indsLogPath).ToList();
+            // read all logged individuals, indexed by ID. An individual may be
+            // logged several times with the same ID, the first one is used.
+            var indsByID = new Dictionary<int, LogIndividual>();
+            foreach (var ind in DataProcessor.readLogIndividuals(indsLogPath))
+            {
+                indsByID.TryAdd(ind.IndividualID, ind);
+            }
 
             // read elites
             List<string[]> rowData = DataProcessor.ReadElitesLogAsList(elitesLogPath);
@@ -205,7 +313,31 @@ namespace Analysis
                 double fitness = Convert.ToDouble(splitedData[5]);
                 int indID = Convert.ToInt32(splitedData[3]);
                 // Console.WriteLine("{0}: {1}", indID, fitness);
-                elitesToAnalyze.Add(inds.Where(ind => ind.IndividualID == indID).ToList().First());
+                elitesToAnalyze.Add(indsByID[indID]);
+            }
+
+            // the adaptive analysis plays the incomplete decks in rounds
+            adaptive = this.config.AdaptiveAnalysis;
+            nextRoundInds = new Queue<Individual>();
+            if (adaptive != null)
+            {
+                // the cache would answer the following rounds of a deck with
+                // the games of its first one
+                if (_evaluationCache != null)
+                {
+                    throw new System.ArgumentException(
+                        "The evaluation cache can not be used with the adaptive analysis");
+                }
+                maxGames = adaptive.MaxGames;
+                if (maxGames <= 0)
+                {
+                    var evalConfig = Toml.ReadFile<DeckEvaluator.Config.Configuration>(
+                        configFilename);
+                    maxGames = evalConfig.Evaluation.PlayerStrategies
+                        .Max(strat => strat.NumGames);
+                }
+                incompDeckIndsByElite = new Dictionary<int, List<Individual>>();
+                realResults = new Dictionary<Individual, ResultsMessage>();
             }
 
             // construct incomp decks
@@ -224,21 +356,16 @@ namespace Analysis
         private Queue<Individual> GenerateIncompleteDeckInds()
         {
             allIncompDeckInds = new Queue<Individual>();
+            pendingIndsByElite = new Dictionary<int, HashSet<Individual>>();
             foreach (var elite in elitesToAnalyze)
             {
                 // create directory for current elite
                 string realSimDir = System.IO.Path.Combine(
                     analysisLogDir, REAL_SIM_DIR);
-                string surrogateSimDir = System.IO.Path.Combine(
-                    analysisLogDir, SURR_SIM_DIR);
                 string currSimIndLogDir = System.IO.Path.Combine(
                     realSimDir,
                     String.Format("elite#{0}", elite.IndividualID));
-                string currSurrIndLogDir = System.IO.Path.Combine(
-                    surrogateSimDir,
-                    String.Format("elite#{0}", elite.IndividualID));
                 System.IO.Directory.CreateDirectory(currSimIndLogDir);
-                System.IO.Directory.CreateDirectory(currSurrIndLogDir);
 
                 // create and yield individuals with incomplete decks
                 List<string> deck = elite.Deck.Split("*").ToList();
@@ -253,41 +380,294 @@ namespace Analysis
                         incompDeck, CardReader._cardSet);
                     incompDeckInd.ParentID = elite.IndividualID;
                     incompDeckInd.CardRemoved = uniqueCard;
+                    // individuals are compared by ID, keep them apart
+                    incompDeckInd.ID = allIncompDeckInds.Count;
                     allIncompDeckInds.Enqueue(incompDeckInd);
 
-                    // Evaluate current incomp deck on surrogate
-                    EvaluateOnSurrogate(
-                        incompDeck,
-                        model,
-                        currSurrIndLogDir,
-                        uniqueCard);
+                    if (!pendingIndsByElite.ContainsKey(elite.IndividualID))
+                    {
+                        pendingIndsByElite[elite.IndividualID] =
+                            new HashSet<Individual>();
+                    }
+                    pendingIndsByElite[elite.IndividualID].Add(incompDeckInd);
+                }
+            }
+
+            // Evaluate all the incomplete decks on surrogate
+            var incompDeckInds = allIncompDeckInds.ToList();
+            double[,] surrResults = EvaluateOnSurrogate(
+                incompDeckInds,
+                model,
+                analysisLogDir,
+                writeSurrogateToml);
+
+            if (adaptive != null)
+            {
+                incompDeckInds = OrderBySurrogateGap(incompDeckInds, surrResults);
+                allIncompDeckInds = new Queue<Individual>(incompDeckInds);
+                foreach (var incompDeckInd in incompDeckInds)
+                {
+                    int eliteID = incompDeckInd.ParentID;
+                    if (!incompDeckIndsByElite.ContainsKey(eliteID))
+                    {
+                        incompDeckIndsByElite[eliteID] = new List<Individual>();
+                    }
+                    incompDeckIndsByElite[eliteID].Add(incompDeckInd);
                 }
             }
             return allIncompDeckInds;
         }
 
+        /// <summary>
+        /// Order the incomplete decks by how close the surrogate model ranks
+        /// them to another removal of the same elite, the closest first.
+        /// The decks of an elite stay together and the elites whose
+        /// removals are the closest come first, so that the rounds they
+        /// likely need start early.
+        /// </summary>
+        private List<Individual> OrderBySurrogateGap(
+            List<Individual> incompDeckInds,
+            double[,] surrResults)
+        {
+            int target = Array.IndexOf(
+                model.model_targets, "AverageHealthDifference");
+            if (target < 0)
+            {
+                return incompDeckInds;
+            }
+
+            var predicted = new Dictionary<Individual, double>();
+            for (int i = 0; i < incompDeckInds.Count; i++)
+            {
+                predicted[incompDeckInds[i]] = surrResults[i, target];
+            }
+
+            // gap between the prediction of every deck and the closest one
+            // of the same elite
+            var gaps = new Dictionary<Individual, double>();
+            var elites = incompDeckInds.GroupBy(ind => ind.ParentID).ToList();
+            foreach (var eliteInds in elites)
+            {
+                var ranked = eliteInds.OrderBy(ind => predicted[ind]).ToList();
+                foreach (var ind in ranked)
+                {
+                    gaps[ind] = Double.PositiveInfinity;
+                }
+                for (int i = 0; i + 1 < ranked.Count; i++)
+                {
+                    double gap = predicted[ranked[i + 1]] - predicted[ranked[i]];
+                    gaps[ranked[i]] = Math.Min(gaps[ranked[i]], gap);
+                    gaps[ranked[i + 1]] = Math.Min(gaps[ranked[i + 1]], gap);
+                }
+            }
+
+            return elites
+                .OrderBy(eliteInds => eliteInds
+                    .Select(ind => gaps[ind])
+                    .Where(gap => !Double.IsInfinity(gap))
+                    .DefaultIfEmpty(Double.PositiveInfinity)
+                    .Average())
+                .SelectMany(eliteInds => eliteInds.OrderBy(ind => gaps[ind]))
+                .ToList();
+        }
+
+        /// <summary>
+        /// Number of games per strategy the results are obtained from.
+        /// </summary>
+        private static int NumGamesPerStrategy(ResultsMessage results)
+        {
+            return (int)Math.Round(results.OverallStats.NumGamesPlayed /
+                                   Math.Max(results.StrategyStats.Length, 1));
+        }
+
+        /// <summary>
+        /// Number of games of the next round of an incomplete deck in the
+        /// adaptive analysis.
+        /// </summary>
+        protected override int? GetNumGames(Individual cur)
+        {
+            if (adaptive == null)
+            {
+                return null;
+            }
+
+            ResultsMessage results;
+            if (!realResults.TryGetValue(cur, out results))
+            {
+                return Math.Min(adaptive.InitialGames, maxGames);
+            }
+            return Math.Min(adaptive.GamesPerRound,
+                            maxGames - NumGamesPerStrategy(results));
+        }
+
+        /// <summary>
+        /// Add the games just played with an incomplete deck to those of its
+        /// previous rounds.
+        /// </summary>
+        private void MergeRealResults(Individual stableInd)
+        {
+            var results = new ResultsMessage();
+            results.OverallStats = stableInd.OverallData;
+            results.StrategyStats = stableInd.StrategyData;
+
+            ResultsMessage merged;
+            if (realResults.TryGetValue(stableInd, out merged))
+            {
+                merged.Merge(results);
+            }
+            else
+            {
+                merged = results;
+                realResults[stableInd] = merged;
+            }
+
+            stableInd.OverallData = merged.OverallStats;
+            stableInd.StrategyData = merged.StrategyStats;
+            stableInd.Fitness = merged.OverallStats.AverageHealthDifference;
+        }
+
+        /// <summary>
+        /// Standard error of the difference between the average health
+        /// differences of two incomplete decks.
+        /// </summary>
+        private double DifferenceStdError(Individual ind1, Individual ind2)
+        {
+            ResultsMessage results1 = realResults[ind1];
+            ResultsMessage results2 = realResults[ind2];
+            double variance =
+                results1.OverallStats.HealthDifferenceVariance /
+                Math.Max(NumGamesPerStrategy(results1), 1) +
+                results2.OverallStats.HealthDifferenceVariance /
+                Math.Max(NumGamesPerStrategy(results2), 1);
+            return Math.Sqrt(Math.Max(variance, 0));
+        }
+
+        /// <summary>
+        /// Once all the incomplete decks of an elite are played, queue more
+        /// games for the ones that are not told apart from a removal next
+        /// to them in the ranking. Removals whose order is clear, or that
+        /// are known to be within the tolerance of their neighbours, get no
+        /// more games.
+        /// </summary>
+        private void ScheduleNextRound(int eliteID)
+        {
+            // rank the removals by their average health difference so far
+            var ranked = incompDeckIndsByElite[eliteID]
+                .OrderBy(ind =>
+                    realResults[ind].OverallStats.AverageHealthDifference)
+                .ToList();
+
+            // smallest separation of every deck that needs more games
+            var separations = new Dictionary<Individual, double>();
+            for (int i = 0; i + 1 < ranked.Count; i++)
+            {
+                double diff =
+                    realResults[ranked[i + 1]].OverallStats.AverageHealthDifference -
+                    realResults[ranked[i]].OverallStats.AverageHealthDifference;
+                double stdError = DifferenceStdError(ranked[i], ranked[i + 1]);
+
+                // the order is clear, or both removals are as good as tied
+                double margin = adaptive.NumStdErrors * stdError;
+                if (diff >= margin || diff + margin < adaptive.Tolerance)
+                {
+                    continue;
+                }
+
+                // difference in standard errors, the smaller the less clear
+                double separation = diff / stdError;
+                foreach (var ind in new[] { ranked[i], ranked[i + 1] })
+                {
+                    if (NumGamesPerStrategy(realResults[ind]) >= maxGames)
+                    {
+                        continue;
+                    }
+                    double prevSeparation;
+                    if (!separations.TryGetValue(ind, out prevSeparation) ||
+                        separation < prevSeparation)
+                    {
+                        separations[ind] = separation;
+                    }
+                }
+            }
+
+            if (separations.Count == 0)
+            {
+                double avgNumGames = ranked.Average(
+                    ind => NumGamesPerStrategy(realResults[ind]));
+                Utilities.WriteLineWithTimestamp(String.Format(
+                    "Removals of elite {0} ranked with {1:F1} games per deck",
+                    eliteID, avgNumGames));
+                return;
+            }
+
+            // the least separated decks first
+            foreach (var ind in separations.Keys.OrderBy(deck => separations[deck]))
+            {
+                if (pendingIndsByElite[eliteID].Add(ind))
+                {
+                    nextRoundInds.Enqueue(ind);
+                    numToEval += 1;
+                }
+            }
+        }
+
         /// <summary>
         /// Dispatch evaluation tasks.
         /// </summary>
         public void DispatchEvalJobsToWorkers()
         {
-            while (_idleWorkers.Count > 0 && allIncompDeckInds.Count > 0)
+            while (_idleWorkers.Count > 0 &&
+                   (nextRoundInds.Count > 0 || allIncompDeckInds.Count > 0))
             {
-                Individual choiceIndividual = allIncompDeckInds.Dequeue();
+                var queue = nextRoundInds.Count > 0 ?
+                    nextRoundInds : allIncompDeckInds;
+                Individual choiceIndividual = queue.Dequeue();
+
+                // the round of the deck was answered by a duplicate result
+                if (!pendingIndsByElite[choiceIndividual.ParentID]
+                        .Contains(choiceIndividual))
+                {
+                    continue;
+                }
                 if (DispatchOneJobToWorker(choiceIndividual) == 0)
                 {
-                    allIncompDeckInds.Enqueue(choiceIndividual);
+                    queue.Enqueue(choiceIndividual);
                 }
             }
         }
 
         /// <summary>
-        /// Find done evaluations.
+        /// Find done evaluations. In the adaptive analysis, the results
+        /// written are those of all the games played with the deck. Results
+        /// of a deck that is not pending are ignored.
         /// </summary>
         public void FindDoneWorkers()
         {
             base.FindDoneWorkers((stableInd) =>
             {
+                // A job redispatched from an overtime worker returned twice,
+                // keep the results of the games processed before
+                if (!pendingIndsByElite[stableInd.ParentID].Remove(stableInd))
+                {
+                    Utilities.WriteLineWithTimestamp(String.Format(
+                        "Ignoring duplicate results of elite {0} without {1}",
+                        stableInd.ParentID, stableInd.CardRemoved));
+                    ResultsMessage processed;
+                    if (adaptive != null &&
+                        realResults.TryGetValue(stableInd, out processed))
+                    {
+                        stableInd.OverallData = processed.OverallStats;
+                        stableInd.StrategyData = processed.StrategyStats;
+                    }
+                    return;
+                }
+
+                // Add the games to those of the previous rounds
+                if (adaptive != null)
+                {
+                    MergeRealResults(stableInd);
+                }
+
                 // Write the results
                 var results = new ResultsMessage();
                 results.PlayerDeck = new DeckParams();
@@ -315,6 +695,13 @@ namespace Analysis
                     Console.WriteLine("Card Removed: {0}",
                                       stableInd.CardRemoved);
                 });
+
+                // Play more games once the round of the elite is done
+                if (adaptive != null &&
+                    pendingIndsByElite[stableInd.ParentID].Count == 0)
+                {
+                    ScheduleNextRound(stableInd.ParentID);
+                }
             });
         }
 
@@ -12,6 +12,23 @@ namespace DeckEvaluator.Config
       public string OpponentDeckSuite { get; set; }
       public string[] DeckPools { get; set; }
       public PlayerStrategyParams[] PlayerStrategies { get; set; }
+
+      // Number of games a worker plays at the same time, 0 to use all the
+      // cores available.
+      public int NumThreads { get; set; } = 0;
+
+      // Stop playing games with a deck once it is confidently below the
+      // fitness the search needs, disabled if not specified.
+      public EarlyStoppingParams EarlyStopping { get; set; }
+   }
+
+   public class EarlyStoppingParams
+   {
+      // Number of games to play before deciding to stop.
+      public int MinGames { get; set; } = 20;
+      // The deck is below the threshold once its average health difference
+      // plus this many standard errors is.
+      public double NumStdErrors { get; set; } = 2.0;
    }
 
    public class PlayerStrategyParams
@@ -1,5 +1,6 @@
 using System;
 using System.Collections.Generic;
+using System.Diagnostics;
 using System.IO;
 using System.Linq;
 using System.Text;
@@ -9,11 +10,14 @@ using System.Threading.Tasks;
 using SabberStoneCore.Enums;
 using SabberStoneCore.Model;
 
+using SabberStoneCoreAi.Nodes;
 using SabberStoneCoreAi.Score;
 
 using SabberStoneUtil;
 using SabberStoneUtil.Messaging;
 
+using DeckEvaluator.Config;
+
 namespace DeckEvaluator.Evaluation
 {
    public class GameDispatcher
@@ -34,13 +38,40 @@ namespace DeckEvaluator.Evaluation
       private int _totalManaSpent;
       private int _totalManaWasted;
       private int _totalStrategyAlignment;
+      private int _numGamesPlayed;
+      private long _totalSquaredHealthDifference;
+
+      // Early stopping, see StopEarlyBelow.
+      private EarlyStoppingParams _earlyStopping;
+      private double _fitnessThreshold;
+
+      // Number of games played at the same time.
+      private int _numThreads;
+
+      // Wall time of all the games played, summed over the threads.
+      private long _totalGameTicks;
+
+      // Work of the move searches of all the games played.
+      private OptionSearchStats _searchStats;
+
+      /// <summary>
+      /// Number of threads to play games with when it is not configured,
+      /// i.e. the number of cores available to the process (e.g. the
+      /// --cpus-per-task granted by Slurm).
+      /// </summary>
+      public static int DefaultNumThreads
+      {
+         get { return Environment.ProcessorCount; }
+      }
 
 		public GameDispatcher(PlayerSetup player,
-                            List<PlayerSetup> opponents)
+                            List<PlayerSetup> opponents,
+                            int numThreads = 0)
 		{
          // Save the configuration information.
          _player = player;
          _opponents = opponents;
+         _numThreads = numThreads > 0 ? numThreads : DefaultNumThreads;
 
          // Setup the statistics keeping.
          _usageCount = new Dictionary<string,int>();
@@ -53,6 +84,10 @@ namespace DeckEvaluator.Evaluation
          _totalManaSpent = 0;
          _totalManaWasted = 0;
          _totalStrategyAlignment = 0;
+         _totalGameTicks = 0;
+         _searchStats = new OptionSearchStats();
+         _numGamesPlayed = 0;
+         _totalSquaredHealthDifference = 0;
          foreach (Card curCard in _player.Deck.CardList)
          {
 				if (!_usageCount.ContainsKey(curCard.Name))
@@ -67,7 +102,10 @@ namespace DeckEvaluator.Evaluation
          Utilities.WriteLineWithTimestamp("Starting game: "+gameId);
 
          // Run a game
-         GameEvaluator.GameResult result = ev.PlayGame(gameId);
+         var watch = Stopwatch.StartNew();
+         GameEvaluator.GameResult result =
+            ev.PlayGame(gameId, _opponents[gameId]);
+         watch.Stop();
 
          // Record stats
          lock (_statsLock)
@@ -85,7 +123,10 @@ namespace DeckEvaluator.Evaluation
                }
             }
 
+            _numGamesPlayed++;
             _totalHealthDifference += result._healthDifference;
+            _totalSquaredHealthDifference +=
+               result._healthDifference * result._healthDifference;
             _totalDamage += result._damageDone;
             _totalTurns += result._numTurns;
             _totalCardsDrawn += result._cardsDrawn;
@@ -93,18 +134,18 @@ namespace DeckEvaluator.Evaluation
             _totalManaSpent += result._manaSpent;
             _totalManaWasted += result._manaWasted;
             _totalStrategyAlignment += result._strategyAlignment;
+            _totalGameTicks += watch.ElapsedTicks;
+            _searchStats.Add(ev.SearchStats);
          }
 
-         Utilities.WriteLineWithTimestamp("Finished game: "+gameId);
-
-         // Rest every game.
-         Thread.Sleep(1000);
+         Utilities.WriteLineWithTimestamp(
+            String.Format("Finished game: {0} ({1:F2}s, {2})",
+                          gameId, watch.Elapsed.TotalSeconds,
+                          ev.SearchStats));
       }
 
-      private void queueGame(int gameId)
+      private void queueGame(int gameId, GameEvaluator ev)
       {
-      	var ev = new GameEvaluator(_player, _opponents[gameId]);
-
          // temporary work around for SabberStone bug
          // try to run the game until no exceptions are thrown
          try
@@ -117,7 +158,7 @@ namespace DeckEvaluator.Evaluation
                String.Format(
                   "InvalidCastException catched. Restarting game {0}", 
                   gameId));
-            queueGame(gameId);
+            queueGame(gameId, ev);
          }
          catch (System.NullReferenceException)
          {
@@ -125,7 +166,7 @@ namespace DeckEvaluator.Evaluation
                String.Format(
                   "NullReferenceException catched. Restarting game {0}",
                   gameId));
-            queueGame(gameId);
+            queueGame(gameId, ev);
          }
          catch (System.Exception)
          {
@@ -133,7 +174,58 @@ namespace DeckEvaluator.Evaluation
                String.Format(
                   "Unknown Exception catched. Restarting game {0}",
                   gameId));
-            queueGame(gameId);
+            queueGame(gameId, ev);
+         }
+      }
+
+      /// <summary>
+      /// Stop playing games once the average health difference (the
+      /// fitness of the deck) is confidently below `fitnessThreshold`.
+      /// </summary>
+      public void StopEarlyBelow(double fitnessThreshold,
+                                 EarlyStoppingParams earlyStopping)
+      {
+         _fitnessThreshold = fitnessThreshold;
+         _earlyStopping = earlyStopping;
+      }
+
+      /// <summary>
+      /// Whether the games played so far are enough to tell that the deck
+      /// is below the fitness threshold.
+      /// </summary>
+      private bool IsBelowThreshold()
+      {
+         if (_earlyStopping == null)
+            return false;
+
+         lock (_statsLock)
+         {
+            int n = _numGamesPlayed;
+            if (n < Math.Max(_earlyStopping.MinGames, 2))
+               return false;
+
+            double mean = _totalHealthDifference * 1.0 / n;
+            double variance = HealthDifferenceVariance();
+            double upperBound = mean +
+               _earlyStopping.NumStdErrors * Math.Sqrt(variance / n);
+            return upperBound < _fitnessThreshold;
+         }
+      }
+
+      /// <summary>
+      /// Sample variance of the health difference of the games played.
+      /// </summary>
+      private double HealthDifferenceVariance()
+      {
+         lock (_statsLock)
+         {
+            int n = _numGamesPlayed;
+            if (n < 2)
+               return 0;
+
+            double mean = _totalHealthDifference * 1.0 / n;
+            return Math.Max(0,
+               (_totalSquaredHealthDifference - n * mean * mean) / (n - 1));
          }
       }
 
@@ -146,23 +238,54 @@ namespace DeckEvaluator.Evaluation
 
       public OverallStatistics Run()
       {
+         // Every thread reuses its own evaluator for all of its games, with
+         // its own copy of the strategy of the player.
+         var watch = Stopwatch.StartNew();
          Parallel.For(0, _opponents.Count,
-               new ParallelOptions {MaxDegreeOfParallelism = 8},
-               i => {queueGame(i);});
+               new ParallelOptions {MaxDegreeOfParallelism = _numThreads},
+               () => new GameEvaluator(_player.CopyForThread()),
+               (i, loopState, ev) =>
+               {
+                  queueGame(i, ev);
+                  if (IsBelowThreshold())
+                     loopState.Stop();
+                  return ev;
+               },
+               ev => {});
          /*
+         var ev = new GameEvaluator(_player);
          for (int i=0; i<_opponents.Count; i++)
-            queueGame(i);
+            queueGame(i, ev);
          */
+         watch.Stop();
+
+         // Games that started before stopping early are played out.
+         int numGames = _numGamesPlayed;
+         if (numGames < _opponents.Count)
+            Utilities.WriteLineWithTimestamp(
+               String.Format("Stopped early after {0}/{1} games, the deck " +
+                             "is below the fitness threshold {2}",
+                             numGames, _opponents.Count, _fitnessThreshold));
+
+         double avgGameTime = _totalGameTicks * 1.0
+            / Stopwatch.Frequency / numGames;
+         Utilities.WriteLineWithTimestamp(
+            String.Format("Played {0} games in {1:F2}s on {2} threads " +
+                          "({3:F2}s per game, {4:F2} games/s)",
+                          numGames, watch.Elapsed.TotalSeconds,
+                          _numThreads, avgGameTime,
+                          numGames / watch.Elapsed.TotalSeconds));
+         Utilities.WriteLineWithTimestamp("Move search: " + _searchStats);
 
          // Calculate turn averages from the totals
-         double avgHealthDifference = _totalHealthDifference * 1.0 / _opponents.Count;
+         double avgHealthDifference = _totalHealthDifference * 1.0 / numGames;
          double avgDamage = _totalDamage * 1.0 / _totalTurns;
          double avgCardsDrawn = _totalCardsDrawn * 1.0 / _totalTurns;
          double avgHandSize = _totalHandSize * 1.0 / _totalTurns;
          double avgManaSpent = _totalManaSpent * 1.0 / _totalTurns;
          double avgManaWasted = _totalManaWasted * 1.0 / _totalTurns;
          double avgStrategyAlignment = _totalStrategyAlignment * 1.0 / _totalTurns;
-         double turnsPerGame = _totalTurns * 1.0 / _opponents.Count;
+         double turnsPerGame = _totalTurns * 1.0 / numGames;
 
          // Pack up the results and give them back.
          var results = new OverallStatistics();
@@ -170,8 +293,13 @@ namespace DeckEvaluator.Evaluation
          results.UsageCounts = new int[cardNames.Length];
          for (int i=0; i<cardNames.Length; i++)
             results.UsageCounts[i] = _usageCount[cardNames[i]];
-         results.WinCount = _winCount;
+         // Scaled to the games that should have been played so that win
+         // counts of decks stopped early stay comparable.
+         results.WinCount = _winCount * 1.0 * _opponents.Count / numGames;
+         results.NumGamesPlayed = numGames;
+         results.StoppedEarly = numGames < _opponents.Count;
          results.AverageHealthDifference = avgHealthDifference;
+         results.HealthDifferenceVariance = HealthDifferenceVariance();
          results.DamageDone = avgDamage;
          results.NumTurns = turnsPerGame;
          results.CardsDrawn = avgCardsDrawn;
@@ -53,13 +53,27 @@ namespace DeckEvaluator.Evaluation
       private PlayerSetup _opponent;
       private Dictionary<string, int> _cardUsage;
 
-		public GameEvaluator(PlayerSetup player, PlayerSetup opponent)
+      /// <summary>
+      /// Work of the move searches of the last game played.
+      /// </summary>
+      public OptionSearchStats SearchStats { get; private set; }
+
+      /// <summary>
+      /// An evaluator is reused for all the games a thread plays with the
+      /// same player, see PlayGame(int, PlayerSetup).
+      /// </summary>
+		public GameEvaluator(PlayerSetup player)
 		{
          _player = player;
-         _opponent = opponent;
          _cardUsage = new Dictionary<string, int>();
       }
 
+		public GameEvaluator(PlayerSetup player, PlayerSetup opponent)
+         : this(player)
+		{
+         _opponent = opponent;
+      }
+
       public void updateUsage(Card playedCard)
       {
          string cardName = playedCard.Name.ToString();
@@ -80,9 +94,21 @@ namespace DeckEvaluator.Evaluation
          _randomHappened = happened;
       }
 
+      /// <summary>
+      /// Play a game against another opponent. The card usage of the
+      /// result is only valid until the next game of this evaluator.
+      /// </summary>
+      public GameResult PlayGame(int gameId, PlayerSetup opponent)
+      {
+         _opponent = opponent;
+         _cardUsage.Clear();
+         return PlayGame(gameId);
+      }
+
       public GameResult PlayGame(int gameId)
       {
          _randomHappened = false;
+         SearchStats = new OptionSearchStats();
 
          var game = new Game(
             new GameConfig()
@@ -142,7 +168,7 @@ namespace DeckEvaluator.Evaluation
             while (game.State == State.RUNNING && game.CurrentPlayer == game.Player1)
             {
                //Console.WriteLine("* Calculating solutions *** Player 1 ***");
-               List<OptionNode> solutions = OptionNode.GetSolutions(game, game.Player1.Id, aiPlayer1, maxDepth, maxWidth);
+               List<OptionNode> solutions = OptionNode.GetSolutions(game, game.Player1.Id, aiPlayer1, maxDepth, maxWidth, SearchStats);
 
                var solution = new List<PlayerTask>();
                OptionNode bestOption = solutions.OrderByDescending(p => p.Score).First();
@@ -197,7 +223,7 @@ namespace DeckEvaluator.Evaluation
             while (game.State == State.RUNNING && game.CurrentPlayer == game.Player2)
             {
                //Console.WriteLine("* Calculating solutions *** Player 2 ***");
-               List<OptionNode> solutions = OptionNode.GetSolutions(game, game.Player2.Id, aiPlayer2, maxDepth, maxWidth);
+               List<OptionNode> solutions = OptionNode.GetSolutions(game, game.Player2.Id, aiPlayer2, maxDepth, maxWidth, SearchStats);
                var solution = new List<PlayerTask>();
                solutions.OrderByDescending(p => p.Score).First().PlayerTasks(ref solution);
                //Console.WriteLine($"- Player 2 - <{game.CurrentPlayer.Name}> ---------------------------");
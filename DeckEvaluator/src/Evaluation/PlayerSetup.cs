@@ -21,6 +21,15 @@ namespace DeckEvaluator.Evaluation
          Strategy = strategy;
       }
 
+      /// <summary>
+      /// Same player with its own copy of the strategy, for a thread
+      /// playing games in parallel with others, see Score.Copy.
+      /// </summary>
+      public PlayerSetup CopyForThread()
+      {
+         return new PlayerSetup(Deck, Strategy.Copy());
+      }
+
       public static Score GetStrategy(string name, 
                                       NetworkParams netParams,
                                       CustomStratWeights weights)
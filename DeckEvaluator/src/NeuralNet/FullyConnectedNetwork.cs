@@ -1,32 +1,51 @@
 using System;
+using System.Numerics;
+using System.Threading;
+
+/* The weights of every layer are stored in one flat row-major matrix with
+ * a row per output neuron, so that each output is a dot product of two
+ * contiguous arrays, computed with SIMD vectors. The activations go
+ * through scratch buffers owned by the calling thread, so a network can be
+ * shared by the games played in parallel and evaluating it does not
+ * allocate.
+ */
 
 namespace DeckEvaluator.NeuralNet
 {
    public class FullyConnectedNetwork : Network
    {
       private int[] _layerSizes;
-      private double[] _bias;
-      private double[][,] _weights;
+      private double[][] _weights;
+      private double[][] _biases;
+
+      // Activations of the hidden layers, two buffers used alternately.
+      private ThreadLocal<double[][]> _scratch;
 
       public int NumWeights {get; private set;}
       public int NumBias {get; private set;}
-      
+
+      public int NumInputs => _layerSizes[0];
+      public int NumOutputs => _layerSizes[_layerSizes.Length-1];
+
       public FullyConnectedNetwork(int[] layerSizes)
       {
-         _layerSizes = new int[layerSizes.Length]; 
+         _layerSizes = new int[layerSizes.Length];
          Array.Copy(layerSizes, _layerSizes, layerSizes.Length);
 
          NumBias = 0;
          NumWeights = 0;
-         _weights = new double[_layerSizes.Length-1][,];
+         _weights = new double[_layerSizes.Length-1][];
+         _biases = new double[_layerSizes.Length-1][];
          for (int i=0; i<_layerSizes.Length-1; i++)
          {
-            _weights[i] = new double[_layerSizes[i], _layerSizes[i+1]];
+            _weights[i] = new double[_layerSizes[i] * _layerSizes[i+1]];
+            _biases[i] = new double[_layerSizes[i+1]];
             NumWeights += _layerSizes[i] * _layerSizes[i+1];
             NumBias += _layerSizes[i+1];
          }
 
-         _bias = new double[NumBias];
+         _scratch = new ThreadLocal<double[][]>(
+            () => new double[][] { new double[0], new double[0] });
       }
 
       public void SetWeights(double[] weightVector)
@@ -36,55 +55,122 @@ namespace DeckEvaluator.NeuralNet
             Console.WriteLine(String.Format("Num Weight Mismatch {0} vs {1} + {2} = {3}", weightVector.Length, NumWeights, NumBias, NumWeights + NumBias));
          }
 
+         // The weight vector lists the weights of a layer by input neuron.
          int counter = 0;
          for (int k=0; k<_layerSizes.Length-1; k++)
          {
-            for (int i=0; i<_layerSizes[k]; i++)
+            int numIn = _layerSizes[k];
+            for (int i=0; i<numIn; i++)
             {
                for (int j=0; j<_layerSizes[k+1]; j++)
                {
-                  _weights[k][i,j] = weightVector[counter];
+                  _weights[k][j*numIn + i] = weightVector[counter];
                   counter++;
                }
             }
          }
-         
-         for (int i=0; i<NumBias; i++)
+
+         for (int k=0; k<_layerSizes.Length-1; k++)
          {
-            _bias[i] = weightVector[counter];
-            counter++;
+            for (int j=0; j<_layerSizes[k+1]; j++)
+            {
+               _biases[k][j] = weightVector[counter];
+               counter++;
+            }
          }
       }
 
       public double[] Evaluate(double[] input)
       {
-         if (input.Length != _layerSizes[0])
+         if (input.Length != NumInputs)
          {
             Console.WriteLine("Input layer size doesn't match input vector");
             return null;
          }
 
-         int counter = 0;
-         var layer = input;
+         var output = new double[NumOutputs];
+         Evaluate(input, 1, output);
+         return output;
+      }
+
+      public void Evaluate(double[] input, double[] output)
+      {
+         Evaluate(input, 1, output);
+      }
+
+      /// <summary>
+      /// Evaluate `numInputs` input vectors at once. `inputs` holds one
+      /// vector after the other and `outputs` receives the outputs in the
+      /// same order.
+      /// </summary>
+      public void Evaluate(double[] inputs, int numInputs, double[] outputs)
+      {
+         if (inputs.Length < numInputs * NumInputs ||
+             outputs.Length < numInputs * NumOutputs)
+         {
+            Console.WriteLine("Input layer size doesn't match input vector");
+            return;
+         }
+
+         double[][] scratch = GetScratch(numInputs);
+         double[] layer = inputs;
          for (int k=0; k<_layerSizes.Length-1; k++)
          {
-            var nextLayer = new double[_layerSizes[k+1]];
-            for (int i=0; i<_layerSizes[k+1]; i++)
+            int numIn = _layerSizes[k];
+            int numOut = _layerSizes[k+1];
+            double[] weights = _weights[k];
+            double[] biases = _biases[k];
+            double[] nextLayer =
+               k == _layerSizes.Length-2 ? outputs : scratch[k % 2];
+
+            for (int r=0; r<numInputs; r++)
             {
-               nextLayer[i] = _bias[counter];
-               counter++;
+               int inOffset = r * numIn;
+               int outOffset = r * numOut;
+               for (int j=0; j<numOut; j++)
+               {
+                  double sum = biases[j] +
+                     Dot(weights, j * numIn, layer, inOffset, numIn);
+                  nextLayer[outOffset + j] = Math.Tanh(sum);
+               }
             }
-            
-            for (int i=0; i<_layerSizes[k]; i++)
-               for (int j=0; j<_layerSizes[k+1]; j++)
-                  nextLayer[j] += layer[i] * _weights[k][i,j];
-         
-            for (int j=0; j<_layerSizes[k+1]; j++)
-               nextLayer[j] = Math.Tanh(nextLayer[j]);
             layer = nextLayer;
          }
+      }
 
-         return layer;
+      // Scratch buffers of the calling thread, large enough for the hidden
+      // layers of `numInputs` inputs.
+      private double[][] GetScratch(int numInputs)
+      {
+         double[][] scratch = _scratch.Value;
+         int size = 0;
+         for (int k=1; k<_layerSizes.Length-1; k++)
+            size = Math.Max(size, numInputs * _layerSizes[k]);
+         if (scratch[0].Length < size)
+         {
+            scratch[0] = new double[size];
+            scratch[1] = new double[size];
+         }
+         return scratch;
+      }
+
+      private static double Dot(double[] a, int aOffset,
+                                double[] b, int bOffset, int length)
+      {
+         int i = 0;
+         double sum = 0;
+         int width = Vector<double>.Count;
+         if (Vector.IsHardwareAccelerated && length >= width)
+         {
+            var acc = Vector<double>.Zero;
+            for (; i <= length - width; i += width)
+               acc += new Vector<double>(a, aOffset + i) *
+                      new Vector<double>(b, bOffset + i);
+            sum = Vector.Dot(acc, Vector<double>.One);
+         }
+         for (; i < length; i++)
+            sum += a[aOffset + i] * b[bOffset + i];
+         return sum;
       }
    }
 }
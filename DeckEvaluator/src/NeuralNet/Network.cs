@@ -4,5 +4,9 @@ namespace DeckEvaluator.NeuralNet
    {
       void SetWeights(double[] weightVector);
       double[] Evaluate(double[] input);
+
+      // Evaluate without allocating, see FullyConnectedNetwork.
+      void Evaluate(double[] input, double[] output);
+      void Evaluate(double[] inputs, int numInputs, double[] outputs);
    }
 }
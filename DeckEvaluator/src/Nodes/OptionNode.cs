@@ -15,7 +15,7 @@ namespace SabberStoneCoreAi.Nodes
 	{
 		private readonly OptionNode _parent;
 
-		private readonly Game _game;
+		private Game _game;
 
 		private int _playerId;
 
@@ -37,7 +37,8 @@ namespace SabberStoneCoreAi.Nodes
 
 		private bool _isOpponentTurn = false;
 
-		public OptionNode(OptionNode parent, Game game, int playerId, PlayerTask playerTask, IScore scoring)
+		public OptionNode(OptionNode parent, Game game, int playerId, PlayerTask playerTask, IScore scoring,
+		                  bool rate = true)
 		{
 			_parent = parent;
 			_game = game.Clone(); // create clone
@@ -46,7 +47,7 @@ namespace SabberStoneCoreAi.Nodes
 			Scoring = scoring;
 
 			if (!IsRoot)
-				Execute();
+				Execute(rate);
 		}
 
 		public void Switch()
@@ -55,7 +56,11 @@ namespace SabberStoneCoreAi.Nodes
 			_playerId = _game.ControllerById(_playerId).Opponent.Id;
 		}
 
-		public void Execute()
+		/// <summary>
+		/// Play the task of this node. If `rate` is false, the state is
+		/// rated later with SetScore.
+		/// </summary>
+		public void Execute(bool rate = true)
 		{
 			_game.Process(PlayerTask);
 
@@ -65,12 +70,26 @@ namespace SabberStoneCoreAi.Nodes
 
 			_endTurn = _game.CurrentPlayer.Id != _playerId ? 1 : 0;
 
-			Hash = _game.Hash(GameTag.LAST_CARD_PLAYED, GameTag.ENTITY_ID);
+			// Only nodes that may be expanded are looked up by hash.
+			if (IsRunning && !IsEndTurn)
+				Hash = _game.Hash(GameTag.LAST_CARD_PLAYED, GameTag.ENTITY_ID);
 
 			// scoring every state
-			Scoring.Controller = controller;
-			Score = Scoring.Rate();
+			if (rate)
+			{
+				Scoring.Controller = controller;
+				SetScore(Scoring.Rate());
+			}
+		}
+
+		private void SetScore(int score)
+		{
+			Score = score;
 
+			// The game of the nodes that are not expanded is not needed
+			// anymore.
+			if (!IsRunning || IsEndTurn)
+				_game = null;
 		}
 
 		public void PlayerTasks(ref List<PlayerTask> list)
@@ -82,39 +101,116 @@ namespace SabberStoneCoreAi.Nodes
 			list.Add(PlayerTask);
 		}
 
-		public void Options(ref Dictionary<string, OptionNode> optionNodes)
+		/// <summary>
+		/// Play every option of this node on its own copy of the game. The
+		/// children are created one at a time as they are enumerated, unless
+		/// the scoring rates batches of states: then all the children are
+		/// created first and rated in one call.
+		/// </summary>
+		public IEnumerable<OptionNode> Children()
 		{
 			List<PlayerTask> options = _game.ControllerById(_playerId).Options(!_isOpponentTurn);
 
+			var batchScoring = Scoring as IBatchScore;
+			if (batchScoring == null)
+			{
+				foreach (PlayerTask option in options)
+					yield return new OptionNode(this, _game, _playerId, option, Scoring);
+				yield break;
+			}
+
+			var children = new List<OptionNode>(options.Count);
+			var controllers = new List<Controller>(options.Count);
 			foreach (PlayerTask option in options)
 			{
-				var optionNode = new OptionNode(this, _game, _playerId, option, Scoring);
-				if (!optionNodes.ContainsKey(optionNode.Hash))
-					optionNodes.Add(optionNode.Hash, optionNode);
+				var child = new OptionNode(this, _game, _playerId, option, Scoring, rate: false);
+				children.Add(child);
+				controllers.Add(child._game.ControllerById(_playerId));
+			}
+
+			var scores = new int[children.Count];
+			batchScoring.RateAll(controllers, scores);
+			for (int i = 0; i < children.Count; i++)
+			{
+				children[i].SetScore(scores[i]);
+				yield return children[i];
 			}
 		}
 
-		public static List<OptionNode> GetSolutions(Game game, int playerId, IScore scoring, int maxDepth, int maxWidth)
+		/// <summary>
+		/// Insert `node` in `beam`, which is sorted by decreasing score with
+		/// earlier nodes first among equal scores, keeping at most
+		/// `maxWidth` nodes. `beamHashes` holds the hashes of the nodes of
+		/// the beam. Returns false if the node is not kept.
+		/// </summary>
+		private static bool InsertInBeam(List<OptionNode> beam, HashSet<string> beamHashes,
+		                                 OptionNode node, int maxWidth)
 		{
-			var depthNodes = new Dictionary<string, OptionNode> { ["root"] = new OptionNode(null, game, playerId, null, scoring) };
+			int pos = beam.Count;
+			while (pos > 0 && beam[pos - 1].Score < node.Score)
+				pos--;
+			if (pos >= maxWidth)
+				return false;
+
+			beam.Insert(pos, node);
+			beamHashes.Add(node.Hash);
+			if (beam.Count > maxWidth)
+			{
+				beamHashes.Remove(beam[maxWidth].Hash);
+				beam.RemoveAt(maxWidth);
+			}
+			return true;
+		}
+
+		/// <summary>
+		/// Beam search of the options of the turn. The states kept in the
+		/// beam at any depth are in a transposition table, so that a state
+		/// reached again, through another order of the same tasks or at
+		/// another depth, is neither kept nor expanded twice. A state pruned
+		/// from the beam may still be kept at a later depth. Children are
+		/// ranked as they are created and dropped as soon as they fall out of
+		/// the beam. Turns that end or finish the game are the solutions.
+		/// </summary>
+		public static List<OptionNode> GetSolutions(Game game, int playerId, IScore scoring, int maxDepth, int maxWidth,
+		                                            OptionSearchStats stats = null)
+		{
+			var depthNodes = new List<OptionNode> { new OptionNode(null, game, playerId, null, scoring) };
 			var endTurnNodes = new List<OptionNode>();
+			var seenHashes = new HashSet<string>();
+			int numClones = 1;
+			int numExpanded = 0;
+			int numTranspositions = 0;
 			for (int i = 0; depthNodes.Count > 0 && i < maxDepth; i++)
 			{
-				var nextDepthNodes = new Dictionary<string, OptionNode>();
-				foreach (OptionNode option in depthNodes.Values)
+				var nextDepthNodes = new List<OptionNode>(maxWidth + 1);
+				var nextDepthHashes = new HashSet<string>();
+				foreach (OptionNode option in depthNodes)
 				{
-					option.Options(ref nextDepthNodes);
+					numExpanded++;
+					foreach (OptionNode child in option.Children())
+					{
+						numClones++;
+						if (child.IsEndTurn || !child.IsRunning)
+							endTurnNodes.Add(child);
+						else if (seenHashes.Contains(child.Hash) || nextDepthHashes.Contains(child.Hash))
+							numTranspositions++;
+						else
+							InsertInBeam(nextDepthNodes, nextDepthHashes, child, maxWidth);
+					}
 				}
 
-				endTurnNodes.AddRange(nextDepthNodes.Values.Where(p => p.IsEndTurn || !p.IsRunning));
+				seenHashes.UnionWith(nextDepthHashes);
+				depthNodes = nextDepthNodes;
 
-				depthNodes = nextDepthNodes
-					.Where(p => !p.Value.IsEndTurn && p.Value.IsRunning)
-					.OrderByDescending(p => p.Value.Score)
-					.Take(maxWidth)
-					.ToDictionary(p => p.Key, p => p.Value);
+				//Console.WriteLine($"Depth: {i + 1} --> {depthNodes.Count} options! [SOLUTIONS:{endTurnNodes.Count}]");
+			}
 
-				//Console.WriteLine($"Depth: {i + 1} --> {depthNodes.Count}/{nextDepthNodes.Count} options! [SOLUTIONS:{endTurnNodes.Count}]");
+			if (stats != null)
+			{
+				stats.NumSearches++;
+				stats.NumNodesExpanded += numExpanded;
+				stats.NumClones += numClones;
+				stats.NumTranspositions += numTranspositions;
 			}
 			return endTurnNodes;
 		}
@@ -0,0 +1,41 @@
+using System;
+
+namespace SabberStoneCoreAi.Nodes
+{
+	/// <summary>
+	/// Work done by OptionNode.GetSolutions, summed over the searches it is
+	/// passed to.
+	/// </summary>
+	public class OptionSearchStats
+	{
+		// Number of turn searches, a turn is searched again after randomness.
+		public long NumSearches { get; set; }
+
+		// Number of nodes whose options were played.
+		public long NumNodesExpanded { get; set; }
+
+		// Number of copies of the game, one per node.
+		public long NumClones { get; set; }
+
+		// Number of nodes dropped because their state was already reached.
+		public long NumTranspositions { get; set; }
+
+		public void Add(OptionSearchStats rhs)
+		{
+			NumSearches += rhs.NumSearches;
+			NumNodesExpanded += rhs.NumNodesExpanded;
+			NumClones += rhs.NumClones;
+			NumTranspositions += rhs.NumTranspositions;
+		}
+
+		public override string ToString()
+		{
+			double numSearches = Math.Max(NumSearches, 1);
+			return String.Format(
+				"{0} searches, {1:F1} nodes expanded, {2:F1} clones and " +
+				"{3:F1} transpositions per search",
+				NumSearches, NumNodesExpanded / numSearches,
+				NumClones / numSearches, NumTranspositions / numSearches);
+		}
+	}
+}
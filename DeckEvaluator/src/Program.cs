@@ -26,22 +26,8 @@ namespace DeckEvaluator
          int nodeId = Int32.Parse(args[0]);
          Utilities.WriteLineWithTimestamp("Node Id: "+nodeId);
 
-         // These files are for asyncronous communication between this
-         // worker and it's scheduler.
-         //
-         // Decks to evaluate come in the inbox and are dished out of the
-         // outbox.
-         string boxesDirectory = "boxes/";
-         string inboxPath = boxesDirectory +
-            string.Format("deck-{0,4:D4}-inbox.tml", nodeId);
-         string outboxPath = boxesDirectory +
-            string.Format("deck-{0,4:D4}-outbox.tml", nodeId);
-
          // Hailing
-         string activeDirectory = "active/";
-         string activeWorkerPath = activeDirectory +
-            string.Format("worker-{0,4:D4}.txt", nodeId);
-         string activeSearchPath = activeDirectory + "search.txt";
+         string activeSearchPath = "active/search.txt";
          if (!File.Exists(activeSearchPath))
          {
             Utilities.WriteLineWithTimestamp("No search has been found.");
@@ -66,33 +52,20 @@ namespace DeckEvaluator
          var gameSuite = new GameSuite(suiteConfig.Opponents,
                                        deckPoolManager);
 
-         // Let the scheduler know we are here.
-			using (FileStream ow = File.Open(activeWorkerPath,
-                FileMode.Create, FileAccess.Write, FileShare.None))
-			{
-				WriteText(ow, "Hail!");
-				ow.Close();
-			}
+         // Let the scheduler know we are here. Jobs come through sockets if
+         // the search announced an endpoint, through the boxes/ directory
+         // otherwise.
+         var transport = WorkerTransport.Connect(nodeId, textLines);
 
          // Loop while the guiding search is running.
-         while (File.Exists(activeSearchPath))
+         while (true)
          {
             // Wait until we have some work.
-            while (!File.Exists(inboxPath) && File.Exists(activeSearchPath))
-            {
-               Utilities.WriteLineWithTimestamp(
-                  String.Format("Waiting... ({0})", nodeId));
-               Thread.Sleep(5000);
-            }
-
-            if (!File.Exists(activeSearchPath))
+            var playMessage = transport.ReceiveWork();
+            if (playMessage == null)
                break;
 
-            // Wait for the file to be finish being written
-            Thread.Sleep(5000);
-
             // Run games, evaluate the deck, and then save the results.
-            var playMessage = Toml.ReadFile<PlayMatchesMessage>(inboxPath);
             Deck playerDeck = playMessage.Deck.ContructDeck();
 
             int numStrats = config.Evaluation.PlayerStrategies.Length;
@@ -127,13 +100,23 @@ namespace DeckEvaluator
                                           config.Network,
                                           playerStrategy));
 
+               // The search may ask for another number of games.
+               int numGames = playMessage.NumGames ?? curStrat.NumGames;
                List<PlayerSetup> opponents =
-                  gameSuite.GetOpponents(curStrat.NumGames);
+                  gameSuite.GetOpponents(numGames);
 
                var launcher = new GameDispatcher(
-                        player, opponents
+                        player, opponents, config.Evaluation.NumThreads
                      );
 
+               // The threshold is on the fitness summed over the
+               // strategies, only stop early when there is one.
+               if (config.Evaluation.EarlyStopping != null &&
+                   playMessage.FitnessThreshold.HasValue && numStrats == 1)
+                  launcher.StopEarlyBelow(
+                     playMessage.FitnessThreshold.Value,
+                     config.Evaluation.EarlyStopping);
+
                OverallStatistics stats = launcher.Run();
                stratStats[i] = new StrategyStatistics();
                stratStats[i].WinCount += stats.WinCount;
@@ -147,12 +130,7 @@ namespace DeckEvaluator
             results.PlayerDeck = playMessage.Deck;
             results.OverallStats = overallStats;
             results.StrategyStats = stratStats;
-            Toml.WriteFile<ResultsMessage>(results, outboxPath);
-
-            // Wait for the TOML file to write (buffers are out of sync)
-            // Then tell the search that we are done writing the file.
-            Thread.Sleep(3000);
-				File.Delete(inboxPath);
+            transport.SendResults(results);
 
             // Cleanup.
             GC.Collect();
@@ -171,13 +149,6 @@ namespace DeckEvaluator
          }
       }
 
-		private static void WriteText(Stream fs, string s)
-      {
-         s += "\n";
-         byte[] info = new UTF8Encoding(true).GetBytes(s);
-         fs.Write(info, 0, info.Length);
-      }
-
       private static void ApplyNerfs(NerfParams[] nerfs)
       {
          if (nerfs == null)
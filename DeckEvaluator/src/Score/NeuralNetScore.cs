@@ -1,6 +1,7 @@
 ﻿using System;
 using System.Collections.Generic;
 using System.Linq;
+using System.Threading;
 using SabberStoneCore.Model.Zones;
 using SabberStoneCore.Model.Entities;
 
@@ -10,14 +11,53 @@ using DeckEvaluator.NeuralNet;
 
 namespace SabberStoneCoreAi.Score
 {
-	public class NeuralNetScore : SabberStoneCoreAi.Score.Score
+	public class NeuralNetScore : SabberStoneCoreAi.Score.Score, IBatchScore
 	{
-      private Network _network;
+      private const int NumInputs = 15;
+
+      private FullyConnectedNetwork _network;
+
+      // Input and output vectors of the calling thread, reused across
+      // calls and grown to the largest batch.
+      private ThreadLocal<double[]> _inputs;
+      private ThreadLocal<double[]> _outputs;
 
       public NeuralNetScore(int[] layerSizes, CustomStratWeights weights)
       {
          _network = new FullyConnectedNetwork(layerSizes);
          _network.SetWeights(weights.Weights);
+         _inputs = new ThreadLocal<double[]>(() => new double[NumInputs]);
+         _outputs = new ThreadLocal<double[]>(
+            () => new double[_network.NumOutputs]);
+      }
+
+      // Write the features of the current state at `offset` of `inputs`.
+      private void FillInput(double[] inputs, int offset)
+      {
+         inputs[offset + 0] = HeroHp;
+         inputs[offset + 1] = OpHeroHp;
+         inputs[offset + 2] = HeroAtk;
+         inputs[offset + 3] = OpHeroAtk;
+         inputs[offset + 4] = HandTotCost;
+         inputs[offset + 5] = HandCnt;
+         inputs[offset + 6] = OpHandCnt;
+         inputs[offset + 7] = DeckCnt;
+         inputs[offset + 8] = OpDeckCnt;
+
+         // Minion stats
+         inputs[offset + 9] = MinionTotAtk;
+         inputs[offset + 10] = OpMinionTotAtk;
+         inputs[offset + 11] = MinionTotHealth;
+         inputs[offset + 12] = OpMinionTotHealth;
+         inputs[offset + 13] = MinionTotHealthTaunt;
+         inputs[offset + 14] = OpMinionTotHealthTaunt;
+      }
+
+      private static int ToScore(double output)
+      {
+         double result = output;
+         result *= 1000000;
+         return (int)result;
       }
 
 		public override int Rate()
@@ -28,30 +68,48 @@ namespace SabberStoneCoreAi.Score
 			if (HeroHp < 1)
 				return Int32.MinValue;
 
-         var inputVector = new double[15];
-         inputVector[0] = HeroHp;
-         inputVector[1] = OpHeroHp;
-         inputVector[2] = HeroAtk;
-         inputVector[3] = OpHeroAtk;
-         inputVector[4] = HandTotCost;
-         inputVector[5] = HandCnt;
-         inputVector[6] = OpHandCnt;
-         inputVector[7] = DeckCnt;
-         inputVector[8] = OpDeckCnt;
-
-         // Minion stats
-         inputVector[9] = MinionTotAtk;
-         inputVector[10] = OpMinionTotAtk;
-         inputVector[11] = MinionTotHealth;
-         inputVector[12] = OpMinionTotHealth;
-         inputVector[13] = MinionTotHealthTaunt;
-         inputVector[14] = OpMinionTotHealthTaunt;
-
-         double result = _network.Evaluate(inputVector)[0];
-         result *= 1000000;
-         return (int)result;
+         double[] inputs = _inputs.Value;
+         double[] outputs = _outputs.Value;
+         FillInput(inputs, 0);
+         _network.Evaluate(inputs, outputs);
+         return ToScore(outputs[0]);
 		}
 
+      /// <summary>
+      /// Rate the state of every controller, evaluating the network once
+      /// for all of them.
+      /// </summary>
+      public void RateAll(List<Controller> controllers, int[] scores)
+      {
+         int n = controllers.Count;
+         if (_inputs.Value.Length < n * NumInputs)
+         {
+            _inputs.Value = new double[n * NumInputs];
+            _outputs.Value = new double[n * _network.NumOutputs];
+         }
+         double[] inputs = _inputs.Value;
+         double[] outputs = _outputs.Value;
+
+         for (int i=0; i<n; i++)
+         {
+            Controller = controllers[i];
+            FillInput(inputs, i * NumInputs);
+         }
+         _network.Evaluate(inputs, n, outputs);
+
+         for (int i=0; i<n; i++)
+         {
+            // Hard guard the win conditions
+            Controller = controllers[i];
+            if (OpHeroHp < 1)
+               scores[i] = Int32.MaxValue;
+            else if (HeroHp < 1)
+               scores[i] = Int32.MinValue;
+            else
+               scores[i] = ToScore(outputs[i * _network.NumOutputs]);
+         }
+      }
+
 		public override Func<List<IPlayable>, List<int>> MulliganRule()
 		{
 			return p => p.Where(t => t.Cost > 3).Select(t => t.Id).ToList();
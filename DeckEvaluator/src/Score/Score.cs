@@ -14,6 +14,15 @@ namespace SabberStoneCoreAi.Score
 		int Rate();
 	}
 
+	/// <summary>
+	/// Score that can rate several states in one call, used to rate all
+	/// the children of a node of the move search at once.
+	/// </summary>
+	public interface IBatchScore : IScore
+	{
+		void RateAll(List<Controller> controllers, int[] scores);
+	}
+
 	public abstract class Score : IScore
 	{
 		public Controller Controller { get; set; }
@@ -63,5 +72,14 @@ namespace SabberStoneCoreAi.Score
 		{
 			return p => new List<int>();
 		}
+
+		/// <summary>
+		/// Copy of the score for another thread. A score rates the state of
+		/// its Controller, so threads can not share one.
+		/// </summary>
+		public Score Copy()
+		{
+			return (Score)MemberwiseClone();
+		}
 	}
 }
@@ -7,20 +7,52 @@ using System.Text;
 using DeckSearch.Mapping;
 using DeckSearch.Search;
 
+using SabberStoneUtil.Config;
+
 namespace DeckSearch.Logging
 {
     // A compressed feature map for frequence logging.
     // Doesn't contain detailed individual information.
+    //
+    // In "Full" mode every row is a snapshot of the whole archive.
+    // In "Delta" mode every row starts with K (keyframe) or D (delta):
+    // a keyframe lists all cells of the archive, a delta only the cells that
+    // were inserted, replaced or had their cell count changed since the
+    // previous row. A keyframe is written every KeyframeInterval rows and
+    // whenever cells were removed (e.g. after remapping a sliding map).
     class FrequentMapLog
     {
+        private const int DEFAULT_KEYFRAME_INTERVAL = 1000;
+
         private string _logPath;
         private FeatureMap _map;
 
-        public FrequentMapLog(string logPath, FeatureMap map)
+        private bool _deltaMode;
+        private int _keyframeInterval;
+        private int _rowsSinceKeyframe;
+        private bool _forceKeyframe = true;
+        private int _lastNumGroups;
+
+        // State of the map when the previous row was written.
+        private Dictionary<string, Individual> _lastElites =
+            new Dictionary<string, Individual>();
+        private Dictionary<string, int> _lastCellCount =
+            new Dictionary<string, int>();
+
+        /// <param name = "append">keep the rows of an existing log, used
+        /// when a search is resumed</param>
+        public FrequentMapLog(string logPath, FeatureMap map,
+                              MapLogParams logParams = null,
+                              bool append = false)
         {
             _logPath = logPath;
             _map = map;
-            InitLog();
+            _deltaMode = logParams != null && logParams.Type != null &&
+                         logParams.Type.Equals("Delta");
+            _keyframeInterval = logParams != null && logParams.KeyframeInterval > 0 ?
+                logParams.KeyframeInterval : DEFAULT_KEYFRAME_INTERVAL;
+            if (!append || !File.Exists(_logPath))
+                InitLog();
         }
 
         private void InitLog()
@@ -29,10 +61,22 @@ namespace DeckSearch.Logging
             using (FileStream ow = File.Open(_logPath,
                         FileMode.Create, FileAccess.Write, FileShare.None))
             {
-                string[] dataLabels = {
-                  "Dimensions",
-                  "Map (f1xf2:CellCount:IndividualID:Wins:Fitness:Feature1:Feature2)"
-               };
+                string[] dataLabels;
+                if (_deltaMode)
+                {
+                    dataLabels = new string[] {
+                        "Type",
+                        "Dimensions",
+                        "Changes (f1xf2:CellCount:OldIndividualID:IndividualID:Wins:Fitness:Feature1:Feature2)"
+                    };
+                }
+                else
+                {
+                    dataLabels = new string[] {
+                        "Dimensions",
+                        "Map (f1xf2:CellCount:IndividualID:Wins:Fitness:Feature1:Feature2)"
+                    };
+                }
 
                 WriteText(ow, string.Join(",", dataLabels));
                 ow.Close();
@@ -46,33 +90,121 @@ namespace DeckSearch.Logging
             fs.Write(info, 0, info.Length);
         }
 
+        private string GetDimensions()
+        {
+            IEnumerable<int> dimensions =
+               Enumerable.Repeat(_map.NumGroups, _map.NumFeatures);
+            return string.Join("x", dimensions);
+        }
+
+        /// <summary>
+        /// Colon separated description of a cell. `oldID` is only written in
+        /// delta mode, -1 meaning that the cell was empty before.
+        /// </summary>
+        private string GetCell(string index, Individual cur, int? oldID = null)
+        {
+            var cellComponents = new List<string>();
+            cellComponents.Add(index);
+            cellComponents.Add(_map.CellCount[index].ToString());
+            if (oldID != null)
+                cellComponents.Add(oldID.ToString());
+            cellComponents.Add(cur.ID.ToString());
+            cellComponents.Add(cur.OverallData.WinCount.ToString());
+            cellComponents.Add(cur.Fitness.ToString());
+            foreach (var curFeature in cur.Features)
+                cellComponents.Add(curFeature.ToString());
+            return string.Join(":", cellComponents);
+        }
+
         // Call this whenever you want the log to update with the latest
         // feature map data.
         public void UpdateLog()
         {
             using (StreamWriter sw = File.AppendText(_logPath))
             {
-                var rowData = new List<string>();
-                IEnumerable<int> dimensions =
-                   Enumerable.Repeat(_map.NumGroups, _map.NumFeatures);
-                rowData.Add(string.Join("x", dimensions));
+                if (_deltaMode)
+                {
+                    sw.WriteLine(NeedsKeyframe() ? GetKeyframeRow() : GetDeltaRow());
+                    return;
+                }
 
+                var rowData = new List<string>();
+                rowData.Add(GetDimensions());
                 foreach (string index in _map.EliteMap.Keys)
+                    rowData.Add(GetCell(index, _map.EliteMap[index]));
+
+                sw.WriteLine(string.Join(",", rowData));
+            }
+        }
+
+        private bool NeedsKeyframe()
+        {
+            if (_forceKeyframe ||
+                _rowsSinceKeyframe >= _keyframeInterval ||
+                _lastNumGroups != _map.NumGroups)
+                return true;
+
+            // Deltas only describe insertions and replacements, so a cell
+            // that was removed since the last row requires a keyframe.
+            foreach (string index in _lastElites.Keys)
+                if (!_map.EliteMap.ContainsKey(index))
+                    return true;
+            return false;
+        }
+
+        private string GetKeyframeRow()
+        {
+            var rowData = new List<string>();
+            rowData.Add("K");
+            rowData.Add(GetDimensions());
+
+            _lastElites.Clear();
+            _lastCellCount.Clear();
+            foreach (string index in _map.EliteMap.Keys)
+            {
+                Individual cur = _map.EliteMap[index];
+                rowData.Add(GetCell(index, cur, -1));
+                _lastElites[index] = cur;
+                _lastCellCount[index] = _map.CellCount[index];
+            }
+
+            _forceKeyframe = false;
+            _rowsSinceKeyframe = 0;
+            _lastNumGroups = _map.NumGroups;
+            return string.Join(",", rowData);
+        }
+
+        private string GetDeltaRow()
+        {
+            var rowData = new List<string>();
+            rowData.Add("D");
+            rowData.Add(GetDimensions());
+
+            foreach (string index in _map.EliteMap.Keys)
+            {
+                Individual cur = _map.EliteMap[index];
+                int cellCount = _map.CellCount[index];
+
+                Individual prev;
+                if (!_lastElites.TryGetValue(index, out prev))
                 {
-                    Individual cur = _map.EliteMap[index];
-                    var cellComponents = new List<string>();
-                    cellComponents.Add(index);
-                    cellComponents.Add(_map.CellCount[index].ToString());
-                    cellComponents.Add(cur.ID.ToString());
-                    cellComponents.Add(cur.OverallData.WinCount.ToString());
-                    cellComponents.Add(cur.Fitness.ToString());
-                    foreach (var curFeature in cur.Features)
-                        cellComponents.Add(curFeature.ToString());
-                    rowData.Add(string.Join(":", cellComponents));
+                    rowData.Add(GetCell(index, cur, -1));
+                }
+                else if (prev != cur || _lastCellCount[index] != cellCount)
+                {
+                    rowData.Add(GetCell(index, cur, prev.ID));
+                }
+                else
+                {
+                    continue;
                 }
 
-                sw.WriteLine(string.Join(",", rowData));
+                _lastElites[index] = cur;
+                _lastCellCount[index] = cellCount;
             }
+
+            _rowsSinceKeyframe++;
+            return string.Join(",", rowData);
         }
 
         // change the map to log
@@ -80,6 +212,7 @@ namespace DeckSearch.Logging
         {
             // change map to log
             this._map = newMap;
+            _forceKeyframe = true;
 
 			// if (createNewLog) {
 			// 	// delete old log and initialize new one
@@ -16,10 +16,12 @@ namespace DeckSearch.Logging
       private string _logPath;
       private bool _isInitiated;
 
-      public RunningIndividualLog(string logPath)
+      /// <param name = "append">keep the rows of an existing log, used
+      /// when a search is resumed</param>
+      public RunningIndividualLog(string logPath, bool append = false)
       {
          _logPath = logPath; 
-         _isInitiated = false;
+         _isInitiated = append && File.Exists(logPath);
       }
 
       private static void writeText(Stream fs, string s)
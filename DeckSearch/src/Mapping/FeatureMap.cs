@@ -11,6 +11,9 @@ namespace DeckSearch.Mapping
       Dictionary<string, Individual> EliteMap { get; }
       Dictionary<string, int> CellCount { get; }
 
+      // Every individual added, in the order they were added.
+      IEnumerable<Individual> Individuals { get; }
+
       void Add(Individual toAdd);
       Individual GetRandomElite();
    }
@@ -10,6 +10,12 @@ using DeckSearch.Search;
 /* This is a FeatureMap that slides its feature boundaries periodically.
  * Instead of having even feature boundaries, they are readjusted so that
  * each group is more evenly distributed.
+ *
+ * Cells are identified by their group indices packed in an integer
+ * (f1 + f2*NumGroups + ...). EliteMap and CellCount expose the same cells
+ * keyed by "f1:f2:..." for the logs. The features of all the individuals
+ * are kept sorted, so remapping neither sorts them again nor visits the
+ * individuals that stay in their cell.
  */
 
 namespace DeckSearch.Mapping
@@ -27,9 +33,25 @@ namespace DeckSearch.Mapping
       public int NumFeatures { get; private set; }
       public Dictionary<string, Individual> EliteMap { get; private set; }
       public Dictionary<string, int> CellCount { get; private set; }
+      public IEnumerable<Individual> Individuals => _allIndividuals;
 
-      private List<double>[] _groupBoundaries;
-      private List<string> _eliteIndices;
+      private double[][] _groupBoundaries;
+      private List<int> _eliteIndices;
+
+      // Cells by packed index, EliteMap and CellCount are views of them.
+      // Individuals are referred to by their position in _allIndividuals.
+      private Dictionary<int, int> _elites;
+      private Dictionary<int, List<int>> _members;
+      private Dictionary<int, string> _cellNames;
+
+      // Packed cell of every individual, -1 if not mapped yet.
+      private List<int> _cellOf;
+
+      // Features of all the individuals in sorted order with the individual
+      // each comes from, and the ones added since the last remap.
+      private List<double>[] _sortedFeatures;
+      private List<int>[] _sortedIndividuals;
+      private List<double>[] _newFeatures;
 
       public SlidingFeatureMap(int numToEvaluate, MapParams config, MapSizer groupSizer)
       {
@@ -38,96 +60,283 @@ namespace DeckSearch.Mapping
          _maxIndividualsToEvaluate = numToEvaluate;
          _remapFrequency = config.RemapFrequency;
          NumFeatures = config.Features.Length;
-      
-         _groupBoundaries = new List<double>[NumFeatures];
+
+         _groupBoundaries = new double[NumFeatures][];
+         _sortedFeatures = new List<double>[NumFeatures];
+         _sortedIndividuals = new List<int>[NumFeatures];
+         _newFeatures = new List<double>[NumFeatures];
+         for (int i=0; i<NumFeatures; i++)
+         {
+            _sortedFeatures[i] = new List<double>();
+            _sortedIndividuals[i] = new List<int>();
+            _newFeatures[i] = new List<double>();
+         }
+         _cellOf = new List<int>();
+         ClearCells();
+      }
+
+      // Position of the first value strictly greater than `value`.
+      private static int UpperBound(List<double> values, double value)
+      {
+         int lo = 0;
+         int hi = values.Count;
+         while (lo < hi)
+         {
+            int mid = (lo + hi) / 2;
+            if (values[mid] <= value)
+               lo = mid + 1;
+            else
+               hi = mid;
+         }
+         return lo;
       }
 
       private int GetFeatureIndex(int featureId, double feature)
       {
-         // Find the bucket index we belong on this dimension
-         int index = 0;
-         while (index < NumGroups && 
-                _groupBoundaries[featureId][index] < feature)
+         // Find the bucket index we belong on this dimension, i.e. the
+         // last boundary strictly below the feature.
+         double[] boundaries = _groupBoundaries[featureId];
+         int lo = 0;
+         int hi = boundaries.Length;
+         while (lo < hi)
          {
-            index++;
+            int mid = (lo + hi) / 2;
+            if (boundaries[mid] < feature)
+               lo = mid + 1;
+            else
+               hi = mid;
          }
 
-         return Math.Max(0, index-1);
+         return Math.Max(0, lo-1);
       }
 
-      private void AddToMap(Individual toAdd)
+      private int GetCell(Individual cur)
       {
-         var features = new int[NumFeatures];
-         for (int i=0; i<NumFeatures; i++)
-            features[i] = GetFeatureIndex(i, toAdd.Features[i]);
-         string index = string.Join(":", features);
-     
-         if (!EliteMap.ContainsKey(index))
+         int cell = 0;
+         for (int i=NumFeatures-1; i>=0; i--)
+            cell = cell * NumGroups + GetFeatureIndex(i, cur.Features[i]);
+         return cell;
+      }
+
+      private string GetCellName(int cell)
+      {
+         string name;
+         if (!_cellNames.TryGetValue(cell, out name))
+         {
+            var features = new int[NumFeatures];
+            int rest = cell;
+            for (int i=0; i<NumFeatures; i++)
+            {
+               features[i] = rest % NumGroups;
+               rest /= NumGroups;
+            }
+            name = string.Join(":", features);
+            _cellNames.Add(cell, name);
+         }
+         return name;
+      }
+
+      private void ClearCells()
+      {
+         _eliteIndices = new List<int>();
+         _elites = new Dictionary<int,int>();
+         _members = new Dictionary<int,List<int>>();
+         _cellNames = new Dictionary<int,string>();
+         EliteMap = new Dictionary<string,Individual>();
+         CellCount = new Dictionary<string,int>();
+      }
+
+      // Whether individual `k` should be the elite instead of individual
+      // `other`. Ties go to the earliest individual, as when the map is
+      // filled in order.
+      private bool IsBetter(int k, int other)
+      {
+         double fitness = _allIndividuals[k].Fitness;
+         double otherFitness = _allIndividuals[other].Fitness;
+         return fitness > otherFitness ||
+                (fitness == otherFitness && k < other);
+      }
+
+      // Move individual `k` to `cell`, updating the cell it leaves.
+      // Returns true if a cell was created or removed.
+      private bool MoveToCell(int k, int cell)
+      {
+         int oldCell = _cellOf[k];
+         if (oldCell == cell)
+            return false;
+         _cellOf[k] = cell;
+
+         bool cellsChanged = false;
+         if (oldCell != -1)
+         {
+            string oldName = _cellNames[oldCell];
+            List<int> oldMembers = _members[oldCell];
+            oldMembers.Remove(k);
+            if (oldMembers.Count == 0)
+            {
+               _elites.Remove(oldCell);
+               _members.Remove(oldCell);
+               EliteMap.Remove(oldName);
+               CellCount.Remove(oldName);
+               cellsChanged = true;
+            }
+            else
+            {
+               if (_elites[oldCell] == k)
+               {
+                  int elite = oldMembers[0];
+                  foreach (int member in oldMembers)
+                     if (IsBetter(member, elite))
+                        elite = member;
+                  _elites[oldCell] = elite;
+                  EliteMap[oldName] = _allIndividuals[elite];
+               }
+               CellCount[oldName] = oldMembers.Count;
+            }
+         }
+
+         string name = GetCellName(cell);
+         List<int> members;
+         if (!_members.TryGetValue(cell, out members))
          {
-            _eliteIndices.Add(index);
-            EliteMap.Add(index, toAdd);
-            CellCount.Add(index, 0);
+            _members.Add(cell, new List<int> { k });
+            _elites.Add(cell, k);
+            EliteMap.Add(name, _allIndividuals[k]);
+            CellCount.Add(name, 1);
+            return true;
          }
-         else if (EliteMap[index].Fitness < toAdd.Fitness)
+
+         members.Add(k);
+         if (IsBetter(k, _elites[cell]))
          {
-            EliteMap[index] = toAdd;
+            _elites[cell] = k;
+            EliteMap[name] = _allIndividuals[k];
          }
+         CellCount[name] = members.Count;
+         return cellsChanged;
+      }
 
-         CellCount[index] += 1;
+      // Merge the features added since the last remap into the sorted ones.
+      private void MergeNewFeatures()
+      {
+         int firstNew = _allIndividuals.Count - _newFeatures[0].Count;
+         for (int i=0; i<NumFeatures; i++)
+         {
+            double[] added = _newFeatures[i].ToArray();
+            int[] addedIndividuals = new int[added.Length];
+            for (int b=0; b<added.Length; b++)
+               addedIndividuals[b] = firstNew + b;
+            Array.Sort(added, addedIndividuals);
+
+            List<double> sorted = _sortedFeatures[i];
+            List<int> sortedIndividuals = _sortedIndividuals[i];
+            int total = sorted.Count + added.Length;
+            var merged = new List<double>(total);
+            var mergedIndividuals = new List<int>(total);
+            int x = 0;
+            int y = 0;
+            while (x < sorted.Count || y < added.Length)
+            {
+               if (y == added.Length ||
+                   (x < sorted.Count && sorted[x] <= added[y]))
+               {
+                  merged.Add(sorted[x]);
+                  mergedIndividuals.Add(sortedIndividuals[x]);
+                  x++;
+               }
+               else
+               {
+                  merged.Add(added[y]);
+                  mergedIndividuals.Add(addedIndividuals[y]);
+                  y++;
+               }
+            }
+
+            _sortedFeatures[i] = merged;
+            _sortedIndividuals[i] = mergedIndividuals;
+            _newFeatures[i].Clear();
+         }
       }
 
       // Update the boundaries of each feature.
-      // Add all the individuals available to the map.
+      // Move the individuals whose cell changed.
       private void Remap()
       {
          double portionDone = 1.0 * _allIndividuals.Count / _maxIndividualsToEvaluate;
-         NumGroups = _groupSizer.GetSize(portionDone);
+         int numGroups = _groupSizer.GetSize(portionDone);
+         bool resized = numGroups != NumGroups;
+         NumGroups = numGroups;
 
-         var features = new List<double>[NumFeatures];
-         for (int i=0; i<NumFeatures; i++)
-            features[i] = new List<double>();
-      
-         foreach (Individual cur in _allIndividuals)
-            for (int i=0; i<NumFeatures; i++)
-               features[i].Add(cur.Features[i]);
-      
-         for (int i=0; i<NumFeatures; i++)
-            features[i].Sort();
-        
+         MergeNewFeatures();
+         double[][] oldBoundaries = (double[][])_groupBoundaries.Clone();
          for (int i=0; i<NumFeatures; i++)
          {
-            _groupBoundaries[i] = new List<double>();
-         
+            _groupBoundaries[i] = new double[NumGroups];
             for (int x=0; x<NumGroups; x++)
             {
                int sampleIndex = x * _allIndividuals.Count / NumGroups;
-               _groupBoundaries[i].Add(features[i][sampleIndex]);
+               _groupBoundaries[i][x] = _sortedFeatures[i][sampleIndex];
             }
          }
 
-         // Populate the feature map using the new boundaries.
-         _eliteIndices = new List<string>();
-         EliteMap = new Dictionary<string,Individual>();
-         CellCount = new Dictionary<string,int>();
-         foreach (Individual cur in _allIndividuals)
-            AddToMap(cur);
+         // The packed cells change with the number of groups, so the whole
+         // map is rebuilt.
+         if (resized)
+         {
+            ClearCells();
+            for (int k=0; k<_allIndividuals.Count; k++)
+            {
+               _cellOf[k] = -1;
+               MoveToCell(k, GetCell(_allIndividuals[k]));
+            }
+            _eliteIndices = new List<int>(_elites.Keys);
+            return;
+         }
+
+         // Only individuals with a feature between the old and the new
+         // position of a boundary change cells, plus the new individual.
+         var toMove = new HashSet<int>();
+         toMove.Add(_allIndividuals.Count - 1);
+         for (int i=0; i<NumFeatures; i++)
+         {
+            for (int x=0; x<NumGroups; x++)
+            {
+               double lo = Math.Min(oldBoundaries[i][x], _groupBoundaries[i][x]);
+               double hi = Math.Max(oldBoundaries[i][x], _groupBoundaries[i][x]);
+               if (lo == hi)
+                  continue;
+               List<double> values = _sortedFeatures[i];
+               for (int pos=UpperBound(values, lo);
+                    pos<values.Count && values[pos] <= hi; pos++)
+                  toMove.Add(_sortedIndividuals[i][pos]);
+            }
+         }
+
+         bool cellsChanged = false;
+         foreach (int k in toMove)
+            cellsChanged |= MoveToCell(k, GetCell(_allIndividuals[k]));
+         if (cellsChanged)
+            _eliteIndices = new List<int>(_elites.Keys);
       }
 
       public void Add(Individual toAdd)
       {
          _allIndividuals.Add(toAdd);
+         _cellOf.Add(-1);
+         for (int i=0; i<NumFeatures; i++)
+            _newFeatures[i].Add(toAdd.Features[i]);
 
          if (_allIndividuals.Count % _remapFrequency == 1)
             Remap();
-         else 
-            AddToMap(toAdd);
+         else if (MoveToCell(_allIndividuals.Count - 1, GetCell(toAdd)))
+            _eliteIndices.Add(_cellOf[_allIndividuals.Count - 1]);
       }
 
       public Individual GetRandomElite()
       {
          int pos = rnd.Next(_eliteIndices.Count);
-         string index = _eliteIndices[pos];
-         return EliteMap[index];
+         int index = _eliteIndices[pos];
+         return _allIndividuals[_elites[index]];
       }
    }
 }
@@ -17,14 +17,30 @@ namespace DeckSearch
             var config = Toml.ReadFile<Configuration>(args[0]);
             CardReader.Init(config);
 
+            // `--resume [log_dir]` resumes the latest checkpoint in log_dir,
+            // or of the latest search run with the same config
+            SearchCheckpoint checkpoint = null;
+            if (args.Length > 1 && args[1] == "--resume")
+            {
+                checkpoint = args.Length > 2 ?
+                    SearchCheckpoint.ReadLatest(args[2]) :
+                    SearchCheckpoint.FindLatest(
+                        args[0], DeckSearchManager.LOG_DIRECTORY);
+                if (checkpoint == null)
+                {
+                    Console.WriteLine(
+                        "No checkpoint found, starting a new search.");
+                }
+            }
+
             if(config.Search.Category == "Distributed")
             {
-                var search = new DistributedSearch(args[0]);
+                var search = new DistributedSearch(args[0], checkpoint);
                 search.Run();
             }
             else if(config.Search.Category == "Surrogated")
             {
-                var search = new SurrogatedSearch(args[0]);
+                var search = new SurrogatedSearch(args[0], checkpoint);
                 search.Run();
             }
         }
@@ -1,5 +1,6 @@
 using System;
 using System.Collections.Generic;
+using System.Diagnostics;
 using System.IO;
 using System.Text;
 
@@ -55,7 +56,7 @@ namespace DeckSearch.Search
         /// <summary>
         /// Root log directory
         /// </summary>
-        private const string LOG_DIRECTORY = "logs/";
+        public const string LOG_DIRECTORY = "logs/";
 
         /// <summary>
         /// Max number of win counts of all individuals
@@ -67,29 +68,70 @@ namespace DeckSearch.Search
         /// </summary>
         private double _maxFitness;
 
+        /// <summary>
+        /// Parameters of the checkpoints, null if disabled
+        /// </summary>
+        private CheckpointParams _checkpointParams;
+
+        /// <summary>
+        /// Time since the last checkpoint
+        /// </summary>
+        private Stopwatch _checkpointStopwatch = Stopwatch.StartNew();
+
+        /// <summary>
+        /// Index of the next checkpoint
+        /// </summary>
+        private int _checkpointIdx = 0;
+
+        /// <summary>
+        /// Individuals that were not evaluated when the search was
+        /// checkpointed, or generated while the idle workers were lost,
+        /// dispatched before any new individual.
+        /// </summary>
+        private Queue<Individual> _resumedIndividuals =
+            new Queue<Individual>();
+
 
         /// <summary>
         /// Constructor
         /// </summary>
         /// <param name = "configFilename">name of the configuation file</param>
+        /// <param name = "checkpoint">checkpoint to resume the search from,
+        /// null to start a new search</param>
         public DeckSearchManager(
-            string configFilename
+            string configFilename,
+            SearchCheckpoint checkpoint = null
             ) : base(configFilename)
         {
             numEvaledPerRun = 0;
             _maxWins = 0;
             _maxFitness = Int32.MinValue;
             _individualsBuffer = new HashSet<Individual>();
+            _checkpointParams = config.Checkpoint;
 
-            // set up log directory
-            String log_dir_base = DateTime.Now.ToString("yyyy-MM-dd_HH-mm-ss");
-            log_dir_base += "_" + config.Search.Category +
-                            "_" + config.Search.Type;
-            if (config.Surrogate != null)
+            String log_dir_exp;
+            if (checkpoint != null)
             {
-                log_dir_base += "_" + config.Surrogate.Type;
+                // log to the directory of the resumed search, without the
+                // rows written after the checkpoint
+                log_dir_exp = checkpoint.LogDirectory;
+                checkpoint.RestoreLogs();
+                Utilities.WriteLineWithTimestamp(String.Format(
+                    "Resuming search from checkpoint {0} of {1} ({2})",
+                    checkpoint.Index, log_dir_exp, checkpoint.Time));
+            }
+            else
+            {
+                // set up log directory
+                String log_dir_base = DateTime.Now.ToString("yyyy-MM-dd_HH-mm-ss");
+                log_dir_base += "_" + config.Search.Category +
+                                "_" + config.Search.Type;
+                if (config.Surrogate != null)
+                {
+                    log_dir_base += "_" + config.Surrogate.Type;
+                }
+                log_dir_exp = System.IO.Path.Combine(LOG_DIRECTORY, log_dir_base);
             }
-            String log_dir_exp = System.IO.Path.Combine(LOG_DIRECTORY, log_dir_base);
             this.log_dir_exp = log_dir_exp;
             System.IO.Directory.CreateDirectory(log_dir_exp);
 
@@ -98,7 +140,7 @@ namespace DeckSearch.Search
             Toml.WriteFile<Configuration>(config, config_out_path);
 
             // Setup the logs to record the data on individuals
-            InitLogs(log_dir_exp);
+            InitLogs(log_dir_exp, checkpoint != null);
 
             // Set up search algorithm
             Utilities.WriteLineWithTimestamp(
@@ -108,7 +150,8 @@ namespace DeckSearch.Search
                 var searchConfig = Toml.ReadFile<MapElitesParams>(
                     config.Search.ConfigFilename);
                 _numToEvaluate = searchConfig.Search.NumToEvaluate;
-                searchAlgo = new MapElitesAlgorithm(searchConfig, log_dir_exp);
+                searchAlgo = new MapElitesAlgorithm(
+                    searchConfig, log_dir_exp, checkpoint != null);
             }
 
             else if (config.Search.Type.Equals("EvolutionStrategy"))
@@ -126,13 +169,33 @@ namespace DeckSearch.Search
                 searchAlgo = new RandomSearchAlgorithm(
                     searchConfig, log_dir_exp);
             }
+
+            if ((_checkpointParams != null || checkpoint != null) &&
+                !IsMapElitesAlgo())
+            {
+                throw new System.ArgumentException(
+                    "Checkpoints are only supported with MAP-Elites.");
+            }
+
+            if (checkpoint != null)
+            {
+                searchAlgo.LoadState(checkpoint, CardReader._cardSet);
+                _maxWins = checkpoint.MaxWins;
+                _maxFitness = checkpoint.MaxFitness;
+                _individualsBuffer.UnionWith(SearchCheckpoint.Restore(
+                    checkpoint.Buffer, CardReader._cardSet));
+                _resumedIndividuals = new Queue<Individual>(
+                    SearchCheckpoint.Restore(
+                        checkpoint.Pending, CardReader._cardSet));
+                _checkpointIdx = checkpoint.Index + 1;
+            }
         }
 
 
         /// <summary>
         /// Helper function to initialize the logging related objects
         /// </summary>
-        private void InitLogs(string log_dir_exp)
+        private void InitLogs(string log_dir_exp, bool append)
         {
             // File path to log all individuals
             string INDIVIDUAL_LOG_FILENAME = System.IO.Path.Combine(log_dir_exp, "individual_log.csv");
@@ -144,11 +207,98 @@ namespace DeckSearch.Search
             string FITTEST_LOG_FILENAME = System.IO.Path.Combine(log_dir_exp, "fittest_log.csv");
 
             _individualLog =
-               new RunningIndividualLog(INDIVIDUAL_LOG_FILENAME);
+               new RunningIndividualLog(INDIVIDUAL_LOG_FILENAME, append);
             _championLog =
-               new RunningIndividualLog(CHAMPION_LOG_FILENAME);
+               new RunningIndividualLog(CHAMPION_LOG_FILENAME, append);
             _fittestLog =
-               new RunningIndividualLog(FITTEST_LOG_FILENAME);
+               new RunningIndividualLog(FITTEST_LOG_FILENAME, append);
+        }
+
+
+        /// <summary>
+        /// Whether checkpoints are enabled and the last one was written more
+        /// than `IntervalMinutes` ago.
+        /// </summary>
+        public bool CheckpointDue()
+        {
+            return _checkpointParams != null &&
+                _checkpointStopwatch.Elapsed.TotalMinutes >=
+                    _checkpointParams.IntervalMinutes;
+        }
+
+
+        /// <summary>
+        /// Create a checkpoint of the search manager and algorithm.
+        /// Individuals being evaluated or waiting to be dispatched are stored
+        /// to be evaluated first when the search is resumed.
+        /// </summary>
+        /// <param name = "queued">individuals generated but not dispatched
+        /// yet, in the order they would be dispatched</param>
+        public SearchCheckpoint CreateCheckpoint(
+            IEnumerable<Individual> queued = null)
+        {
+            var pending = GetUnfinishedIndividuals();
+            pending.AddRange(_resumedIndividuals);
+            if (queued != null)
+            {
+                pending.AddRange(queued);
+            }
+
+            var checkpoint = new SearchCheckpoint();
+            checkpoint.ConfigFilename = _configFilename;
+            checkpoint.LogDirectory = log_dir_exp;
+            checkpoint.Index = _checkpointIdx;
+            checkpoint.Time = DateTime.Now;
+            checkpoint.MaxWins = _maxWins;
+            checkpoint.MaxFitness = _maxFitness;
+            checkpoint.Buffer = SearchCheckpoint.Store(_individualsBuffer);
+            checkpoint.Pending = SearchCheckpoint.Store(pending);
+            checkpoint.LogLengths = SearchCheckpoint.GetLogLengths(log_dir_exp);
+            searchAlgo.SaveState(
+                checkpoint, config.Search.KeepSurrogateArchive);
+            return checkpoint;
+        }
+
+
+        /// <summary>
+        /// Write a checkpoint created by CreateCheckpoint, possibly completed
+        /// by the search using the manager.
+        /// </summary>
+        public void WriteCheckpoint(SearchCheckpoint checkpoint)
+        {
+            checkpoint.Write(_checkpointParams.NumToKeep);
+            _checkpointIdx++;
+            _checkpointStopwatch.Restart();
+            Utilities.WriteLineWithTimestamp(String.Format(
+                "Checkpoint {0} written with {1} pending individuals",
+                checkpoint.Index, checkpoint.Pending.Count));
+        }
+
+
+        /// <summary>
+        /// Remove and return the individuals that were not evaluated when
+        /// the search was checkpointed, for searches that dispatch them
+        /// themselves.
+        /// </summary>
+        public List<Individual> TakeResumedIndividuals()
+        {
+            var resumed = new List<Individual>(_resumedIndividuals);
+            _resumedIndividuals.Clear();
+            return resumed;
+        }
+
+
+        /// <summary>
+        /// Dispatch the individuals that were not evaluated when the search
+        /// was checkpointed.
+        /// </summary>
+        private void DispatchResumedJobsToWorkers()
+        {
+            while (_resumedIndividuals.Count > 0 &&
+                   DispatchOneJobToWorker(_resumedIndividuals.Peek()) == 1)
+            {
+                _resumedIndividuals.Dequeue();
+            }
         }
 
 
@@ -158,12 +308,17 @@ namespace DeckSearch.Search
         /// </summary>
         public void DispatchSearchJobsToWorkers()
         {
+            DispatchResumedJobsToWorkers();
+
             // Dispatch jobs to the available workers.
             while (_idleWorkers.Count > 0 && !searchAlgo.IsBlocking())
             {
                 Individual choiceIndividual =
                     searchAlgo.GenerateIndividual(CardReader._cardSet);
-                DispatchOneJobToWorker(choiceIndividual);
+                if (DispatchOneJobToWorker(choiceIndividual) == 0)
+                {
+                    _resumedIndividuals.Enqueue(choiceIndividual);
+                }
             }
         }
 
@@ -173,6 +328,8 @@ namespace DeckSearch.Search
         /// </summary>
         public void DispatchInitJobsToWorkers()
         {
+            DispatchResumedJobsToWorkers();
+
             // Dispatch jobs to the available workers.
             while (_idleWorkers.Count > 0 &&
                    !searchAlgo.IsBlocking() &&
@@ -180,7 +337,10 @@ namespace DeckSearch.Search
             {
                 Individual choiceIndividual =
                     searchAlgo.GenerateIndividual(CardReader._cardSet);
-                DispatchOneJobToWorker(choiceIndividual);
+                if (DispatchOneJobToWorker(choiceIndividual) == 0)
+                {
+                    _resumedIndividuals.Enqueue(choiceIndividual);
+                }
             }
         }
 
@@ -211,10 +371,14 @@ namespace DeckSearch.Search
                     searchAlgo.LogFeatureMap();
                 }
 
-                // store done individual to a tmp buffer
+                // store done individual to a tmp buffer, unless its games
+                // were stopped early, which biases its statistics low
                 if (storeBuffer)
                 {
-                    _individualsBuffer.Add(stableInd); // add evaluated individual to batch
+                    if (!stableInd.OverallData.StoppedEarly)
+                    {
+                        _individualsBuffer.Add(stableInd); // add evaluated individual to batch
+                    }
                     numEvaledPerRun += 1;
                     Utilities.WriteLineWithTimestamp(
                         "Buffer Size: " + _individualsBuffer.Count);
@@ -242,6 +406,16 @@ namespace DeckSearch.Search
         }
 
 
+        /// <summary>
+        /// Threshold of the search algorithm, see
+        /// SearchAlgorithm.GetFitnessThreshold.
+        /// </summary>
+        protected override double? GetFitnessThreshold(Individual cur)
+        {
+            return searchAlgo.GetFitnessThreshold(cur);
+        }
+
+
         /// <summary>
         /// Helper function to determine wether current algorithm is Map-Elites.
         /// </summary>
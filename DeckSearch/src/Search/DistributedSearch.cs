@@ -19,9 +19,12 @@ namespace DeckSearch.Search
         /// Constructor
         /// </summary>
         /// <param name = "configFilename">name of the configuation file</param>
-        public DistributedSearch(string configFilename)
+        /// <param name = "checkpoint">checkpoint to resume the search from,
+        /// null to start a new search</param>
+        public DistributedSearch(string configFilename,
+                                 SearchCheckpoint checkpoint = null)
         {
-            _searchManager = new DeckSearchManager(configFilename);
+            _searchManager = new DeckSearchManager(configFilename, checkpoint);
         }
 
         public void Run()
@@ -35,7 +38,12 @@ namespace DeckSearch.Search
                 _searchManager.FindNewWorkers();
                 _searchManager.DispatchSearchJobsToWorkers();
                 _searchManager.FindDoneWorkers();
-                Thread.Sleep(1000);
+                if (_searchManager.CheckpointDue())
+                {
+                    _searchManager.WriteCheckpoint(
+                        _searchManager.CreateCheckpoint());
+                }
+                _searchManager.WaitForWorkers();
             }
 
             // Let the workers know that we are done.
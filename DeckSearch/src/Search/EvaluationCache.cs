@@ -0,0 +1,238 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Security.Cryptography;
+using System.Text;
+
+using Nett;
+
+using SabberStoneUtil;
+using SabberStoneUtil.Config;
+using SabberStoneUtil.Messaging;
+
+namespace DeckSearch.Search
+{
+    /// <summary>
+    /// Results of the decks evaluated so far, persisted on disk so that
+    /// later runs with the same evaluation setup (e.g. restarted searches or
+    /// remove card analyses) reuse them.
+    ///
+    /// Entries are keyed by a hash of the sorted cards of the deck, its class
+    /// and the setup of the evaluators, i.e. the [Evaluation] table (player
+    /// strategies and opponent suite) and the [[Nerfs]] of the experiment
+    /// config. Every entry is a ResultsMessage stored in its own TOML file.
+    /// Results of games stopped early are never stored, their statistics are
+    /// biased low.
+    /// </summary>
+    public class EvaluationCache
+    {
+        /// <summary>
+        /// Directory of the cache if the config does not specify one.
+        /// </summary>
+        public const string DEFAULT_DIRECTORY = "logs/evaluation_cache/";
+
+        /// <summary>
+        /// Directory holding the entries.
+        /// </summary>
+        private string _directory;
+
+        /// <summary>
+        /// Entries played with fewer games are evaluated again and the new
+        /// games are merged into them.
+        /// </summary>
+        private int _minGames;
+
+        /// <summary>
+        /// Setup of the evaluators as a canonical TOML string.
+        /// </summary>
+        private string _evaluationSetup;
+
+        /// <summary>
+        /// Entries loaded so far by key.
+        /// </summary>
+        private Dictionary<string, ResultsMessage> _entries;
+
+        /// <summary>
+        /// Number of lookups answered from the cache.
+        /// </summary>
+        public int NumHits { get; private set; }
+
+        /// <summary>
+        /// Constructor
+        /// </summary>
+        /// <param name = "cacheParams">config of the cache</param>
+        /// <param name = "configFilename">name of the experiment config
+        /// </param>
+        public EvaluationCache(EvaluationCacheParams cacheParams,
+                               string configFilename)
+        {
+            _directory = cacheParams.Directory ?? DEFAULT_DIRECTORY;
+            _minGames = cacheParams.MinGames ?? ReadNumGames(configFilename);
+            _entries = new Dictionary<string, ResultsMessage>();
+            _evaluationSetup = ReadEvaluationSetup(configFilename);
+            System.IO.Directory.CreateDirectory(_directory);
+        }
+
+        /// <summary>
+        /// Read the part of the experiment config that changes the outcome
+        /// of the games.
+        /// </summary>
+        private static string ReadEvaluationSetup(string configFilename)
+        {
+            TomlTable config = Toml.ReadFile(configFilename);
+            foreach (string key in config.Keys.ToList())
+            {
+                if (!key.Equals("Evaluation") && !key.Equals("Nerfs"))
+                    config.Remove(key);
+            }
+
+            // The number of games and the way they are played only change
+            // the accuracy of the results, which is tracked by the number of
+            // games played of every entry.
+            TomlObject evaluation;
+            if (config.TryGetValue("Evaluation", out evaluation) &&
+                evaluation is TomlTable evaluationTable)
+            {
+                evaluationTable.Remove("NumThreads");
+                evaluationTable.Remove("EarlyStopping");
+
+                TomlObject strategies;
+                if (evaluationTable.TryGetValue("PlayerStrategies",
+                                                out strategies) &&
+                    strategies is TomlTableArray strategyArray)
+                {
+                    foreach (TomlTable strategy in strategyArray.Items)
+                        strategy.Remove("NumGames");
+                }
+            }
+
+            return Toml.WriteString(config);
+        }
+
+        /// <summary>
+        /// Number of games a deck is played with, summed over the player
+        /// strategies like NumGamesPlayed.
+        /// </summary>
+        private static int ReadNumGames(string configFilename)
+        {
+            TomlTable config = Toml.ReadFile(configFilename);
+            int numGames = 0;
+            TomlObject evaluation;
+            TomlObject strategies;
+            if (config.TryGetValue("Evaluation", out evaluation) &&
+                evaluation is TomlTable evaluationTable &&
+                evaluationTable.TryGetValue("PlayerStrategies",
+                                            out strategies) &&
+                strategies is TomlTableArray strategyArray)
+            {
+                foreach (TomlTable strategy in strategyArray.Items)
+                {
+                    TomlObject strategyGames;
+                    if (strategy.TryGetValue("NumGames", out strategyGames))
+                        numGames += strategyGames.Get<int>();
+                }
+            }
+            return numGames;
+        }
+
+        /// <summary>
+        /// Key of the entry of a deck.
+        /// </summary>
+        public string GetKey(Individual ind)
+        {
+            var cards = ind.GetCards().OrderBy(x => x, StringComparer.Ordinal);
+            string content = String.Join("\n",
+                _evaluationSetup,
+                CardReader._heroClass.ToString(),
+                String.Join("*", cards));
+
+            using (var sha = SHA256.Create())
+            {
+                byte[] hash = sha.ComputeHash(Encoding.UTF8.GetBytes(content));
+                return BitConverter.ToString(hash).Replace("-", "").ToLower();
+            }
+        }
+
+        /// <summary>
+        /// Results of a deck evaluated with enough games, null if there are
+        /// none.
+        /// </summary>
+        public ResultsMessage Lookup(string key)
+        {
+            ResultsMessage entry = Load(key);
+            if (entry == null || entry.OverallStats.StoppedEarly ||
+                entry.OverallStats.NumGamesPlayed < Math.Max(_minGames, 1))
+                return null;
+
+            NumHits++;
+            return Copy(entry);
+        }
+
+        /// <summary>
+        /// Add the results of new games with a deck to its entry. Results of
+        /// games stopped early are returned as they are.
+        /// </summary>
+        /// <returns>Results of all the games played with the deck.</returns>
+        public ResultsMessage Store(string key, ResultsMessage results)
+        {
+            if (results.OverallStats.StoppedEarly)
+                return results;
+
+            ResultsMessage entry = Load(key);
+            if (entry == null ||
+                entry.StrategyStats.Length != results.StrategyStats.Length)
+            {
+                entry = Copy(results);
+            }
+            else
+            {
+                entry.Merge(results);
+            }
+            _entries[key] = entry;
+
+            // Write to a temporary file first so that other runs sharing the
+            // cache never read a partial entry.
+            string path = GetPath(key);
+            string tmpPath = path + "." + Guid.NewGuid().ToString("N");
+            Toml.WriteFile<ResultsMessage>(entry, tmpPath);
+            File.Move(tmpPath, path, true);
+
+            return Copy(entry);
+        }
+
+        private string GetPath(string key)
+        {
+            return System.IO.Path.Combine(_directory, key + ".tml");
+        }
+
+        private ResultsMessage Load(string key)
+        {
+            ResultsMessage entry;
+            if (_entries.TryGetValue(key, out entry))
+                return entry;
+
+            string path = GetPath(key);
+            if (!File.Exists(path))
+                return null;
+            entry = Toml.ReadFile<ResultsMessage>(path);
+            _entries[key] = entry;
+            return entry;
+        }
+
+        /// <summary>
+        /// Copy of the statistics of an entry, so that individuals do not
+        /// share them with the cache.
+        /// </summary>
+        private static ResultsMessage Copy(ResultsMessage entry)
+        {
+            var results = new ResultsMessage();
+            results.PlayerDeck = entry.PlayerDeck;
+            results.OverallStats =
+                Utilities.DeepClone<OverallStatistics>(entry.OverallStats);
+            results.StrategyStats =
+                Utilities.DeepClone<StrategyStatistics[]>(entry.StrategyStats);
+            return results;
+        }
+    }
+}
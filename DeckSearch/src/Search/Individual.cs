@@ -162,6 +162,14 @@ namespace DeckSearch.Search
             return cardList.ToArray();
         }
 
+        /// <summary>
+        /// Number of copies of every card of the card set in the deck.
+        /// </summary>
+        public int[] GetCardCounts()
+        {
+            return _cardCounts;
+        }
+
         public override string ToString()
         {
             return string.Join("", _cardCounts);
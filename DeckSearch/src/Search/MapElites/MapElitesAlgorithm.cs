@@ -67,7 +67,10 @@ namespace DeckSearch.Search.MapElites
         // log directory
         private string _log_dir_exp;
 
-        public MapElitesAlgorithm(MapElitesParams config, string log_dir_exp)
+        /// <param name = "resume">whether the search is resumed from a
+        /// checkpoint, the map logs are then appended to</param>
+        public MapElitesAlgorithm(MapElitesParams config, string log_dir_exp,
+                                  bool resume = false)
         {
             _individualsDispatched = 0;
             _individualsEvaluated = 0;
@@ -80,7 +83,7 @@ namespace DeckSearch.Search.MapElites
             Toml.WriteFile<MapElitesParams>(config, config_out_path);
 
             InitMaps(_log_dir_exp);
-            InitLogs(_log_dir_exp);
+            InitLogs(_log_dir_exp, resume);
         }
 
         /// <summary>
@@ -127,14 +130,14 @@ namespace DeckSearch.Search.MapElites
         }
 
         // create logs
-        private void InitLogs(string log_dir_exp)
+        private void InitLogs(string log_dir_exp, bool append)
         {
             string ELITE_MAP_FILENAME = System.IO.Path.Combine(log_dir_exp, "elite_map_log.csv");
 
             string SURROGATE_ELITE_MAP_FILENAME = System.IO.Path.Combine(log_dir_exp, "surrogate_elite_map_log.csv");
 
-            _map_log = new FrequentMapLog(ELITE_MAP_FILENAME, _featureMap);
-            _surrogate_map_log = new FrequentMapLog(SURROGATE_ELITE_MAP_FILENAME, _surrogateFeatureMap);
+            _map_log = new FrequentMapLog(ELITE_MAP_FILENAME, _featureMap, _params.Log, append);
+            _surrogate_map_log = new FrequentMapLog(SURROGATE_ELITE_MAP_FILENAME, _surrogateFeatureMap, _params.Log, append);
         }
 
         public bool InitialPopulationEvaluated() => _individualsEvaluated >= _params.Search.InitialPopulation;
@@ -180,7 +183,9 @@ namespace DeckSearch.Search.MapElites
 
 
         /// <summary>
-        /// Add an individual to the _featureMap. Used by Surrogated Search
+        /// Add an individual to the _featureMap. Used by Surrogated Search.
+        /// Individuals whose games were stopped early are counted but not
+        /// added, their statistics are biased low by the stopping rule.
         /// </summary>
         public void AddToFeatureMap(Individual cur)
         {
@@ -189,7 +194,10 @@ namespace DeckSearch.Search.MapElites
 
             CalculateFeatures(cur);
 
-            _featureMap.Add(cur);
+            if (!cur.OverallData.StoppedEarly)
+            {
+                _featureMap.Add(cur);
+            }
         }
 
 
@@ -247,5 +255,67 @@ namespace DeckSearch.Search.MapElites
 		{
 			return this._params.Search.InitialPopulation;
 		}
+
+        /// <summary>
+        /// The cell of an individual is only known once it is evaluated, so
+        /// the threshold is the fitness of the worst elite. An individual
+        /// below it could still fill an empty cell, and the cells of a
+        /// sliding map move with every remap, so there is a threshold only
+        /// once every cell of a fixed map holds an elite.
+        /// </summary>
+        public double? GetFitnessThreshold(Individual ind)
+        {
+            var fixedMap = _featureMap as FixedFeatureMap;
+            if (fixedMap == null || !fixedMap.IsFull)
+                return null;
+            return _featureMap.EliteMap.Values.Min(x => x.Fitness);
+        }
+
+        /// <summary>
+        /// Unless it is kept, the surrogate map is cleared before every
+        /// surrogate iteration and checkpoints are written between them, so
+        /// it is not stored.
+        /// </summary>
+        public void SaveState(SearchCheckpoint checkpoint,
+                              bool storeSurrogateMap)
+        {
+            checkpoint.IndividualsEvaluated = _individualsEvaluated;
+            checkpoint.IndividualsDispatched = _individualsDispatched;
+            checkpoint.IndividualsDispatchedFromSurrMap =
+                _individualsDispatchedFromSurrMap;
+            checkpoint.FeatureMap =
+                SearchCheckpoint.Store(_featureMap.Individuals);
+            if (storeSurrogateMap)
+            {
+                checkpoint.SurrogateFeatureMap =
+                    SearchCheckpoint.Store(_surrogateFeatureMap.Individuals);
+            }
+        }
+
+        /// <summary>
+        /// The individuals are added again to the feature maps in the order
+        /// they were added, which gives the same maps as they are resized
+        /// (and remapped) depending on the number of individuals only.
+        /// </summary>
+        public void LoadState(SearchCheckpoint checkpoint, List<Card> cardSet)
+        {
+            _individualsEvaluated = checkpoint.IndividualsEvaluated;
+            _individualsDispatched = checkpoint.IndividualsDispatched;
+            _individualsDispatchedFromSurrMap =
+                checkpoint.IndividualsDispatchedFromSurrMap;
+            foreach (var ind in SearchCheckpoint.Restore(
+                checkpoint.FeatureMap, cardSet))
+            {
+                _featureMap.Add(ind);
+            }
+            if (checkpoint.SurrogateFeatureMap != null)
+            {
+                foreach (var ind in SearchCheckpoint.Restore(
+                    checkpoint.SurrogateFeatureMap, cardSet))
+                {
+                    _surrogateFeatureMap.Add(ind);
+                }
+            }
+        }
     }
 }
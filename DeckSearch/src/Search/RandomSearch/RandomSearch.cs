@@ -126,8 +126,8 @@ namespace DeckSearch.Search.RandomSearch
 
             string SURROGATE_ELITE_MAP_FILENAME = System.IO.Path.Combine(log_dir_exp, "surrogate_elite_map_log.csv");
 
-            _map_log = new FrequentMapLog(ELITE_MAP_FILENAME, _featureMap);
-            _surrogate_map_log = new FrequentMapLog(SURROGATE_ELITE_MAP_FILENAME, _surrogateFeatureMap);
+            _map_log = new FrequentMapLog(ELITE_MAP_FILENAME, _featureMap, _params.Log);
+            _surrogate_map_log = new FrequentMapLog(SURROGATE_ELITE_MAP_FILENAME, _surrogateFeatureMap, _params.Log);
         }
 
         public bool InitialPopulationEvaluated() => _individualsEvaluated >= _params.Search.InitialPopulation;
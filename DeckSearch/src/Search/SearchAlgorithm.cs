@@ -1,3 +1,4 @@
+using System;
 using System.Collections.Generic;
 using SabberStoneCore.Model;
 
@@ -83,5 +84,35 @@ namespace DeckSearch.Search
 
       int InitialPopulation() { return 0; }
 
+
+      /// <summary>
+      /// Fitness an individual has to reach to be of use to the algorithm,
+      /// null if any individual is. Sent to the evaluators so they can stop
+      /// evaluating decks that are confidently below it.
+      /// </summary>
+      double? GetFitnessThreshold(Individual ind) { return null; }
+
+
+      /// <summary>
+      /// Store the state of the algorithm in a checkpoint of the search.
+      /// </summary>
+      /// <param name = "storeSurrogateMap">whether the surrogate archive
+      /// is kept between outer iterations and has to be stored</param>
+      void SaveState(SearchCheckpoint checkpoint, bool storeSurrogateMap)
+      {
+         throw new NotSupportedException(
+            GetType().Name + " does not support checkpoints.");
+      }
+
+
+      /// <summary>
+      /// Restore the state of the algorithm from a checkpoint of the search.
+      /// </summary>
+      void LoadState(SearchCheckpoint checkpoint, List<Card> cardSet)
+      {
+         throw new NotSupportedException(
+            GetType().Name + " does not support checkpoints.");
+      }
+
    }
 }
@@ -0,0 +1,292 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Text.Json;
+
+using SabberStoneCore.Model;
+
+using SabberStoneUtil.Messaging;
+
+namespace DeckSearch.Search
+{
+    /// <summary>
+    /// Individual as stored in a checkpoint.
+    /// </summary>
+    class CheckpointIndividual
+    {
+        public int[] CardCounts { get; set; }
+        public int ID { get; set; }
+        public int ParentID { get; set; }
+        public double Fitness { get; set; }
+        public double[] Features { get; set; }
+        public OverallStatistics OverallData { get; set; }
+        public StrategyStatistics[] StrategyData { get; set; }
+
+        public CheckpointIndividual()
+        {
+        }
+
+        public CheckpointIndividual(Individual ind)
+        {
+            CardCounts = ind.GetCardCounts();
+            ID = ind.ID;
+            ParentID = ind.ParentID;
+            Fitness = ind.Fitness;
+            Features = ind.Features;
+            OverallData = ind.OverallData;
+            StrategyData = ind.StrategyData;
+        }
+
+        public Individual ToIndividual(List<Card> cardSet)
+        {
+            var ind = new Individual(CardCounts, cardSet);
+            ind.ID = ID;
+            ind.ParentID = ParentID;
+            ind.Fitness = Fitness;
+            ind.Features = Features;
+            ind.OverallData = OverallData;
+            ind.StrategyData = StrategyData;
+            return ind;
+        }
+    }
+
+    /// <summary>
+    /// State of a search, written periodically so that the search can be
+    /// resumed after its process is stopped. The surrogate model is not
+    /// stored, the checkpoint refers to the last model saved by a training.
+    /// Checkpoints are written as JSON, next to a text file holding the
+    /// config filename of the search so that they are found without being
+    /// read.
+    /// </summary>
+    class SearchCheckpoint
+    {
+        /// <summary>
+        /// Directory of the checkpoints, in the log directory of the search
+        /// </summary>
+        private const string CHECKPOINT_DIRECTORY = "checkpoints";
+
+        /// <summary>
+        /// File of the checkpoint directory holding the config filename
+        /// </summary>
+        private const string CONFIG_FILENAME_FILE = "config_filename.txt";
+
+        // Search
+        public string ConfigFilename { get; set; }
+        public string LogDirectory { get; set; }
+        public int Index { get; set; }
+        public DateTime Time { get; set; }
+
+        // DeckSearchManager
+        public double MaxWins { get; set; }
+        public double MaxFitness { get; set; }
+        // in the order they were added
+        public List<CheckpointIndividual> Buffer { get; set; }
+        // dispatched or queued but not evaluated yet, they are dispatched
+        // first when the search is resumed
+        public List<CheckpointIndividual> Pending { get; set; }
+        // length of every csv log, by path relative to the log directory
+        public Dictionary<string, long> LogLengths { get; set; }
+
+        // MapElitesAlgorithm
+        public int IndividualsEvaluated { get; set; }
+        public int IndividualsDispatched { get; set; }
+        public int IndividualsDispatchedFromSurrMap { get; set; }
+        // in the order they were added, they are added again on resume
+        public List<CheckpointIndividual> FeatureMap { get; set; }
+        // null unless the surrogate archive is kept between outer iterations
+        public List<CheckpointIndividual> SurrogateFeatureMap { get; set; }
+
+        // SurrogatedSearch
+        public bool InitialPopulationDone { get; set; }
+        public int NumOuterIterStarted { get; set; }
+        public int NumLastElites { get; set; }
+        public int NumSurrogateEvals { get; set; }
+        public int NumMAPElitesRun { get; set; }
+        // whether every individual of the buffer was given to the model
+        // in incremental training
+        public bool[] BufferTrained { get; set; }
+        // null if the model was never trained
+        public string ModelPath { get; set; }
+        public int NumModelsSaved { get; set; }
+
+        public static List<CheckpointIndividual> Store(
+            IEnumerable<Individual> individuals)
+        {
+            return individuals
+                .Select(ind => new CheckpointIndividual(ind))
+                .ToList();
+        }
+
+        public static List<Individual> Restore(
+            List<CheckpointIndividual> individuals, List<Card> cardSet)
+        {
+            return individuals
+                .Select(ind => ind.ToIndividual(cardSet))
+                .ToList();
+        }
+
+        /// <summary>
+        /// Write the checkpoint in the log directory and delete the older
+        /// ones beyond the `numToKeep` latest.
+        /// </summary>
+        public void Write(int numToKeep)
+        {
+            string checkpointDir = System.IO.Path.Combine(
+                LogDirectory, CHECKPOINT_DIRECTORY);
+            System.IO.Directory.CreateDirectory(checkpointDir);
+
+            // Write to a temporary file first so that a search stopped while
+            // writing leaves the previous checkpoint intact.
+            string path = GetPath(checkpointDir, Index);
+            string tmpPath = path + "." + Guid.NewGuid().ToString("N");
+            File.WriteAllBytes(
+                tmpPath, JsonSerializer.SerializeToUtf8Bytes(this));
+            File.Move(tmpPath, path, true);
+            File.WriteAllText(
+                System.IO.Path.Combine(checkpointDir, CONFIG_FILENAME_FILE),
+                ConfigFilename);
+
+            foreach (int index in GetIndices(checkpointDir))
+            {
+                if (index <= Index - Math.Max(numToKeep, 1))
+                {
+                    File.Delete(GetPath(checkpointDir, index));
+                }
+            }
+        }
+
+        public static SearchCheckpoint Read(string path)
+        {
+            return JsonSerializer.Deserialize<SearchCheckpoint>(
+                File.ReadAllBytes(path));
+        }
+
+        /// <summary>
+        /// Latest checkpoint of the search logged in `logDir`, null if
+        /// there is none.
+        /// </summary>
+        public static SearchCheckpoint ReadLatest(string logDir)
+        {
+            string path = GetLatestPath(logDir);
+            return path == null ? null : Read(path);
+        }
+
+        /// <summary>
+        /// Latest checkpoint of the searches run with `configFilename` whose
+        /// logs are in `logRootDir`, null if there is none.
+        /// </summary>
+        public static SearchCheckpoint FindLatest(
+            string configFilename, string logRootDir)
+        {
+            if (!System.IO.Directory.Exists(logRootDir))
+            {
+                return null;
+            }
+
+            // only the latest checkpoint of the searches run with the config
+            // is read
+            string configPath = System.IO.Path.GetFullPath(configFilename);
+            string latestPath = System.IO.Directory.GetDirectories(logRootDir)
+                .Where(logDir => configPath.Equals(ReadConfigPath(logDir)))
+                .Select(GetLatestPath)
+                .Where(path => path != null)
+                .OrderByDescending(path => File.GetLastWriteTimeUtc(path))
+                .FirstOrDefault();
+            return latestPath == null ? null : Read(latestPath);
+        }
+
+        /// <summary>
+        /// Full path of the config of the search logged in `logDir`, null if
+        /// it has no checkpoint.
+        /// </summary>
+        private static string ReadConfigPath(string logDir)
+        {
+            string path = System.IO.Path.Combine(
+                logDir, CHECKPOINT_DIRECTORY, CONFIG_FILENAME_FILE);
+            if (!File.Exists(path))
+            {
+                return null;
+            }
+            return System.IO.Path.GetFullPath(File.ReadAllText(path).Trim());
+        }
+
+        /// <summary>
+        /// Length of every csv log of the search, by path relative to the
+        /// log directory.
+        /// </summary>
+        public static Dictionary<string, long> GetLogLengths(string logDir)
+        {
+            var lengths = new Dictionary<string, long>();
+            foreach (string path in System.IO.Directory.GetFiles(
+                logDir, "*.csv", SearchOption.AllDirectories))
+            {
+                lengths[System.IO.Path.GetRelativePath(logDir, path)] =
+                    new FileInfo(path).Length;
+            }
+            return lengths;
+        }
+
+        /// <summary>
+        /// Truncate the csv logs to their length when the checkpoint was
+        /// written and delete those created after it, so that the resumed
+        /// search does not log the same individuals twice.
+        /// </summary>
+        public void RestoreLogs()
+        {
+            foreach (string path in System.IO.Directory.GetFiles(
+                LogDirectory, "*.csv", SearchOption.AllDirectories))
+            {
+                long length;
+                string name = System.IO.Path.GetRelativePath(
+                    LogDirectory, path);
+                if (!LogLengths.TryGetValue(name, out length))
+                {
+                    File.Delete(path);
+                }
+                else if (new FileInfo(path).Length > length)
+                {
+                    using (var fs = new FileStream(path, FileMode.Open))
+                    {
+                        fs.SetLength(length);
+                    }
+                }
+            }
+        }
+
+        private static string GetPath(string checkpointDir, int index)
+        {
+            return System.IO.Path.Combine(
+                checkpointDir, String.Format("checkpoint{0}.json", index));
+        }
+
+        private static IEnumerable<int> GetIndices(string checkpointDir)
+        {
+            foreach (string path in System.IO.Directory.GetFiles(
+                checkpointDir, "checkpoint*.json"))
+            {
+                int index;
+                string name = System.IO.Path.GetFileNameWithoutExtension(path);
+                if (Int32.TryParse(name.Substring("checkpoint".Length),
+                                   out index))
+                {
+                    yield return index;
+                }
+            }
+        }
+
+        private static string GetLatestPath(string logDir)
+        {
+            string checkpointDir = System.IO.Path.Combine(
+                logDir, CHECKPOINT_DIRECTORY);
+            if (!System.IO.Directory.Exists(checkpointDir))
+            {
+                return null;
+            }
+
+            var indices = GetIndices(checkpointDir).ToList();
+            return indices.Count == 0 ?
+                null : GetPath(checkpointDir, indices.Max());
+        }
+    }
+}
@@ -15,7 +15,8 @@ using DeckSearch.Logging;
 namespace DeckSearch.Search
 {
     /// <summary>
-    /// A helper class to communicate with DeckEvaluator through File IO
+    /// A helper class to communicate with DeckEvaluator through a
+    /// SearchTransport (File IO by default)
     /// </summary>
     public class SearchManager
     {
@@ -53,30 +54,23 @@ namespace DeckSearch.Search
         public Configuration config { get; private set; }
 
 
-        // Directory names
-        private const string ACTIVE_DIRECTORY = "active/";
-        private const string BOXES_DIRECTORY = "boxes/";
-
-
         /// <summary>
-        /// File path for the Search Manager to send evaluation job to the evaluators
+        /// Channel used to exchange jobs and results with the DeckEvaluators
         /// </summary>
-        protected const string _inboxTemplate = BOXES_DIRECTORY
-               + "deck-{0,4:D4}-inbox.tml";
+        protected SearchTransport _transport { get; private set; }
 
-        /// <summary>
-        /// File path for the Search Manager to receive evaluation result from the evaluators
-        /// </summary>
-        protected const string _outboxTemplate = BOXES_DIRECTORY
-               + "deck-{0,4:D4}-outbox.tml";
 
         /// <summary>
-        /// File path to write a file so that the workers know that a search is available
+        /// Results of the decks evaluated so far, null if disabled.
         /// </summary>
-        protected const string _activeSearchPath = ACTIVE_DIRECTORY
-               + "search.txt";
+        protected EvaluationCache _evaluationCache { get; private set; }
 
 
+        /// <summary>
+        /// Individuals whose results were found in the evaluation cache and
+        /// that are not processed yet.
+        /// </summary>
+        private Queue<Individual> _cachedIndividuals;
 
 
         // private int _numToEvaluate = 0;
@@ -91,41 +85,42 @@ namespace DeckSearch.Search
             _idleWorkers = new Queue<int>();
             _individualStable = new Dictionary<int, Individual>();
             _workerRunningTimes = new Dictionary<int, DateTime>();
+            _cachedIndividuals = new Queue<Individual>();
 
             // Grab the configuration info
             _configFilename = configFilename;
             config = Toml.ReadFile<Configuration>(_configFilename);
+            _transport = SearchTransport.Create(config.Transport);
+            if (config.EvaluationCache != null)
+            {
+                _evaluationCache = new EvaluationCache(
+                    config.EvaluationCache, _configFilename);
+            }
         }
 
 
 
-        /// <summary>
-        /// Helper function to write text to specified stream
-        /// </summary>
-        private static void WriteText(Stream fs, string s)
-        {
-            s += "\n";
-            byte[] info = new UTF8Encoding(true).GetBytes(s);
-            fs.Write(info, 0, info.Length);
-        }
-
         /// <summary>
         /// Function to announce DeckEvaluator instances that SearchAlgorithm is available
         /// <summary>
         public void AnnounceWorkersStart()
         {
-            using (FileStream ow = File.Open(_activeSearchPath,
-                     FileMode.Create, FileAccess.Write, FileShare.None))
-            {
-                WriteText(ow, "MAP Elites");
-                WriteText(ow, _configFilename);
-                ow.Close();
-            }
+            _transport.AnnounceStart(_configFilename);
         }
 
         public void AnnounceWorkersDone()
         {
-            File.Delete(_activeSearchPath);
+            _transport.AnnounceDone();
+        }
+
+        /// <summary>
+        /// Wait until a worker may have joined or finished a job, at most
+        /// `timeoutMillisec`. Returns immediately with transports that
+        /// notify the search.
+        /// </summary>
+        public void WaitForWorkers(int timeoutMillisec = 1000)
+        {
+            _transport.WaitForWorkers(timeoutMillisec);
         }
 
         /// <summary>
@@ -133,80 +128,72 @@ namespace DeckSearch.Search
         /// </summary>
         public void FindNewWorkers()
         {
-            // Look for new workers.
-            string[] hailingFiles = new string[] { };
-            try
-            {
-                hailingFiles = Directory.GetFiles(ACTIVE_DIRECTORY);
-            }
-            catch (System.IO.IOException e)
-            {
-                Console.WriteLine("IOException catched while reading hailing files. Will retry...");
-                Console.WriteLine("###########");
-                Console.WriteLine(e.StackTrace);
-                Console.WriteLine("###########");
-                return;
-            }
-            foreach (string activeFile in hailingFiles)
+            foreach (int workerId in _transport.FindNewWorkers())
             {
-                string prefix = ACTIVE_DIRECTORY + "worker-";
-                if (activeFile.StartsWith(prefix))
+                _idleWorkers.Enqueue(workerId);
+                // avoid key error
+                if (!_individualStable.ContainsKey(workerId))
                 {
-                    string suffix = ".txt";
-                    int start = prefix.Length;
-                    int end = activeFile.Length - suffix.Length;
-                    string label = activeFile.Substring(start, end - start);
-                    int workerId = Int32.Parse(label);
-                    _idleWorkers.Enqueue(workerId);
-                    // avoid key error
-                    if (!_individualStable.ContainsKey(workerId))
-                    {
-                        _individualStable.Add(workerId, null);
-                        Utilities.WriteLineWithTimestamp(
-                            String.Format("Found worker: {0} ", workerId));
-                    }
-                    try
-                    {
-                        File.Delete(activeFile);
-                    }
-                    catch (Exception e)
-                    {
-                        Console.WriteLine("Exception while deleting: {0}",
-                                          e.GetType().ToString());
-                        Console.WriteLine(e.StackTrace);
-                    }
+                    _individualStable.Add(workerId, null);
+                    Utilities.WriteLineWithTimestamp(
+                        String.Format("Found worker: {0} ", workerId));
                 }
             }
         }
 
 
         /// <summary>
-        /// Function to dispatch one simulation job to DeckEvaluator
+        /// Function to dispatch one simulation job to DeckEvaluator. Decks
+        /// found in the evaluation cache are not dispatched, their results
+        /// are processed with the next FindDoneWorkers. Idle workers the job
+        /// can not be sent to are gone and dropped, the job goes to the next
+        /// idle one.
         /// </summary>
         /// <returns> 1 for success, 0 for failure.
         public int DispatchOneJobToWorker(Individual choiceIndividual)
         {
-            if (_idleWorkers.Count == 0)
+            if (_evaluationCache != null)
             {
-                return 0;
+                var results = _evaluationCache.Lookup(
+                    _evaluationCache.GetKey(choiceIndividual));
+                if (results != null)
+                {
+                    ReceiveResults(results, choiceIndividual);
+                    _cachedIndividuals.Enqueue(choiceIndividual);
+                    Utilities.WriteLineWithTimestamp(String.Format(
+                        "Evaluation cache hit ({0} games, {1} hits)",
+                        results.OverallStats.NumGamesPlayed,
+                        _evaluationCache.NumHits));
+                    return 1;
+                }
+            }
+
+            while (_idleWorkers.Count > 0)
+            {
+                int workerId = _idleWorkers.Dequeue();
+                if (!SendWork(workerId, choiceIndividual))
+                {
+                    Utilities.WriteLineWithTimestamp(
+                        String.Format("Worker lost: {0}", workerId));
+                    continue;
+                }
+                _runningWorkers.Enqueue(workerId);
+                _workerRunningTimes[workerId] = DateTime.UtcNow;
+                Utilities.WriteLineWithTimestamp(
+                    String.Format("Worker start: {0}", workerId));
+
+                _individualStable[workerId] = choiceIndividual;
+                return 1;
             }
-            int workerId = _idleWorkers.Dequeue();
-            _runningWorkers.Enqueue(workerId);
-            string inboxPath = string.Format(_inboxTemplate, workerId);
-            SendWork(inboxPath, choiceIndividual);
-            _workerRunningTimes[workerId] = DateTime.UtcNow;
-            Utilities.WriteLineWithTimestamp(
-                String.Format("Worker start: {0}", workerId));
-
-            _individualStable[workerId] = choiceIndividual;
-            return 1;
+            return 0;
         }
 
 
         /// <summary>
-        /// Helper function to send simulation work to DeckEvaluator instance
+        /// Helper function to send simulation work to DeckEvaluator instance,
+        /// returns false if the worker is gone
         /// </summary>
-        private void SendWork(string workerInboxPath, Individual cur)
+        private bool SendWork(int workerId, Individual cur)
         {
             var deckParams = new DeckParams();
             deckParams.ClassName = CardReader._heroClass.ToString().ToLower();
@@ -214,8 +201,28 @@ namespace DeckSearch.Search
 
             var msg = new PlayMatchesMessage();
             msg.Deck = deckParams;
+            msg.FitnessThreshold = GetFitnessThreshold(cur);
+            msg.NumGames = GetNumGames(cur);
 
-            Toml.WriteFile<PlayMatchesMessage>(msg, workerInboxPath);
+            return _transport.SendWork(workerId, msg);
+        }
+
+        /// <summary>
+        /// Fitness the individual has to reach to be of use to the search,
+        /// null if any individual is.
+        /// </summary>
+        protected virtual double? GetFitnessThreshold(Individual cur)
+        {
+            return null;
+        }
+
+        /// <summary>
+        /// Number of games to play with the individual for each strategy,
+        /// null for the number in the config.
+        /// </summary>
+        protected virtual int? GetNumGames(Individual cur)
+        {
+            return null;
         }
 
         /// <summary>
@@ -223,22 +230,32 @@ namespace DeckSearch.Search
         /// </summary>
         public void FindDoneWorkers(System.Action<Individual> ProcessResult)
         {
+            // Individuals evaluated from the cache are done right away.
+            while (_cachedIndividuals.Count > 0)
+                ProcessResult(_cachedIndividuals.Dequeue());
+
             // Look for individuals that are done.
             int numActiveWorkers = _runningWorkers.Count;
             for (int i = 0; i < numActiveWorkers; i++)
             {
                 int workerId = _runningWorkers.Dequeue();
-                string inboxPath = string.Format(DeckSearchManager._inboxTemplate, workerId);
-                string outboxPath = string.Format(DeckSearchManager._outboxTemplate, workerId);
 
                 // Test if this worker is done.
-                if (File.Exists(outboxPath) && !File.Exists(inboxPath))
+                var results = _transport.ReceiveResults(workerId);
+                if (results != null)
                 {
-                    // Wait for the file to finish being written.
                     Utilities.WriteLineWithTimestamp(
                         String.Format("Worker done: {0}", workerId));
 
-                    ReceiveResults(outboxPath, _individualStable[workerId]);
+                    // Merge with the games played with this deck before.
+                    if (_evaluationCache != null)
+                    {
+                        Individual cur = _individualStable[workerId];
+                        results = _evaluationCache.Store(
+                            _evaluationCache.GetKey(cur), results);
+                    }
+
+                    ReceiveResults(results, _individualStable[workerId]);
                     ProcessResult(_individualStable[workerId]);
 
                     _idleWorkers.Enqueue(workerId);
@@ -288,14 +305,32 @@ namespace DeckSearch.Search
         }
 
         /// <summary>
-        /// Heper function to receive results from DeckEvaluators
+        /// Individuals dispatched whose results are not processed yet: those
+        /// evaluated by the running workers and those found in the
+        /// evaluation cache. An individual redispatched from an overtime
+        /// worker is listed once.
         /// </summary>
-        protected void ReceiveResults(string workerOutboxPath, Individual cur)
+        protected List<Individual> GetUnfinishedIndividuals()
         {
-            // Read the message and then delete the file.
-            var results = Toml.ReadFile<ResultsMessage>(workerOutboxPath);
-            File.Delete(workerOutboxPath);
+            // Individual.Equals compares IDs, which are only given once the
+            // individuals are evaluated.
+            var unfinished = new List<Individual>(_cachedIndividuals);
+            foreach (int workerId in _runningWorkers)
+            {
+                Individual cur = _individualStable[workerId];
+                if (!unfinished.Exists(ind => Object.ReferenceEquals(ind, cur)))
+                {
+                    unfinished.Add(cur);
+                }
+            }
+            return unfinished;
+        }
 
+        /// <summary>
+        /// Heper function to receive results from DeckEvaluators
+        /// </summary>
+        protected void ReceiveResults(ResultsMessage results, Individual cur)
+        {
             // Save the statistics for this individual.
             cur.OverallData = results.OverallStats;
             cur.StrategyData = results.StrategyStats;
@@ -1,6 +1,8 @@
 using System;
 using System.Linq;
+using System.Reflection;
 using System.Threading;
+using System.Threading.Tasks;
 using System.Diagnostics;
 using System.Collections.Generic;
 
@@ -30,6 +32,12 @@ namespace DeckSearch.Search
         /// </summary>
         private int _numToEvaluatePerGen;
 
+        /// <summary>
+        /// Number of individuals generated and evaluated on the surrogate
+        /// model at once
+        /// </summary>
+        private int _surrogateBatchSize;
+
         /// <summary>
         /// Log length of surrogate elite map
         /// </summary>
@@ -67,6 +75,9 @@ namespace DeckSearch.Search
         private string[] _modelTargets;
 
 
+        private PropertyInfo[] _modelTargetProperties;
+
+
         private bool _useFixedModel = false;
 
 
@@ -79,21 +90,65 @@ namespace DeckSearch.Search
         private bool _skipInitPopulation = false;
 
 
+        private bool _pipelined = false;
+
+
+        /// <summary>
+        /// Parameters of incremental training, null to retrain on the whole
+        /// buffer every outer iteration
+        /// </summary>
+        private IncrementalTrainingParams _incrementalTraining;
+
+
+        /// <summary>
+        /// Individuals of the buffer already given to the surrogate model
+        /// in incremental training
+        /// </summary>
+        private HashSet<Individual> _trainedIndividuals =
+            new HashSet<Individual>();
+
+
+        /// <summary>
+        /// Whether the initial population was evaluated, the search might
+        /// have been resumed after it
+        /// </summary>
+        private bool _initialPopulationDone = false;
+
+
+        /// <summary>
+        /// Number of outer iterations started
+        /// </summary>
+        private int _numOuterIterStarted = 0;
+
+
+        /// <summary>
+        /// Number of elites of the last surrogate iteration
+        /// </summary>
+        private int _numLastElites = 0;
+
+
         /// <summary>
         /// Constructor
         /// </summary>
         /// <param name = "configFilename">name of the configuation file</param>
-        public SurrogatedSearch(string configFilename)
+        /// <param name = "checkpoint">checkpoint to resume the search from,
+        /// null to start a new search</param>
+        public SurrogatedSearch(string configFilename,
+                                SearchCheckpoint checkpoint = null)
         {
-            _searchManager = new DeckSearchManager(configFilename);
+            _searchManager = new DeckSearchManager(configFilename, checkpoint);
             var config = _searchManager.config;
             _numGeneration = config.Search.NumGeneration;
             _numToEvaluatePerGen = config.Search.NumToEvaluatePerGeneration;
+            _surrogateBatchSize = config.Search.SurrogateBatchSize > 0 ?
+                config.Search.SurrogateBatchSize : _numToEvaluatePerGen;
             _numSurrogateEvals = _searchManager.searchAlgo.InitialPopulation();
             _logLengthPerGen = config.Search.LogLengthPerGen;
             _testOutOfDist = config.Surrogate.TestOutOfDist;
             _keepSurrogateArchive = config.Search.KeepSurrogateArchive;
             _skipInitPopulation = config.Search.SkipInitPopulation;
+            _incrementalTraining = config.Surrogate.IncrementalTraining;
+            _pipelined = config.Search.Pipelined;
 
             if (_testOutOfDist)
             {
@@ -113,6 +168,20 @@ namespace DeckSearch.Search
                     "Will skip initial population.");
             }
 
+            if (_pipelined)
+            {
+                Utilities.WriteLineWithTimestamp(
+                    "Surrogate search will run while elites are evaluated.");
+            }
+
+            if (_incrementalTraining != null)
+            {
+                Utilities.WriteLineWithTimestamp(
+                    String.Format(
+                        "Surrogate model is trained incrementally for {0} steps per outer iteration.",
+                        _incrementalTraining.NumSteps));
+            }
+
             // If number of outer iteration is specified, stop after the specified number of outer iterations or number of evals.
             if (config.Search.NumOuterIterations != null)
             {
@@ -174,7 +243,67 @@ namespace DeckSearch.Search
 
             // get model targets
             _modelTargets = _surrogateModel.model_targets;
+            _modelTargetProperties = _modelTargets
+                .Select(target => typeof(OverallStatistics).GetProperty(target))
+                .ToArray();
+
+            if (checkpoint != null)
+            {
+                _initialPopulationDone = checkpoint.InitialPopulationDone;
+                _numOuterIterStarted = checkpoint.NumOuterIterStarted;
+                _numLastElites = checkpoint.NumLastElites;
+                _numSurrogateEvals = checkpoint.NumSurrogateEvals;
+                _numMAPElitesRun = checkpoint.NumMAPElitesRun;
+
+                // the buffer is restored in the order it was stored
+                var buffer = _searchManager._individualsBuffer.ToList();
+                for (int i = 0; i < buffer.Count; i++)
+                {
+                    if (checkpoint.BufferTrained[i])
+                    {
+                        _trainedIndividuals.Add(buffer[i]);
+                    }
+                }
+
+                if (!_useFixedModel)
+                {
+                    _surrogateModel.Resume(
+                        checkpoint.ModelPath,
+                        checkpoint.NumModelsSaved,
+                        ConvertIndividuals(buffer
+                            .Where(ind => _trainedIndividuals.Contains(ind))
+                            .ToList()));
+                    Utilities.WriteLineWithTimestamp(
+                        String.Format("Resumed model from {0}",
+                                      checkpoint.ModelPath ?? "its initial weights"));
+                }
+            }
+        }
 
+        /// <summary>
+        /// Write a checkpoint of the search if one is due. Must not be called
+        /// while a surrogate iteration runs on another thread.
+        /// </summary>
+        /// <param name = "queued">elites not dispatched yet</param>
+        private void CheckpointIfDue(IEnumerable<Individual> queued = null)
+        {
+            if (!_searchManager.CheckpointDue())
+            {
+                return;
+            }
+
+            var checkpoint = _searchManager.CreateCheckpoint(queued);
+            checkpoint.InitialPopulationDone = _initialPopulationDone;
+            checkpoint.NumOuterIterStarted = _numOuterIterStarted;
+            checkpoint.NumLastElites = _numLastElites;
+            checkpoint.NumSurrogateEvals = _numSurrogateEvals;
+            checkpoint.NumMAPElitesRun = _numMAPElitesRun;
+            checkpoint.BufferTrained = _searchManager._individualsBuffer
+                .Select(ind => _trainedIndividuals.Contains(ind))
+                .ToArray();
+            checkpoint.ModelPath = _surrogateModel.last_model_path;
+            checkpoint.NumModelsSaved = _surrogateModel.num_models_saved;
+            _searchManager.WriteCheckpoint(checkpoint);
         }
 
         /// <summary>
@@ -221,12 +350,23 @@ namespace DeckSearch.Search
         }
 
         /// <summary>
-        /// Function to run SurrogateModel Evaluation and record results
+        /// Function to run SurrogateModel Evaluation and record results.
+        /// The card counts of the individuals are fed to the model as they
+        /// are, in a single batch.
         /// </summary>
         public void EvaluateOnSurrogate(List<Individual> individuals)
         {
-            var logIndividuals = ConvertIndividuals(individuals, includeStats: false);
-            var result = _surrogateModel.Predict(logIndividuals);
+            int numCards = CardReader._cardSet.Count;
+            var cardCounts = new int[individuals.Count, numCards];
+            for(int i = 0; i < individuals.Count; i++)
+            {
+                int[] counts = individuals[i].GetCardCounts();
+                for(int j = 0; j < numCards; j++)
+                {
+                    cardCounts[i, j] = counts[j];
+                }
+            }
+            var result = _surrogateModel.Predict(cardCounts);
 
             // update statistics of individuals
             for(int i = 0; i < individuals.Count; i++)
@@ -239,10 +379,7 @@ namespace DeckSearch.Search
                 individual.OverallData = new OverallStatistics();
                 for(int j = 0; j < _modelTargets.Length; j++)
                 {
-                    string target = _modelTargets[j];
-                    individual.OverallData
-                        .GetType()
-                        .GetProperty(target)
+                    _modelTargetProperties[j]
                         .SetValue(individual.OverallData, result[i, j]);
                 }
 
@@ -264,6 +401,20 @@ namespace DeckSearch.Search
                     "Buffer is empty. Skipping backprop...");
                 return;
             }
+
+            // only train on the individuals added since the last training
+            if (_incrementalTraining != null)
+            {
+                var newIndividuals = individuals
+                    .Where(individual => _trainedIndividuals.Add(individual))
+                    .ToList();
+                _surrogateModel.IncrementalFit(
+                    ConvertIndividuals(newIndividuals),
+                    _incrementalTraining,
+                    _testOutOfDist);
+                return;
+            }
+
             var logIndividuals = ConvertIndividuals(individuals);
             _surrogateModel.OnlineFit(logIndividuals, _testOutOfDist);
         }
@@ -281,160 +432,310 @@ namespace DeckSearch.Search
         }
 
         /// <summary>
-        /// Function to run the SurrogatedSearch algorithm
+        /// Train the surrogate model on `indsToTrain`, unless it is fixed,
+        /// and run MAP-Elites on it. Returns the elites of the surrogate
+        /// archive, to be evaluated for real.
         /// </summary>
-        public void Run()
+        private List<Individual> RunSurrogateIteration(List<Individual> indsToTrain)
         {
-            // let the workers know that searchAlgo is avialble
-            _searchManager.AnnounceWorkersStart();
-            Utilities.WriteLineWithTimestamp("Begin Surrogated Search...");
-
+            // back prop using individuals in the buffer
+            if (!_useFixedModel)
+            {
+                BackProp(indsToTrain);
+            }
 
-            if (!_skipInitPopulation)
+            // clear the surrogate map
+            if (!_keepSurrogateArchive)
             {
-                // generate initial population
-                while(!_searchManager.searchAlgo.InitialPopulationEvaluated())
-                {
-                    // dispatch jobs until the number reaches
-                    // initial population size
-                    _searchManager.FindNewWorkers();
+                _searchManager.searchAlgo.ClearSurrogateMap();
+                Utilities.WriteLineWithTimestamp(
+                    "Surrogate archive is cleared.");
+            }
+            else
+            {
+                Utilities.WriteLineWithTimestamp(
+                    "Surrogate archive is kept.");
+            }
 
-                    // dispatch initial population
-                    _searchManager.DispatchInitJobsToWorkers();
+            // run MAP-Elites on surrogate
+            Utilities.WriteLineWithTimestamp(
+                String.Format("Running {0} generations of Map-Elites, each with {1} individuals, in batches of {2} individuals",
+                              _numGeneration, _numToEvaluatePerGen,
+                              _surrogateBatchSize));
 
-                    // wait for workers to finish evaluating initial population
-                    _searchManager.FindDoneWorkers(
-                        storeBuffer: true,
-                        logFeatureMap: true);
-                    Thread.Sleep(1000);
-                }
-            }
+            // the individuals of a batch are all generated from the
+            // archive before any of them is inserted, so the batch size
+            // is the effective generation size
+            int numToEvaluate = _numGeneration * _numToEvaluatePerGen;
 
-            _searchManager.numEvaledPerRun = 0;
-            List<Individual> indsToTrain;
-            int currNumOuterIter = 0;
+            // verbose exactly 10 times
+            int verboseLogLength = Math.Max(numToEvaluate / 10, 1);
 
-            while(_searchManager.searchAlgo.IsRunning() &&
-                  currNumOuterIter < _numOuterIterations)
+            for(int numEvaluated = 0; numEvaluated < numToEvaluate; )
             {
-                // back prop using individuals in the buffer
-                if (!_useFixedModel)
+                // generate one batch of individuals
+                int currBatchSize = Math.Min(
+                    _surrogateBatchSize, numToEvaluate - numEvaluated);
+                List<Individual> currBatch = new List<Individual>(currBatchSize);
+                for(int j=0; j<currBatchSize; j++)
                 {
-                    indsToTrain = _searchManager._individualsBuffer.ToList();
-                    indsToTrain.Shuffle();
-                    BackProp(_searchManager._individualsBuffer.ToList());
+                    Individual choiceIndividual =
+                        _searchManager.searchAlgo.GenerateIndividualFromSurrogateMap(
+                                CardReader._cardSet);
+                    currBatch.Add(choiceIndividual);
                 }
+                EvaluateOnSurrogate(currBatch);
 
-                // clear the surrogate map
-                if (!_keepSurrogateArchive)
+                // log the evaluated individuals
+                // add evaluated individuals to feature map and outer feature map
+                foreach(var individual in currBatch)
                 {
-                    _searchManager.searchAlgo.ClearSurrogateMap();
-                    Utilities.WriteLineWithTimestamp(
-                        "Surrogate archive is cleared.");
+                    _searchManager.searchAlgo.AddToSurrogateFeatureMap(individual);
                 }
-                else
+
+                int prevNumEvaluated = numEvaluated;
+                numEvaluated += currBatchSize;
+                if (numEvaluated / verboseLogLength >
+                    prevNumEvaluated / verboseLogLength)
                 {
                     Utilities.WriteLineWithTimestamp(
-                        "Surrogate archive is kept.");
+                        String.Format("Generation {0} completed...",
+                                      numEvaluated / _numToEvaluatePerGen));
                 }
+            }
 
-                // run MAP-Elites on surrogate
-                Utilities.WriteLineWithTimestamp(
-                    String.Format("Running {0} generations of Map-Elites, each with {1} individuals",
-                                  _numGeneration, _numToEvaluatePerGen));
+            // log feature map
+            _searchManager.searchAlgo.LogSurrogateFeatureMap();
+
+            // get elites to evaluate for real
+            var elites = _searchManager.GetAllElitesFromSurrogateMap();
 
-                // verbose exactly 10 times
-                int verboseLogLength = _numGeneration/10;
+            // log all elites for the current MAP-Elites run
+            string surrogate_log_file = System.IO.Path.Combine(_surrogateElitesLogDir,
+                 String.Format("surrogate_elites_log{0}.csv",
+                               this._numMAPElitesRun));
+            this._numMAPElitesRun += 1;
 
-                for(int i=0; i<_numGeneration; i++)
+            this._individualLog = new RunningIndividualLog(surrogate_log_file);
+            for (int i=0; i<elites.Count; i++)
+            {
+                this._individualLog.LogIndividual(elites[i]);
+            }
+            return elites;
+        }
+
+        /// <summary>
+        /// Dispatch the elites of a surrogate iteration and wait until all
+        /// of them are evaluated.
+        /// </summary>
+        private void EvaluateElites(List<Individual> elites)
+        {
+            Utilities.WriteLineWithTimestamp(
+                String.Format("Get {0} elites. Start evaluation...",
+                              elites.Count));
+            int eliteIdx = 0; // index of elite to dispatch, also the number of elites dispatched.
+            while(_searchManager.numEvaledPerRun < elites.Count)
+            {
+                _searchManager.FindNewWorkers();
+
+                // need to dispatch elites, to every idle worker
+                while(eliteIdx < elites.Count &&
+                      _searchManager.DispatchOneJobToWorker(
+                          choiceIndividual: new Individual(elites[eliteIdx])) == 1)
                 {
-                    // generate one generation of individuals
-                    List<Individual> currGeneration = new List<Individual>();
-                    for(int j=0; j<_numToEvaluatePerGen; j++)
-                    {
-                        Individual choiceIndividual =
-                            _searchManager.searchAlgo.GenerateIndividualFromSurrogateMap(
-                                    CardReader._cardSet);
-                        currGeneration.Add(choiceIndividual);
-                    }
-                    EvaluateOnSurrogate(currGeneration);
+                    eliteIdx++;
+                }
 
-                    // log the evaluated individuals
-                    // add evaluated individuals to feature map and outer feature map
-                    foreach(var individual in currGeneration)
-                    {
-                        _searchManager.searchAlgo.AddToSurrogateFeatureMap(individual);
-                    }
+                // wait for workers to finish evaluating all elites
+                _searchManager.FindDoneWorkers(
+                    storeBuffer: true,
+                    keepIndID: true,
+                    logFeatureMap: true);
+                CheckpointIfDue(elites.Skip(eliteIdx));
+                _searchManager.FindOvertimeWorkers();
+                _searchManager.WaitForWorkers();
+            }
 
-                    if ((i+1) % verboseLogLength == 0)
+            // some verbose info
+            Utilities.WriteLineWithTimestamp(
+                String.Format("Finished evaluating {0} elites",
+                              _searchManager.numEvaledPerRun));
+            Utilities.WriteLineWithTimestamp(
+                String.Format("Current number of training individuals: {0}",
+                              _searchManager._individualsBuffer.Count));
+
+            // reset num evals per run
+            _searchManager.numEvaledPerRun = 0;
+        }
+
+        /// <summary>
+        /// Run the outer iterations one after the other: train, run
+        /// MAP-Elites on the surrogate model, then evaluate its elites.
+        /// </summary>
+        /// <param name = "resumedElites">elites of the outer iteration that
+        /// was running when the search was checkpointed, not evaluated
+        /// yet</param>
+        private void RunPhased(List<Individual> resumedElites)
+        {
+            if (resumedElites.Count > 0)
+            {
+                EvaluateElites(resumedElites);
+            }
+
+            while(_searchManager.searchAlgo.IsRunning() &&
+                  _numOuterIterStarted < _numOuterIterations)
+            {
+                // increment number of outer evals
+                _numOuterIterStarted += 1;
+
+                var elites = RunSurrogateIteration(
+                    _searchManager._individualsBuffer.ToList());
+                EvaluateElites(elites);
+            }
+        }
+
+        /// <summary>
+        /// Run the outer iterations as a pipeline: the surrogate iterations
+        /// run on a background thread while the elites of the previous ones
+        /// are evaluated, and queued elites are dispatched as soon as a
+        /// worker is idle. An iteration trains on the individuals evaluated
+        /// when it starts. The next iteration starts once the queue holds no
+        /// more than the elites of the last iteration, so that the surrogate
+        /// search stays about one iteration ahead of the workers.
+        /// Checkpoints are written between two surrogate iterations only.
+        /// </summary>
+        /// <param name = "resumedElites">elites that were queued or being
+        /// evaluated when the search was checkpointed</param>
+        private void RunPipelined(List<Individual> resumedElites)
+        {
+            var eliteQueue = new Queue<Individual>(resumedElites);
+            Task<List<Individual>> surrogateTask = null;
+            int numDispatched = 0;
+
+            while(_searchManager.searchAlgo.IsRunning())
+            {
+                // queue the elites of the surrogate iteration that is done
+                if (surrogateTask != null && surrogateTask.IsCompleted)
+                {
+                    var elites = surrogateTask.Result;
+                    surrogateTask = null;
+                    foreach (var elite in elites)
                     {
-                        Utilities.WriteLineWithTimestamp(
-                            String.Format("Generation {0} completed...", i+1));
+                        eliteQueue.Enqueue(new Individual(elite));
                     }
+                    _numLastElites = elites.Count;
+                    Utilities.WriteLineWithTimestamp(
+                        String.Format("Get {0} elites, {1} elites are queued for evaluation",
+                                      elites.Count, eliteQueue.Count));
                 }
 
-                // log feature map
-                _searchManager.searchAlgo.LogSurrogateFeatureMap();
+                // the surrogate model and archive are not in use here
+                if (surrogateTask == null)
+                {
+                    CheckpointIfDue(eliteQueue);
+                }
+
+                // start the next surrogate iteration
+                if (surrogateTask == null &&
+                    _numOuterIterStarted < _numOuterIterations &&
+                    eliteQueue.Count <= _numLastElites)
+                {
+                    var indsToTrain = _searchManager._individualsBuffer.ToList();
+                    surrogateTask = Task.Run(
+                        () => RunSurrogateIteration(indsToTrain));
+                    _numOuterIterStarted++;
+                    Utilities.WriteLineWithTimestamp(
+                        String.Format("Started outer iteration {0} with {1} training individuals",
+                                      _numOuterIterStarted, indsToTrain.Count));
+                }
 
-                // get elites to evaluate for real
-                var elites = _searchManager.GetAllElitesFromSurrogateMap();
+                // stop once the elites of the last iteration are evaluated
+                if (surrogateTask == null && eliteQueue.Count == 0 &&
+                    _searchManager.numEvaledPerRun >= numDispatched)
+                {
+                    break;
+                }
 
-                // log all elites for the current MAP-Elites run
-                string surrogate_log_file = System.IO.Path.Combine(_surrogateElitesLogDir,
-                     String.Format("surrogate_elites_log{0}.csv",
-                                   this._numMAPElitesRun));
-                this._numMAPElitesRun += 1;
+                _searchManager.FindNewWorkers();
 
-                this._individualLog = new RunningIndividualLog(surrogate_log_file);
-                for (int i=0; i<elites.Count; i++)
+                // dispatch queued elites to every idle worker
+                while(eliteQueue.Count > 0 &&
+                      _searchManager.DispatchOneJobToWorker(
+                          choiceIndividual: eliteQueue.Peek()) == 1)
                 {
-                    this._individualLog.LogIndividual(elites[i]);
+                    eliteQueue.Dequeue();
+                    numDispatched++;
                 }
 
-                // evaluate elites
-                Utilities.WriteLineWithTimestamp(
-                    String.Format("Get {0} elites. Start evaluation...",
-                                  elites.Count));
-                int eliteIdx = 0; // index of elite to dispatch, also the number of elites dispatched.
-                while(_searchManager.numEvaledPerRun < elites.Count)
+                _searchManager.FindDoneWorkers(
+                    storeBuffer: true,
+                    keepIndID: true,
+                    logFeatureMap: true);
+                _searchManager.FindOvertimeWorkers();
+                _searchManager.WaitForWorkers();
+            }
+
+            // the surrogate model is not used from several threads
+            if (surrogateTask != null)
+            {
+                surrogateTask.Wait();
+            }
+
+            Utilities.WriteLineWithTimestamp(
+                String.Format("Finished evaluating {0} elites",
+                              _searchManager.numEvaledPerRun));
+            _searchManager.numEvaledPerRun = 0;
+        }
+
+        /// <summary>
+        /// Function to run the SurrogatedSearch algorithm
+        /// </summary>
+        public void Run()
+        {
+            // let the workers know that searchAlgo is avialble
+            _searchManager.AnnounceWorkersStart();
+            Utilities.WriteLineWithTimestamp("Begin Surrogated Search...");
+
+
+            if (!_skipInitPopulation && !_initialPopulationDone)
+            {
+                // generate initial population
+                while(!_searchManager.searchAlgo.InitialPopulationEvaluated())
                 {
+                    // dispatch jobs until the number reaches
+                    // initial population size
                     _searchManager.FindNewWorkers();
 
-                    // need to dispatch elites
-                    if(eliteIdx < elites.Count)
-                    {
-                        eliteIdx += _searchManager.DispatchOneJobToWorker(
-                            choiceIndividual: new Individual(elites[eliteIdx]));
-                    }
+                    // dispatch initial population
+                    _searchManager.DispatchInitJobsToWorkers();
 
-                    // wait for workers to finish evaluating all elites
+                    // wait for workers to finish evaluating initial population
                     _searchManager.FindDoneWorkers(
                         storeBuffer: true,
-                        keepIndID: true,
                         logFeatureMap: true);
-                    _searchManager.FindOvertimeWorkers();
-                    Thread.Sleep(1000);
+                    CheckpointIfDue();
+                    _searchManager.WaitForWorkers();
                 }
+            }
+            _initialPopulationDone = true;
 
-                // some verbose info
-                Utilities.WriteLineWithTimestamp(
-                    String.Format("Finished evaluating {0} elites",
-                                  _searchManager.numEvaledPerRun));
-                Utilities.WriteLineWithTimestamp(
-                    String.Format("Current number of training individuals: {0}",
-                                  _searchManager._individualsBuffer.Count));
-
-                // reset num evals per run
-                _searchManager.numEvaledPerRun = 0;
+            // elites not evaluated when the search was checkpointed
+            var resumedElites = _searchManager.TakeResumedIndividuals();
 
-                // increment number of outer evals
-                currNumOuterIter += 1;
+            _searchManager.numEvaledPerRun = 0;
+            if (_pipelined)
+            {
+                RunPipelined(resumedElites);
+            }
+            else
+            {
+                RunPhased(resumedElites);
             }
 
             if (!_useFixedModel)
             {
                 // Final back prop using individuals in the buffer
-                indsToTrain = _searchManager._individualsBuffer.ToList();
+                var indsToTrain = _searchManager._individualsBuffer.ToList();
                 indsToTrain.Shuffle();
                 BackProp(indsToTrain);
             }
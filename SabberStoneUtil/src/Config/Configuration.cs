@@ -5,6 +5,14 @@ namespace SabberStoneUtil.Config
         public DeckspaceParams Deckspace { get; set; }
         public SearchParams Search { get; set; }
         public SurrogateParams Surrogate { get; set; }
+        public TransportParams Transport { get; set; }
+        public EvaluationCacheParams EvaluationCache { get; set; }
+        // Write checkpoints of the search to resume it with --resume,
+        // disabled if not specified.
+        public CheckpointParams Checkpoint { get; set; }
+        // Remove card analysis only: play the incomplete decks in rounds
+        // until their ranking is clear instead of with all their games.
+        public AdaptiveAnalysisParams AdaptiveAnalysis { get; set; }
     }
 
     public class DeckspaceParams
@@ -24,9 +32,16 @@ namespace SabberStoneUtil.Config
         public int LogLengthPerGen { get; set; }
         public int? NumOuterIterations { get; set; }
 
+        // number of individuals generated and evaluated on the surrogate
+        // model at once, defaults to NumToEvaluatePerGeneration
+        public int SurrogateBatchSize { get; set; }
+
         // bool configs are default to false
         public bool KeepSurrogateArchive { get; set; }
         public bool SkipInitPopulation { get; set; }
+        // run the surrogate search of the next outer iteration while the
+        // elites of the current one are evaluated
+        public bool Pipelined { get; set; }
     }
 
     public class SurrogateParams
@@ -36,5 +51,72 @@ namespace SabberStoneUtil.Config
         public string FixedModelSavePath { get; set; }
         public bool TestOutOfDist { get; set; }
         public string TestOutOfDistDataFile { get; set; }
+        // If set, the model keeps its weights and its encoded data between
+        // trainings and only trains for a few steps on the new data,
+        // instead of training from the whole buffer every outer iteration.
+        public IncrementalTrainingParams IncrementalTraining { get; set; }
+    }
+
+    public class IncrementalTrainingParams
+    {
+        // Number of minibatch steps per training.
+        public int NumSteps { get; set; } = 200;
+        // Fraction of each minibatch drawn from the data added since the
+        // previous training, the rest is drawn from all the data.
+        public double RecentFraction { get; set; } = 0.5;
+        // Number of steps between two evaluations on the held out data.
+        public int EvalInterval { get; set; } = 20;
+        // Stop the training after this many evaluations without improvement
+        // of the held out loss, 0 never stops early.
+        public int Patience { get; set; } = 3;
+    }
+
+    public class TransportParams
+    {
+        // "File" (default) exchanges jobs through the boxes/ directory,
+        // "Socket" through TCP connections from the workers to the search.
+        public string Type { get; set; }
+        // Port the search listens on in "Socket" mode, 0 picks a free one.
+        public int Port { get; set; }
+    }
+
+    public class EvaluationCacheParams
+    {
+        // Directory of the cache, shared by all the runs pointing to it.
+        // Defaults to logs/evaluation_cache/.
+        public string Directory { get; set; }
+        // Cached results with fewer games are evaluated again and merged
+        // with the new games. Defaults to the NumGames of the player
+        // strategies summed over them.
+        public int? MinGames { get; set; }
+    }
+
+    public class CheckpointParams
+    {
+        // Minutes between two checkpoints.
+        public double IntervalMinutes { get; set; } = 30.0;
+        // Number of checkpoints kept, the older ones are deleted.
+        public int NumToKeep { get; set; } = 2;
+    }
+
+    public class AdaptiveAnalysisParams
+    {
+        // Number of games every incomplete deck is played with first.
+        // Multiples of the number of opponents in the suite keep the
+        // opponents balanced.
+        public int InitialGames { get; set; } = 24;
+        // Number of games added to a deck in each of the following rounds.
+        public int GamesPerRound { get; set; } = 12;
+        // Decks are never played with more games, 0 for the NumGames of
+        // the player strategies.
+        public int MaxGames { get; set; } = 0;
+        // Two decks next to each other in the ranking of an elite are told
+        // apart once their average health differences are this many
+        // standard errors of their difference apart.
+        public double NumStdErrors { get; set; } = 2.0;
+        // Two such decks are also considered tied, and get no more games,
+        // once their average health differences are known (to as many
+        // standard errors) to be closer than this. 0 never ties them.
+        public double Tolerance { get; set; } = 0.0;
     }
 }
@@ -16,4 +16,13 @@ namespace SabberStoneUtil.Config
           public double MinValue { get; set; }
           public double MaxValue { get; set; }
     }
+
+     public class MapLogParams
+     {
+          // "Full" writes the whole archive every row, "Delta" only writes
+          // the cells that changed since the previous row.
+          public string Type { get; set; }
+          // Number of delta rows between two full keyframes.
+          public int KeyframeInterval { get; set; }
+     }
 }
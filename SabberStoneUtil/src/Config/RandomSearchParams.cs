@@ -4,6 +4,7 @@ namespace SabberStoneUtil.Config
     {
         public RandomSearchSearchParams Search { get; set; }
         public MapParams Map { get; set; }
+        public MapLogParams Log { get; set; }
     }
 
     public class RandomSearchSearchParams
@@ -0,0 +1,105 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Threading;
+
+using Nett;
+
+namespace SabberStoneUtil.Messaging
+{
+   /// <summary>
+   /// Transport through a shared file system. Workers hail by writing
+   /// active/worker-XXXX.txt, jobs are written to boxes/deck-XXXX-inbox.tml
+   /// and results are read from boxes/deck-XXXX-outbox.tml. The worker
+   /// deletes the inbox once the outbox is completely written.
+   /// </summary>
+   public class FileSearchTransport : SearchTransport
+   {
+      private const string BOXES_DIRECTORY = "boxes/";
+
+      /// <summary>
+      /// File path for the Search Manager to send evaluation job to the evaluators
+      /// </summary>
+      public const string InboxTemplate = BOXES_DIRECTORY
+         + "deck-{0,4:D4}-inbox.tml";
+
+      /// <summary>
+      /// File path for the Search Manager to receive evaluation result from the evaluators
+      /// </summary>
+      public const string OutboxTemplate = BOXES_DIRECTORY
+         + "deck-{0,4:D4}-outbox.tml";
+
+      public override void AnnounceStart(string configFilename)
+      {
+         WriteSearchInfo("MAP Elites", configFilename);
+      }
+
+      public override List<int> FindNewWorkers()
+      {
+         var newWorkers = new List<int>();
+         string[] hailingFiles = new string[] { };
+         try
+         {
+            hailingFiles = Directory.GetFiles(ACTIVE_DIRECTORY);
+         }
+         catch (System.IO.IOException e)
+         {
+            Console.WriteLine("IOException catched while reading hailing files. Will retry...");
+            Console.WriteLine("###########");
+            Console.WriteLine(e.StackTrace);
+            Console.WriteLine("###########");
+            return newWorkers;
+         }
+         foreach (string activeFile in hailingFiles)
+         {
+            string prefix = ACTIVE_DIRECTORY + "worker-";
+            if (activeFile.StartsWith(prefix))
+            {
+               string suffix = ".txt";
+               int start = prefix.Length;
+               int end = activeFile.Length - suffix.Length;
+               string label = activeFile.Substring(start, end - start);
+               newWorkers.Add(Int32.Parse(label));
+               try
+               {
+                  File.Delete(activeFile);
+               }
+               catch (Exception e)
+               {
+                  Console.WriteLine("Exception while deleting: {0}",
+                                    e.GetType().ToString());
+                  Console.WriteLine(e.StackTrace);
+               }
+            }
+         }
+         return newWorkers;
+      }
+
+      public override bool SendWork(int workerId, PlayMatchesMessage msg)
+      {
+         Toml.WriteFile<PlayMatchesMessage>(
+            msg, string.Format(InboxTemplate, workerId));
+         return true;
+      }
+
+      public override ResultsMessage ReceiveResults(int workerId)
+      {
+         string inboxPath = string.Format(InboxTemplate, workerId);
+         string outboxPath = string.Format(OutboxTemplate, workerId);
+
+         // Test if this worker is done.
+         if (!File.Exists(outboxPath) || File.Exists(inboxPath))
+            return null;
+
+         // Read the message and then delete the file.
+         var results = Toml.ReadFile<ResultsMessage>(outboxPath);
+         File.Delete(outboxPath);
+         return results;
+      }
+
+      public override void WaitForWorkers(int timeoutMillisec)
+      {
+         Thread.Sleep(timeoutMillisec);
+      }
+   }
+}
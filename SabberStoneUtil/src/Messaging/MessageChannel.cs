@@ -0,0 +1,73 @@
+using System;
+using System.IO;
+using System.Text;
+
+namespace SabberStoneUtil.Messaging
+{
+   /// <summary>
+   /// Type of the messages exchanged between the search and the workers
+   /// through a MessageChannel.
+   /// </summary>
+   public enum MessageType : byte
+   {
+      Hello = 0,    // worker -> search, payload is the worker ID
+      Work = 1,     // search -> worker, payload is a PlayMatchesMessage
+      Results = 2,  // worker -> search, payload is a ResultsMessage
+      Done = 3,     // search -> worker, the search is over
+   }
+
+   /// <summary>
+   /// Length prefixed messages over a stream (e.g. a TCP connection).
+   /// Payloads are the same TOML documents the file transport writes to the
+   /// boxes/ directory.
+   /// </summary>
+   public class MessageChannel : IDisposable
+   {
+      private Stream _stream;
+      private BinaryReader _reader;
+      private BinaryWriter _writer;
+      private object _sendLock = new object();
+
+      public MessageChannel(Stream stream)
+      {
+         _stream = stream;
+         _reader = new BinaryReader(stream, Encoding.UTF8);
+         _writer = new BinaryWriter(stream, Encoding.UTF8);
+      }
+
+      /// <summary>
+      /// Send a message. Safe to call from several threads.
+      /// </summary>
+      public void Send(MessageType type, string payload = "")
+      {
+         byte[] bytes = Encoding.UTF8.GetBytes(payload);
+         lock (_sendLock)
+         {
+            _writer.Write((byte)type);
+            _writer.Write(bytes.Length);
+            _writer.Write(bytes);
+            _writer.Flush();
+         }
+      }
+
+      /// <summary>
+      /// Block until a message arrives. Throws an IOException
+      /// (EndOfStreamException) once the other end closed the channel.
+      /// </summary>
+      public MessageType Receive(out string payload)
+      {
+         var type = (MessageType)_reader.ReadByte();
+         int length = _reader.ReadInt32();
+         byte[] bytes = _reader.ReadBytes(length);
+         if (bytes.Length < length)
+            throw new EndOfStreamException();
+         payload = Encoding.UTF8.GetString(bytes);
+         return type;
+      }
+
+      public void Dispose()
+      {
+         _stream.Dispose();
+      }
+   }
+}
@@ -6,5 +6,14 @@ namespace SabberStoneUtil.Messaging
    {
       public DeckParams Deck { get; set; }
       public CustomStratWeights Strategy { get; set; }
+
+      // Fitness the deck has to reach to be of use to the search, if any.
+      // Workers with early stopping enabled stop playing once the deck is
+      // confidently below it.
+      public double? FitnessThreshold { get; set; }
+
+      // Number of games to play with each strategy, the NumGames of the
+      // strategies if not set. Lets analyses add games to a deck in rounds.
+      public int? NumGames { get; set; }
    }
 }
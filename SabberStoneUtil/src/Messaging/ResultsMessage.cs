@@ -9,6 +9,17 @@ namespace SabberStoneUtil.Messaging
       public DeckParams PlayerDeck { get; set; }
 		public OverallStatistics OverallStats { get; set; }
 		public StrategyStatistics[] StrategyStats { get; set; }
+
+      /// <summary>
+      /// Merge the results of more games of the same deck.
+      /// </summary>
+      public void Merge(ResultsMessage rhs)
+      {
+         double w = OverallStats.MergeWeight(rhs.OverallStats);
+         for (int i=0; i<StrategyStats.Length; i++)
+            StrategyStats[i].Merge(rhs.StrategyStats[i], w);
+         OverallStats.Merge(rhs.OverallStats);
+      }
    }
 
    [Serializable]public class OverallStatistics
@@ -28,6 +39,15 @@ namespace SabberStoneUtil.Messaging
       public double DeckManaVariance { get; set; }
       public double NumMinionCards { get; set; }
       public double NumSpellCards { get; set; }
+      public double NumGamesPlayed { get; set; }
+
+      // Sample variance of the health difference of a game, summed over the
+      // strategies like AverageHealthDifference.
+      public double HealthDifferenceVariance { get; set; }
+
+      // Whether the games were stopped early because the deck was below the
+      // fitness threshold of the search, the statistics are then biased low.
+      public bool StoppedEarly { get; set; }
    
       public void Accumulate(OverallStatistics rhs)
       {
@@ -42,6 +62,59 @@ namespace SabberStoneUtil.Messaging
          ManaSpent += rhs.ManaSpent;
          ManaWasted += rhs.ManaWasted;
          StrategyAlignment += rhs.StrategyAlignment;
+         NumGamesPlayed += rhs.NumGamesPlayed;
+         HealthDifferenceVariance += rhs.HealthDifferenceVariance;
+         StoppedEarly |= rhs.StoppedEarly;
+      }
+
+      /// <summary>
+      /// Share of the games played by this estimate once merged with `rhs`.
+      /// </summary>
+      public double MergeWeight(OverallStatistics rhs)
+      {
+         double total = NumGamesPlayed + rhs.NumGamesPlayed;
+         return total > 0 ? NumGamesPlayed / total : 0.5;
+      }
+
+      /// <summary>
+      /// Merge the statistics of more games of the same deck, weighting
+      /// both estimates by the number of games they were obtained from.
+      /// </summary>
+      public void Merge(OverallStatistics rhs)
+      {
+         double w = MergeWeight(rhs);
+         double wRhs = 1 - w;
+
+         // Pooled variance of both sets of games, from the means before
+         // they are merged.
+         double n1 = NumGamesPlayed;
+         double n2 = rhs.NumGamesPlayed;
+         if (n1 + n2 > 1)
+         {
+            double delta = AverageHealthDifference
+               - rhs.AverageHealthDifference;
+            HealthDifferenceVariance =
+               (Math.Max(n1 - 1, 0) * HealthDifferenceVariance
+                + Math.Max(n2 - 1, 0) * rhs.HealthDifferenceVariance
+                + n1 * n2 / (n1 + n2) * delta * delta) / (n1 + n2 - 1);
+         }
+
+         for (int i=0; i<UsageCounts.Length; i++)
+            UsageCounts[i] = (int)Math.Round(
+               w * UsageCounts[i] + wRhs * rhs.UsageCounts[i]);
+         WinCount = w * WinCount + wRhs * rhs.WinCount;
+         AverageHealthDifference = w * AverageHealthDifference
+            + wRhs * rhs.AverageHealthDifference;
+         DamageDone = w * DamageDone + wRhs * rhs.DamageDone;
+         NumTurns = w * NumTurns + wRhs * rhs.NumTurns;
+         CardsDrawn = w * CardsDrawn + wRhs * rhs.CardsDrawn;
+         HandSize = w * HandSize + wRhs * rhs.HandSize;
+         ManaSpent = w * ManaSpent + wRhs * rhs.ManaSpent;
+         ManaWasted = w * ManaWasted + wRhs * rhs.ManaWasted;
+         StrategyAlignment = w * StrategyAlignment
+            + wRhs * rhs.StrategyAlignment;
+         NumGamesPlayed += rhs.NumGamesPlayed;
+         StoppedEarly |= rhs.StoppedEarly;
       }
 
       public void ScaleByNumStrategies(int numStrats)
@@ -85,6 +158,8 @@ namespace SabberStoneUtil.Messaging
             return NumMinionCards;
          if (name.Equals("NumSpellCards"))
             return NumSpellCards;
+         if (name.Equals("NumGamesPlayed"))
+            return NumGamesPlayed;
 
          return Int32.MinValue;
       }
@@ -103,7 +178,8 @@ namespace SabberStoneUtil.Messaging
             "DeckManaSum",
             "DeckManaVariance",
             "NumMinionCards",
-            "NumSpellCards"
+            "NumSpellCards",
+            "NumGamesPlayed"
          };
    }
 
@@ -112,6 +188,16 @@ namespace SabberStoneUtil.Messaging
       public double WinCount { get; set; }
       public double Alignment { get; set; }
 
+      /// <summary>
+      /// Merge the statistics of more games, `w` being the share of the
+      /// games played by this estimate (see OverallStatistics.MergeWeight).
+      /// </summary>
+      public void Merge(StrategyStatistics rhs, double w)
+      {
+         WinCount = w * WinCount + (1 - w) * rhs.WinCount;
+         Alignment = w * Alignment + (1 - w) * rhs.Alignment;
+      }
+
       public double GetStatByName(string name)
       {
          if (name.Equals("WinCount"))
@@ -0,0 +1,89 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Text;
+
+using SabberStoneUtil.Config;
+
+namespace SabberStoneUtil.Messaging
+{
+   /// <summary>
+   /// Search side of the channel used to hand decks to the DeckEvaluator
+   /// workers and collect their results.
+   ///
+   /// Whatever the transport, the search announces itself by writing
+   /// active/search.txt, which holds the name of the search, the
+   /// configuration file and, for transports other than files, the endpoint
+   /// the workers connect to. The file is deleted when the search is over.
+   /// </summary>
+   public abstract class SearchTransport
+   {
+      protected const string ACTIVE_DIRECTORY = "active/";
+      protected const string ACTIVE_SEARCH_PATH = ACTIVE_DIRECTORY
+         + "search.txt";
+
+      /// <summary>
+      /// Create the transport described by the config, defaults to files.
+      /// </summary>
+      public static SearchTransport Create(TransportParams transportParams)
+      {
+         if (transportParams == null || transportParams.Type == null ||
+             transportParams.Type.Equals("File"))
+            return new FileSearchTransport();
+         if (transportParams.Type.Equals("Socket"))
+            return new SocketSearchTransport(transportParams.Port);
+         throw new System.ArgumentException(
+            String.Format("Invalid transport type: {0}",
+                          transportParams.Type));
+      }
+
+      /// <summary>
+      /// Let the workers know that a search is available.
+      /// </summary>
+      public abstract void AnnounceStart(string configFilename);
+
+      /// <summary>
+      /// Let the workers know that the search is over.
+      /// </summary>
+      public virtual void AnnounceDone()
+      {
+         File.Delete(ACTIVE_SEARCH_PATH);
+      }
+
+      /// <summary>
+      /// IDs of the workers that became available since the last call.
+      /// </summary>
+      public abstract List<int> FindNewWorkers();
+
+      /// <summary>
+      /// Send a job to a worker. Returns false if the worker is known to be
+      /// gone, the job is then not sent.
+      /// </summary>
+      public abstract bool SendWork(int workerId, PlayMatchesMessage msg);
+
+      /// <summary>
+      /// Results of the job of a worker, null if it is not done yet.
+      /// </summary>
+      public abstract ResultsMessage ReceiveResults(int workerId);
+
+      /// <summary>
+      /// Wait until a worker may have joined or finished a job, at most
+      /// `timeoutMillisec`.
+      /// </summary>
+      public abstract void WaitForWorkers(int timeoutMillisec);
+
+      protected static void WriteSearchInfo(params string[] lines)
+      {
+         using (FileStream ow = File.Open(ACTIVE_SEARCH_PATH,
+                  FileMode.Create, FileAccess.Write, FileShare.None))
+         {
+            foreach (string line in lines)
+            {
+               byte[] info = new UTF8Encoding(true).GetBytes(line + "\n");
+               ow.Write(info, 0, info.Length);
+            }
+            ow.Close();
+         }
+      }
+   }
+}
@@ -0,0 +1,213 @@
+using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.IO;
+using System.Net;
+using System.Net.Sockets;
+using System.Threading;
+
+using Nett;
+
+namespace SabberStoneUtil.Messaging
+{
+   /// <summary>
+   /// Transport through TCP connections. Every worker connects to the
+   /// endpoint written in active/search.txt and keeps its connection open.
+   /// Jobs are pushed to the worker as soon as they are dispatched and
+   /// results are pushed back, waking up the search loop immediately
+   /// instead of waiting for the next poll of the boxes/ directory.
+   /// </summary>
+   public class SocketSearchTransport : SearchTransport
+   {
+      /// <summary>
+      /// Port to listen on, 0 to let the system pick a free one.
+      /// </summary>
+      private int _port;
+
+      private TcpListener _listener;
+
+      private volatile bool _running = false;
+
+      /// <summary>
+      /// Channels of the connected workers by worker ID.
+      /// </summary>
+      private ConcurrentDictionary<int, MessageChannel> _channels =
+         new ConcurrentDictionary<int, MessageChannel>();
+
+      /// <summary>
+      /// Workers connected since the last call of FindNewWorkers.
+      /// </summary>
+      private ConcurrentQueue<int> _newWorkers = new ConcurrentQueue<int>();
+
+      /// <summary>
+      /// Results received and not collected yet by worker ID.
+      /// </summary>
+      private ConcurrentDictionary<int, ResultsMessage> _results =
+         new ConcurrentDictionary<int, ResultsMessage>();
+
+      /// <summary>
+      /// Set whenever a worker connects or sends results.
+      /// </summary>
+      private AutoResetEvent _workerEvent = new AutoResetEvent(false);
+
+      public SocketSearchTransport(int port)
+      {
+         _port = port;
+      }
+
+      public override void AnnounceStart(string configFilename)
+      {
+         _listener = new TcpListener(IPAddress.Any, _port);
+         _listener.Start();
+         _running = true;
+
+         _listener.BeginAcceptTcpClient(AcceptWorker, null);
+
+         int port = ((IPEndPoint)_listener.LocalEndpoint).Port;
+         string endpoint = String.Format("tcp://{0}:{1}",
+                                         Dns.GetHostName(), port);
+         Utilities.WriteLineWithTimestamp(
+            "Waiting for workers on " + endpoint);
+         WriteSearchInfo("MAP Elites", configFilename, endpoint);
+      }
+
+      public override void AnnounceDone()
+      {
+         base.AnnounceDone();
+         _running = false;
+         _listener.Stop();
+
+         // The workers close their end once they receive Done, which ends
+         // the ServeWorker threads. Closing the channels from here instead
+         // may block while those threads are still reading.
+         foreach (var channel in _channels.Values)
+         {
+            try
+            {
+               channel.Send(MessageType.Done);
+            }
+            catch (Exception e) when (
+               e is IOException || e is ObjectDisposedException)
+            {
+               // the worker is already gone
+            }
+         }
+      }
+
+      private void AcceptWorker(IAsyncResult ar)
+      {
+         // Accept asynchronously, a blocking accept keeps the listener from
+         // stopping on some platforms.
+         TcpClient client;
+         try
+         {
+            client = _listener.EndAcceptTcpClient(ar);
+            if (_running)
+               _listener.BeginAcceptTcpClient(AcceptWorker, null);
+         }
+         catch (Exception e) when (
+            e is SocketException || e is ObjectDisposedException)
+         {
+            // the listener was stopped
+            return;
+         }
+         client.NoDelay = true;
+
+         var workerThread = new Thread(() => ServeWorker(client));
+         workerThread.IsBackground = true;
+         workerThread.Start();
+      }
+
+      /// <summary>
+      /// Register a worker and receive its results until it disconnects.
+      /// </summary>
+      private void ServeWorker(TcpClient client)
+      {
+         var channel = new MessageChannel(client.GetStream());
+         int workerId = -1;
+         try
+         {
+            string payload;
+            if (channel.Receive(out payload) != MessageType.Hello)
+               return;
+            workerId = Int32.Parse(payload);
+            _channels[workerId] = channel;
+            _newWorkers.Enqueue(workerId);
+            _workerEvent.Set();
+
+            while (_running)
+            {
+               if (channel.Receive(out payload) == MessageType.Results)
+               {
+                  _results[workerId] = Toml.ReadString<ResultsMessage>(payload);
+                  _workerEvent.Set();
+               }
+            }
+         }
+         catch (Exception e) when (
+            e is IOException || e is ObjectDisposedException)
+         {
+            // the worker disconnected, or the search is over and closed
+            // the channel
+            if (_running)
+               Utilities.WriteLineWithTimestamp(
+                  String.Format("Lost connection to worker {0}", workerId));
+         }
+         finally
+         {
+            MessageChannel registered;
+            if (_channels.TryGetValue(workerId, out registered) &&
+                registered == channel)
+               _channels.TryRemove(workerId, out registered);
+            channel.Dispose();
+         }
+      }
+
+      public override List<int> FindNewWorkers()
+      {
+         var newWorkers = new List<int>();
+         int workerId;
+         while (_newWorkers.TryDequeue(out workerId))
+            newWorkers.Add(workerId);
+         return newWorkers;
+      }
+
+      public override bool SendWork(int workerId, PlayMatchesMessage msg)
+      {
+         // The channel of a worker is removed once its connection is lost,
+         // the worker is listed by FindNewWorkers again if it reconnects.
+         MessageChannel channel;
+         if (!_channels.TryGetValue(workerId, out channel))
+         {
+            Utilities.WriteLineWithTimestamp(
+               String.Format("Worker {0} is not connected", workerId));
+            return false;
+         }
+         try
+         {
+            channel.Send(MessageType.Work,
+                         Toml.WriteString<PlayMatchesMessage>(msg));
+            return true;
+         }
+         catch (Exception e) when (
+            e is IOException || e is ObjectDisposedException)
+         {
+            Utilities.WriteLineWithTimestamp(
+               String.Format("Failed to send job to worker {0}", workerId));
+            return false;
+         }
+      }
+
+      public override ResultsMessage ReceiveResults(int workerId)
+      {
+         ResultsMessage results;
+         _results.TryRemove(workerId, out results);
+         return results;
+      }
+
+      public override void WaitForWorkers(int timeoutMillisec)
+      {
+         _workerEvent.WaitOne(timeoutMillisec);
+      }
+   }
+}
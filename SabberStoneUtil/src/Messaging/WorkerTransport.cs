@@ -0,0 +1,147 @@
+using System;
+using System.IO;
+using System.Net.Sockets;
+using System.Text;
+using System.Threading;
+
+using Nett;
+
+namespace SabberStoneUtil.Messaging
+{
+   /// <summary>
+   /// DeckEvaluator side of the channel to the search, see SearchTransport.
+   /// </summary>
+   public abstract class WorkerTransport
+   {
+      /// <summary>
+      /// Join the search described by the lines of active/search.txt.
+      /// Connects to the socket endpoint of the search if there is one and
+      /// falls back to files otherwise.
+      /// </summary>
+      public static WorkerTransport Connect(int nodeId, string[] searchInfo)
+      {
+         if (searchInfo.Length > 2 && searchInfo[2].StartsWith("tcp://"))
+            return new SocketWorkerTransport(nodeId, searchInfo[2]);
+         return new FileWorkerTransport(nodeId);
+      }
+
+      /// <summary>
+      /// Block until a job is available, null once the search is over.
+      /// </summary>
+      public abstract PlayMatchesMessage ReceiveWork();
+
+      /// <summary>
+      /// Send the results of the last job received.
+      /// </summary>
+      public abstract void SendResults(ResultsMessage results);
+   }
+
+   /// <summary>
+   /// Worker side of FileSearchTransport.
+   /// </summary>
+   public class FileWorkerTransport : WorkerTransport
+   {
+      private const string ACTIVE_SEARCH_PATH = "active/search.txt";
+
+      private int _nodeId;
+
+      private string _inboxPath;
+
+      private string _outboxPath;
+
+      public FileWorkerTransport(int nodeId)
+      {
+         // These files are for asyncronous communication between this
+         // worker and it's scheduler.
+         //
+         // Decks to evaluate come in the inbox and are dished out of the
+         // outbox.
+         _nodeId = nodeId;
+         _inboxPath = string.Format(FileSearchTransport.InboxTemplate, nodeId);
+         _outboxPath = string.Format(FileSearchTransport.OutboxTemplate, nodeId);
+
+         // Let the scheduler know we are here.
+         string activeWorkerPath = "active/" +
+            string.Format("worker-{0,4:D4}.txt", nodeId);
+         using (FileStream ow = File.Open(activeWorkerPath,
+                FileMode.Create, FileAccess.Write, FileShare.None))
+         {
+            byte[] info = new UTF8Encoding(true).GetBytes("Hail!\n");
+            ow.Write(info, 0, info.Length);
+            ow.Close();
+         }
+      }
+
+      public override PlayMatchesMessage ReceiveWork()
+      {
+         // Wait until we have some work.
+         while (!File.Exists(_inboxPath) && File.Exists(ACTIVE_SEARCH_PATH))
+         {
+            Utilities.WriteLineWithTimestamp(
+               String.Format("Waiting... ({0})", _nodeId));
+            Thread.Sleep(5000);
+         }
+
+         if (!File.Exists(ACTIVE_SEARCH_PATH))
+            return null;
+
+         // Wait for the file to be finish being written
+         Thread.Sleep(5000);
+         return Toml.ReadFile<PlayMatchesMessage>(_inboxPath);
+      }
+
+      public override void SendResults(ResultsMessage results)
+      {
+         Toml.WriteFile<ResultsMessage>(results, _outboxPath);
+
+         // Wait for the TOML file to write (buffers are out of sync)
+         // Then tell the search that we are done writing the file.
+         Thread.Sleep(3000);
+         File.Delete(_inboxPath);
+      }
+   }
+
+   /// <summary>
+   /// Worker side of SocketSearchTransport.
+   /// </summary>
+   public class SocketWorkerTransport : WorkerTransport
+   {
+      private MessageChannel _channel;
+
+      public SocketWorkerTransport(int nodeId, string endpoint)
+      {
+         var uri = new Uri(endpoint);
+         var client = new TcpClient(uri.Host, uri.Port);
+         client.NoDelay = true;
+         _channel = new MessageChannel(client.GetStream());
+         _channel.Send(MessageType.Hello, nodeId.ToString());
+         Utilities.WriteLineWithTimestamp("Connected to search at " + endpoint);
+      }
+
+      public override PlayMatchesMessage ReceiveWork()
+      {
+         try
+         {
+            string payload;
+            MessageType type;
+            while ((type = _channel.Receive(out payload)) != MessageType.Done)
+            {
+               if (type == MessageType.Work)
+                  return Toml.ReadString<PlayMatchesMessage>(payload);
+            }
+         }
+         catch (IOException)
+         {
+            Utilities.WriteLineWithTimestamp("Lost connection to search.");
+         }
+         _channel.Dispose();
+         return null;
+      }
+
+      public override void SendResults(ResultsMessage results)
+      {
+         _channel.Send(MessageType.Results,
+                       Toml.WriteString<ResultsMessage>(results));
+      }
+   }
+}
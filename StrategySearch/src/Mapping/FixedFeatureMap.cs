@@ -8,6 +8,13 @@ using StrategySearch.Search;
 
 /* This is a FeatureMap that has fixed boundaries at even intervals.
  * It is exactly as described in the original MAP-Elites paper.
+ *
+ * The archive is dense: cells are indexed by their ravelled group indices
+ * (f1 + f2*NumGroups + ...) into flat arrays holding the elite, its
+ * fitness and the cell count, plus an occupancy bitmap and the list of
+ * occupied cells for sampling. Adding an individual and sampling an elite
+ * are O(1) and do not allocate. EliteMap and CellCount are built from the
+ * arrays (keyed by "f1:f2:...") when they are read after a change.
  */
 
 namespace StrategySearch.Mapping
@@ -22,13 +29,29 @@ namespace StrategySearch.Mapping
 
       public int NumGroups { get; private set; }
       public int NumFeatures { get; private set; }
-      public Dictionary<string, Individual> EliteMap { get; private set; }
-      public Dictionary<string, int> CellCount { get; private set; }
 
-      private List<string> _eliteIndices;
       private double[] _lowGroupBound;
       private double[] _highGroupBound;
 
+      // Dense archive indexed by cell.
+      private int _numCells;
+      private Individual[] _elites;
+      private double[] _eliteFitness;
+      private int[] _cellCounts;
+      private ulong[] _occupied;
+
+      // Occupied cells in insertion order, for uniform sampling.
+      private int[] _eliteIndices;
+      private int _numElites;
+
+      // "f1:f2:..." name of every cell, built on first use.
+      private string[] _cellNames;
+
+      // Dictionary views of the archive, rebuilt when read after a change.
+      private Dictionary<string, Individual> _eliteMap;
+      private Dictionary<string, int> _cellCount;
+      private bool _viewsOutdated;
+
 		public FixedFeatureMap(int numToEvaluate, MapParams config, MapSizer groupSizer)
       {
          _groupSizer = groupSizer;
@@ -45,9 +68,60 @@ namespace StrategySearch.Mapping
             _highGroupBound[i] = config.Features[i].MaxValue;
          }
 
-         _eliteIndices = new List<string>();
-         EliteMap = new Dictionary<string,Individual>();
-         CellCount = new Dictionary<string,int>();
+         _eliteMap = new Dictionary<string,Individual>();
+         _cellCount = new Dictionary<string,int>();
+         Resize(0);
+      }
+
+      public Dictionary<string, Individual> EliteMap
+      {
+         get
+         {
+            UpdateViews();
+            return _eliteMap;
+         }
+      }
+
+      public Dictionary<string, int> CellCount
+      {
+         get
+         {
+            UpdateViews();
+            return _cellCount;
+         }
+      }
+
+      private void UpdateViews()
+      {
+         if (!_viewsOutdated)
+            return;
+
+         _eliteMap.Clear();
+         _cellCount.Clear();
+         for (int pos=0; pos<_numElites; pos++)
+         {
+            int cell = _eliteIndices[pos];
+            string index = GetCellName(cell);
+            _eliteMap.Add(index, _elites[cell]);
+            _cellCount.Add(index, _cellCounts[cell]);
+         }
+         _viewsOutdated = false;
+      }
+
+      private string GetCellName(int cell)
+      {
+         if (_cellNames[cell] == null)
+         {
+            var features = new int[NumFeatures];
+            int rest = cell;
+            for (int i=0; i<NumFeatures; i++)
+            {
+               features[i] = rest % NumGroups;
+               rest /= NumGroups;
+            }
+            _cellNames[cell] = string.Join(":", features);
+         }
+         return _cellNames[cell];
       }
 
       private int GetFeatureIndex(int featureId, double feature)
@@ -63,50 +137,68 @@ namespace StrategySearch.Mapping
          return index;
       }
 
-      private string GetIndex(Individual cur)
+      private int GetCell(Individual cur)
       {
-         var features = new int[NumFeatures];
-         for (int i=0; i<NumFeatures; i++)
-            features[i] = GetFeatureIndex(i, cur.Features[i]);
-         return string.Join(":", features);
+         int cell = 0;
+         for (int i=NumFeatures-1; i>=0; i--)
+            cell = cell * NumGroups + GetFeatureIndex(i, cur.Features[i]);
+         return cell;
       }
 
 		private bool AddToMap(Individual toAdd)
       {
-         string index = GetIndex(toAdd);
+         int cell = GetCell(toAdd);
+         ulong bit = 1UL << (cell & 63);
 
          bool replacedElite = false;
-         if (!EliteMap.ContainsKey(index))
+         if ((_occupied[cell >> 6] & bit) == 0)
          {
             toAdd.IsNovel = true;
             toAdd.Delta = toAdd.Fitness;
-            _eliteIndices.Add(index);
-            EliteMap.Add(index, toAdd);
-            CellCount.Add(index, 0);
+            _occupied[cell >> 6] |= bit;
+            _eliteIndices[_numElites++] = cell;
+            _elites[cell] = toAdd;
+            _eliteFitness[cell] = toAdd.Fitness;
             replacedElite = true;
          }
-         else if (EliteMap[index].Fitness < toAdd.Fitness)
+         else if (_eliteFitness[cell] < toAdd.Fitness)
          {
-            toAdd.Delta = toAdd.Fitness - EliteMap[index].Fitness;
-            EliteMap[index] = toAdd;
+            toAdd.Delta = toAdd.Fitness - _eliteFitness[cell];
+            _elites[cell] = toAdd;
+            _eliteFitness[cell] = toAdd.Fitness;
             replacedElite = true;
          }
 
-         CellCount[index] += 1;
+         _cellCounts[cell] += 1;
+         _viewsOutdated = true;
          return replacedElite;
       }
 
-      private void Remap(int nextNumGroups)
+      // Allocate an empty archive with `numGroups` groups per feature.
+      private void Resize(int numGroups)
       {
-         NumGroups = nextNumGroups;
+         NumGroups = numGroups;
+         _numCells = 1;
+         for (int i=0; i<NumFeatures; i++)
+            _numCells *= Math.Max(NumGroups, 0);
+
+         _elites = new Individual[_numCells];
+         _eliteFitness = new double[_numCells];
+         _cellCounts = new int[_numCells];
+         _occupied = new ulong[(_numCells + 63) / 64];
+         _eliteIndices = new int[_numCells];
+         _numElites = 0;
+         _cellNames = new string[_numCells];
+         _viewsOutdated = true;
+      }
 
-         List<Individual> allElites = new List<Individual>();
-         foreach (string index in _eliteIndices)
-            allElites.Add(EliteMap[index]); 
+      private void Remap(int nextNumGroups)
+      {
+         var allElites = new List<Individual>();
+         for (int pos=0; pos<_numElites; pos++)
+            allElites.Add(_elites[_eliteIndices[pos]]);
 
-         _eliteIndices = new List<string>();
-         EliteMap = new Dictionary<string,Individual>();
-         CellCount = new Dictionary<string,int>();
+         Resize(nextNumGroups);
          foreach (Individual cur in allElites)
             AddToMap(cur);
       }
@@ -124,15 +216,14 @@ namespace StrategySearch.Mapping
          int nextNumGroups = _groupSizer.GetSize(portionDone);
          if (nextNumGroups != NumGroups)
             Remap(nextNumGroups);
-            
+
          return AddToMap(toAdd);
       }
 
       public Individual GetRandomElite()
       {
-         int pos = rnd.Next(_eliteIndices.Count);
-         string index = _eliteIndices[pos];
-         return EliteMap[index];
+         int pos = rnd.Next(_numElites);
+         return _elites[_eliteIndices[pos]];
       }
 	}
 }
@@ -17,10 +17,13 @@ namespace SurrogateModel.Logging
         private bool _isInitiated;
         private string[] _model_targets;
 
-        public LossLogger(string logPath, string[] model_targets)
+        /// <param name = "append">keep the rows of an existing log, used
+        /// when a search is resumed</param>
+        public LossLogger(string logPath, string[] model_targets,
+                          bool append = false)
         {
             _logPath = logPath;
-            _isInitiated = false;
+            _isInitiated = append && File.Exists(logPath);
             _model_targets = model_targets;
         }
 
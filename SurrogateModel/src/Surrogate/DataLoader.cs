@@ -1,5 +1,6 @@
 using System;
 using System.Text;
+using System.Threading.Tasks;
 using Tensorflow;
 using NumSharp;
 using static Tensorflow.Binding;
@@ -12,20 +13,37 @@ namespace SurrogateModel.Surrogate
     public class DataLoader
     {
         /// <summary>
-        /// NDArray of features. Shape: [num_input, num_feature]
+        /// Features, row major. Shape: [num_input, num_feature]
         /// </summary>
-        private NDArray X = null;
+        private double[] X = null;
 
         /// <summary>
-        /// NDArray of target. Shape: [num_input, num_output]
+        /// Targets, row major. Shape: [num_input, num_output]
         /// </summary>
-        private NDArray y = null;
+        private double[] y = null;
+
+        private int num_input;
+        private int num_feature;
+        private int num_output;
+
+        /// <summary>
+        /// Order in which the rows are sampled in the current epoch
+        /// </summary>
+        private int[] order;
 
         /// <summary>
         /// Shuffle the data every epoch or not
         /// </summary>
         private bool shuffle = true;
 
+        /// <summary>
+        /// Gather the next batch on a background thread while the current
+        /// one is used
+        /// </summary>
+        private bool prefetch = true;
+
+        private Random rnd = new Random();
+
         /// <summary>
         /// Counter to remember the index of sampling
         /// </summary>
@@ -36,6 +54,23 @@ namespace SurrogateModel.Surrogate
         /// </summary>
         private int batch_size = 0;
 
+        /// <summary>
+        /// Two sets of batch buffers, one being returned while the other is
+        /// being filled. The last batch of an epoch may be smaller and has
+        /// its own buffers.
+        /// </summary>
+        private double[][] x_batches = new double[2][];
+        private double[][] y_batches = new double[2][];
+        private double[][] x_last_batches = new double[2][];
+        private double[][] y_last_batches = new double[2][];
+        private int last_batch_size;
+        private int curr_buffer = 0;
+
+        /// <summary>
+        /// Batch being gathered in the background, if any
+        /// </summary>
+        private Task prefetch_task = null;
+
         /// <summary>
         /// Number of batches of the data
         /// </summary>
@@ -47,22 +82,56 @@ namespace SurrogateModel.Surrogate
         /// <param name="X">NDArray of features</param>
         /// <param name="y">NDArray of target</param>
         /// <param name="batch_size">batch size while sampling data. Default to 32</param>
-        public DataLoader(NDArray X, NDArray y, int batch_size, bool shuffle = true)
+        /// <param name="prefetch">gather the next batch in the background</param>
+        public DataLoader(NDArray X, NDArray y, int batch_size,
+                          bool shuffle = true, bool prefetch = true)
         {
             if(X.shape[0] != y.shape[0])
             {
                 throw new InvalidOperationException("DataLoader: shape[0] of X and y must match");
             }
 
-            this.X = X;
-            this.y = y;
+            // copy the data once in flat arrays, batches are gathered from
+            // them without going through NumSharp
+            this.num_input = X.shape[0];
+            this.num_feature = X.size / Math.Max(num_input, 1);
+            this.num_output = y.size / Math.Max(num_input, 1);
+            this.X = X.astype(typeof(double)).ToArray<double>();
+            this.y = y.astype(typeof(double)).ToArray<double>();
+            this.shuffle = shuffle;
+            this.prefetch = prefetch;
             this.batch_size = batch_size;
-            this.num_batch = X.shape[0] / batch_size;
-            if(X.Shape[0] % batch_size != 0)
+            this.num_batch = num_input / batch_size;
+            if(num_input % batch_size != 0)
             {
                 this.num_batch += 1;
             }
 
+            this.order = new int[num_input];
+            for (int i=0; i<num_input; i++)
+            {
+                order[i] = i;
+            }
+
+            // allocate the batch buffers
+            int full_batch_size = Math.Min(batch_size, num_input);
+            last_batch_size = num_input - (num_batch - 1) * batch_size;
+            for (int b=0; b<2; b++)
+            {
+                x_batches[b] = new double[full_batch_size * num_feature];
+                y_batches[b] = new double[full_batch_size * num_output];
+                if (last_batch_size != full_batch_size)
+                {
+                    x_last_batches[b] = new double[last_batch_size * num_feature];
+                    y_last_batches[b] = new double[last_batch_size * num_output];
+                }
+                else
+                {
+                    x_last_batches[b] = x_batches[b];
+                    y_last_batches[b] = y_batches[b];
+                }
+            }
+
             // shuffle the data
             if(shuffle)
             {
@@ -71,13 +140,31 @@ namespace SurrogateModel.Surrogate
         }
 
         /// <summary>
-        /// Function to sample one batch of data sequentially from X and y
+        /// Function to sample one batch of data sequentially from X and y.
+        /// The returned arrays may share memory with the loader and are only
+        /// valid until the next call.
         /// </summary>
         public (NDArray, NDArray)Sample()
         {
-            // Console.WriteLine("sampling from [{0}, {1})\n", sample_idx*batch_size, (sample_idx+1)*batch_size);
-            var x_sample = X[new Slice(sample_idx*batch_size, (sample_idx+1)*batch_size)];
-            var y_sample = y[new Slice(sample_idx*batch_size, (sample_idx+1)*batch_size)];
+            // get the current batch, gathering it now if it was not
+            // prefetched
+            if (prefetch_task != null)
+            {
+                prefetch_task.Wait();
+                prefetch_task = null;
+            }
+            else
+            {
+                Gather(curr_buffer, sample_idx);
+            }
+
+            int rows = BatchSize(sample_idx);
+            double[] x_batch = sample_idx == num_batch - 1 ?
+                x_last_batches[curr_buffer] : x_batches[curr_buffer];
+            double[] y_batch = sample_idx == num_batch - 1 ?
+                y_last_batches[curr_buffer] : y_batches[curr_buffer];
+            var x_sample = new NDArray(x_batch, new Shape(rows, num_feature));
+            var y_sample = new NDArray(y_batch, new Shape(rows, num_output));
             sample_idx += 1;
 
             // if all data are sampled, reset sample_idx and reshuffle for the next epoch
@@ -90,36 +177,59 @@ namespace SurrogateModel.Surrogate
                 }
             }
 
+            // gather the next batch in the other buffers
+            curr_buffer = 1 - curr_buffer;
+            if (prefetch)
+            {
+                int next_buffer = curr_buffer;
+                int next_idx = sample_idx;
+                prefetch_task = Task.Run(() => Gather(next_buffer, next_idx));
+            }
+
             return (x_sample, y_sample);
         }
 
         /// <summary>
-        /// Function to shuffle rows of X and y
-        /// Note: np.random.shuffle of NumSharp shuffle all cells instead of just the rows
+        /// Number of rows of batch `batch_idx`
         /// </summary>
-        private void Shuffle()
+        private int BatchSize(int batch_idx)
         {
-            var num_row = X.shape[0];
-            int row_swap = -1;
-            for (int i=num_row-1; i>0; i--)
-            {
-                // randomly choose row index to shuffle
-                row_swap = np.random.randint(i);
+            return batch_idx == num_batch - 1 ? last_batch_size : batch_size;
+        }
 
-                // swap the same rows of X and y
-                Swap(X, row_swap, i);
-                Swap(y, row_swap, i);
+        /// <summary>
+        /// Copy the rows of batch `batch_idx` into the buffers `buffer`
+        /// </summary>
+        private void Gather(int buffer, int batch_idx)
+        {
+            bool last = batch_idx == num_batch - 1;
+            double[] x_batch = last ? x_last_batches[buffer] : x_batches[buffer];
+            double[] y_batch = last ? y_last_batches[buffer] : y_batches[buffer];
+            int start = batch_idx * batch_size;
+            int rows = BatchSize(batch_idx);
+            for (int i=0; i<rows; i++)
+            {
+                int row = order[start + i];
+                Array.Copy(X, row * num_feature,
+                           x_batch, i * num_feature, num_feature);
+                Array.Copy(y, row * num_output,
+                           y_batch, i * num_output, num_output);
             }
         }
 
         /// <summary>
-        /// Function to swap specified rows
+        /// Function to shuffle the order of the rows. Only the indices are
+        /// permuted, the rows are gathered when sampled.
         /// </summary>
-        private void Swap(NDArray arr, int x, int y)
+        private void Shuffle()
         {
-            var temp = np.array(arr[x]).copy();
-            arr[x] = arr[y];
-            arr[y] = temp;
+            for (int i=num_input-1; i>0; i--)
+            {
+                int row_swap = rnd.Next(i + 1);
+                int temp = order[row_swap];
+                order[row_swap] = order[i];
+                order[i] = temp;
+            }
         }
     }
-}
\ No newline at end of file
+}
@@ -41,6 +41,7 @@ namespace SurrogateModel.Surrogate
             graph = build_graph();
             sess = tf.Session(config);
             sess.run(init); // initialize the graph
+            saver = tf.train.Saver();
         }
 
         /// <summary>
@@ -6,6 +6,7 @@ using Tensorflow;
 using NumSharp;
 using static Tensorflow.Binding;
 using SabberStoneUtil;
+using SabberStoneUtil.Config;
 using SabberStoneUtil.DataProcessing;
 using SurrogateModel.Logging;
 
@@ -39,11 +40,23 @@ namespace SurrogateModel.Surrogate
         // others
         protected int epoch_idx = 0;
         protected int num_train_idx = 0;
+        // path of the model saved by the last training, null if the model
+        // was never trained
+        public string last_model_path { get; private set; } = null;
         protected DataLoader dataLoaderTrain = null;
         protected DataLoader dataLoaderTest = null;
         protected DataLoader dataLoaderTestOutOfDist = null;
         protected bool testOutOfDist = false;
+        // created with the graph, so that training does not add operations
+        // to it
         protected Tensorflow.Saver saver;
+
+        // data kept across incremental trainings
+        protected TrainingBuffer train_buffer = null;
+        protected TrainingBuffer test_buffer = null;
+        protected NDArray X_out_dist = null;
+        protected NDArray y_out_dist = null;
+        protected Random incremental_rnd = new Random();
         public string[] model_targets { protected set; get; }
 
         // writers to record training/testing loss and model save point.
@@ -112,12 +125,20 @@ namespace SurrogateModel.Surrogate
             System.IO.Directory.CreateDirectory(train_log_dir);
 
             // create loss logger
-            string loss_logger_path = System.IO.Path.Combine(
-                train_log_dir, "model_losses.csv");
-            this.loss_logger = new LossLogger(loss_logger_path,
+            this.loss_logger = new LossLogger(get_loss_logger_path(),
                                               this.model_targets);
         }
 
+        private string get_loss_logger_path()
+        {
+            return System.IO.Path.Combine(train_log_dir, "model_losses.csv");
+        }
+
+        /// <summary>
+        /// Number of models saved so far, one per training
+        /// </summary>
+        public int num_models_saved => num_train_idx;
+
         /// <summary>
         /// Helper function to initialize dataLoader used for training and testing.
         /// </summary>
@@ -263,8 +284,6 @@ namespace SurrogateModel.Surrogate
             NDArray running_per_ele_loss = np.zeros(
                 shapes: new int[]{this.model_targets.Length});
 
-            saver = tf.train.Saver();
-
             Console.WriteLine("Start training");
             for (int i = 0; i < num_epoch; i++)
             {
@@ -293,63 +312,288 @@ namespace SurrogateModel.Surrogate
 
                 // Test the model
                 var (test_x, test_y) = dataLoaderTest.Sample();
-                var (testing_loss, test_per_ele_loss) =
-                    sess.run(
-                        (loss_op, per_ele_loss_op), // operation
-                        (n_samples, (int)test_x.shape[0]), // batch size
-                        (input, test_x), // features
-                        (y_true, test_y)); // targets
-                print($"testing_loss = {testing_loss}");
-
-                // do validation on out-of-distribution test set if necessary
-                // double testing_loss_out_dist = Double.NaN;
-                // print(testing_loss_out_dist);
-                // NDArray test_per_ele_loss_out_dist = null;
-                NDArray testing_loss_out_dist = null, test_per_ele_loss_out_dist = null;
+                NDArray test_x_out_dist = null, test_y_out_dist = null;
                 if (testOutOfDist)
                 {
-                    var (test_x_out_dist, test_y_out_dist) =
+                    (test_x_out_dist, test_y_out_dist) =
                         dataLoaderTestOutOfDist.Sample();
-                    (testing_loss_out_dist, test_per_ele_loss_out_dist) =
-                        sess.run(
-                            (loss_op, per_ele_loss_op), // operation
-                            (n_samples, (int)test_x_out_dist.shape[0]), // batch size
-                            (input, test_x_out_dist), // features
-                            (y_true, test_y_out_dist)); // targets
-                    print($"testing_loss_out_dist = {testing_loss_out_dist}");
                 }
+                validate(train_loss, train_per_ele_loss, test_x, test_y,
+                         test_x_out_dist, test_y_out_dist);
+            }
 
-                // write the losses
-                // divide by 1 to convert
-                double testing_loss_d = testing_loss / 1.0;
-                double testing_loss_out_dist_d = Double.NaN;
-                if (testOutOfDist)
-                {
-                    testing_loss_out_dist_d = testing_loss_out_dist / 1.0;
-                }
+            // save the model at the end of each training
+            save_model();
+        }
 
-                loss_logger.LogLoss(
-                    train_loss,
-                    testing_loss / 1.0,
-                    testing_loss_out_dist_d,
-                    train_per_ele_loss,
-                    test_per_ele_loss,
-                    test_per_ele_loss_out_dist,
-                    testOutOfDist);
-                epoch_idx++;
+        /// <summary>
+        /// Compute the testing losses and write them along with the
+        /// training losses.
+        /// </summary>
+        /// <returns>The testing loss</returns>
+        protected double validate(
+            double train_loss,
+            NDArray train_per_ele_loss,
+            NDArray test_x,
+            NDArray test_y,
+            NDArray test_x_out_dist,
+            NDArray test_y_out_dist)
+        {
+            var (testing_loss, test_per_ele_loss) =
+                sess.run(
+                    (loss_op, per_ele_loss_op), // operation
+                    (n_samples, (int)test_x.shape[0]), // batch size
+                    (input, test_x), // features
+                    (y_true, test_y)); // targets
+            print($"testing_loss = {testing_loss}");
+
+            // do validation on out-of-distribution test set if necessary
+            NDArray testing_loss_out_dist = null, test_per_ele_loss_out_dist = null;
+            if (testOutOfDist)
+            {
+                (testing_loss_out_dist, test_per_ele_loss_out_dist) =
+                    sess.run(
+                        (loss_op, per_ele_loss_op), // operation
+                        (n_samples, (int)test_x_out_dist.shape[0]), // batch size
+                        (input, test_x_out_dist), // features
+                        (y_true, test_y_out_dist)); // targets
+                print($"testing_loss_out_dist = {testing_loss_out_dist}");
             }
 
-            // save the model at the end of each training
+            // write the losses
+            // divide by 1 to convert
+            double testing_loss_d = testing_loss / 1.0;
+            double testing_loss_out_dist_d = Double.NaN;
+            if (testOutOfDist)
+            {
+                testing_loss_out_dist_d = testing_loss_out_dist / 1.0;
+            }
+
+            loss_logger.LogLoss(
+                train_loss,
+                testing_loss_d,
+                testing_loss_out_dist_d,
+                train_per_ele_loss,
+                test_per_ele_loss,
+                test_per_ele_loss_out_dist,
+                testOutOfDist);
+            epoch_idx++;
+            return testing_loss_d;
+        }
+
+        /// <summary>
+        /// Save a checkpoint of the model for the current training
+        /// </summary>
+        protected void save_model()
+        {
             string model_save_dir = System.IO.Path.Combine(
                 train_log_dir,
                 "surrogate_model",
                 String.Format("model{0}", num_train_idx));
             System.IO.Directory.CreateDirectory(model_save_dir);
-            saver.save(sess, System.IO.Path.Combine(
-                model_save_dir, "model.ckpt"));
+            last_model_path = System.IO.Path.Combine(
+                model_save_dir, "model.ckpt");
+            saver.save(sess, last_model_path);
             num_train_idx++;
         }
 
+        /// <summary>
+        /// Restore the model of a resumed search: the weights of the model
+        /// saved at `model_path` and the data given to incremental training.
+        /// The models saved after it are deleted, and the losses are appended
+        /// to the existing log.
+        /// </summary>
+        /// <param name = "model_path">Model to restore, null if the model was never trained</param>
+        /// <param name = "num_models_saved">Number of models saved when the search was checkpointed</param>
+        /// <param name = "trained_data">Data given to incremental training, in the order it was given</param>
+        public void Resume(
+            string model_path,
+            int num_models_saved,
+            List<LogIndividual> trained_data)
+        {
+            if (model_path != null)
+            {
+                saver.restore(sess, model_path);
+                last_model_path = model_path;
+            }
+            num_train_idx = num_models_saved;
+
+            string models_dir = System.IO.Path.Combine(
+                train_log_dir, "surrogate_model");
+            if (System.IO.Directory.Exists(models_dir))
+            {
+                foreach (string dir in System.IO.Directory.GetDirectories(models_dir))
+                {
+                    int idx;
+                    string name = System.IO.Path.GetFileName(dir);
+                    if (name.StartsWith("model") &&
+                        Int32.TryParse(name.Substring("model".Length), out idx) &&
+                        idx >= num_models_saved)
+                    {
+                        System.IO.Directory.Delete(dir, true);
+                    }
+                }
+            }
+
+            if (trained_data.Count > 0)
+            {
+                append_incremental_data(trained_data);
+            }
+
+            this.loss_logger = new LossLogger(get_loss_logger_path(),
+                                              this.model_targets,
+                                              append: true);
+        }
+
+        /// <summary>
+        /// Encode data for incremental training and add it to the buffers,
+        /// every tenth data point is held out for testing.
+        /// </summary>
+        /// <returns>The first row of the new data in the training buffer</returns>
+        private int append_incremental_data(List<LogIndividual> newLogIndividuals)
+        {
+            int num_targets = this.model_targets.Length;
+            if (train_buffer == null)
+            {
+                train_buffer = new TrainingBuffer(
+                    DataProcessor.numCards, num_targets);
+                test_buffer = new TrainingBuffer(
+                    DataProcessor.numCards, num_targets);
+            }
+
+            // encode the new data only
+            int first_new_row = train_buffer.num_rows;
+            var (cardsEncoding, deckStats) =
+                DataProcessor.PreprocessDeckOnehotFromData(
+                    newLogIndividuals, this.model_targets);
+            for (int i = 0; i < newLogIndividuals.Count; i++)
+            {
+                if ((train_buffer.num_rows + test_buffer.num_rows) % 10 == 9)
+                {
+                    test_buffer.Append(cardsEncoding, deckStats, i);
+                }
+                else
+                {
+                    train_buffer.Append(cardsEncoding, deckStats, i);
+                }
+            }
+            return first_new_row;
+        }
+
+        /// <summary>
+        /// Train the model from its current weights on data added since the
+        /// previous call. The encoded data is kept across calls, and every
+        /// tenth data point is held out for testing. Each minibatch draws
+        /// `RecentFraction` of its rows from the data added by this call and
+        /// the rest from all the data. Training stops after `NumSteps` steps,
+        /// or once the testing loss has not improved for `Patience`
+        /// evaluations.
+        /// </summary>
+        /// <param name = "newLogIndividuals">Data not given to a previous call</param>
+        public void IncrementalFit(
+            List<LogIndividual> newLogIndividuals,
+            IncrementalTrainingParams incrementalParams,
+            bool testOutOfDist = false)
+        {
+            int num_targets = this.model_targets.Length;
+            int first_new_row = append_incremental_data(newLogIndividuals);
+            if (train_buffer.num_rows == 0)
+            {
+                return;
+            }
+
+            // Read in out-of-dist testing data once, if any.
+            this.testOutOfDist = testOutOfDist;
+            if (testOutOfDist && X_out_dist == null)
+            {
+                var (cardsEncodingOutDist, deckStatsOutDist) =
+                    DataProcessor.PreprocessDeckOnehotFromFile(
+                        offline_test_data_file, this.model_targets);
+                X_out_dist = np.array(cardsEncodingOutDist);
+                y_out_dist = np.array(deckStatsOutDist);
+            }
+
+            // if nothing is held out yet, test on the training data
+            var (test_x, test_y) = test_buffer.num_rows > 0 ?
+                test_buffer.All() : train_buffer.All();
+
+            // minibatches are sampled into the same arrays at every step
+            var rows = new int[batch_size];
+            var x_batch = new double[batch_size, DataProcessor.numCards];
+            var y_batch = new double[batch_size, num_targets];
+
+            double running_loss = 0;
+            NDArray running_per_ele_loss = np.zeros(
+                shapes: new int[]{num_targets});
+            int num_running_steps = 0;
+            double best_testing_loss = Double.PositiveInfinity;
+            int num_evals_without_improvement = 0;
+
+            Console.WriteLine(String.Format(
+                "Start incremental training with {0} new data points",
+                newLogIndividuals.Count));
+            for (int step = 1; step <= incrementalParams.NumSteps; step++)
+            {
+                for (int j = 0; j < batch_size; j++)
+                {
+                    if (first_new_row < train_buffer.num_rows &&
+                        incremental_rnd.NextDouble() <
+                            incrementalParams.RecentFraction)
+                    {
+                        rows[j] = incremental_rnd.Next(
+                            first_new_row, train_buffer.num_rows);
+                    }
+                    else
+                    {
+                        rows[j] = incremental_rnd.Next(train_buffer.num_rows);
+                    }
+                }
+                var (x_input, y_input) =
+                    train_buffer.Gather(rows, x_batch, y_batch);
+                var (_, training_loss, per_ele_train_loss) =
+                    sess.run(
+                        (train_op, loss_op, per_ele_loss_op), // operations
+                        (n_samples, batch_size), // batch size
+                        (input, x_input), // features
+                        (y_true, y_input)); // targets
+                running_loss += training_loss;
+                running_per_ele_loss += per_ele_train_loss;
+                num_running_steps++;
+
+                if (step % incrementalParams.EvalInterval != 0 &&
+                    step != incrementalParams.NumSteps)
+                {
+                    continue;
+                }
+
+                double train_loss = running_loss / num_running_steps;
+                NDArray train_per_ele_loss =
+                    running_per_ele_loss / num_running_steps;
+                print($"step{step}:");
+                print($"training_loss = {train_loss}");
+                running_loss = 0;
+                running_per_ele_loss = np.zeros(
+                    shapes: new int[]{num_targets});
+                num_running_steps = 0;
+
+                double testing_loss = validate(
+                    train_loss, train_per_ele_loss, test_x, test_y,
+                    X_out_dist, y_out_dist);
+                if (testing_loss < best_testing_loss)
+                {
+                    best_testing_loss = testing_loss;
+                    num_evals_without_improvement = 0;
+                }
+                else if (++num_evals_without_improvement ==
+                         incrementalParams.Patience)
+                {
+                    print($"testing loss stopped improving, stop at step{step}");
+                    break;
+                }
+            }
+
+            save_model();
+        }
 
         /// <summary>
         /// Helper function to get model output given a input tensor
@@ -362,15 +606,17 @@ namespace SurrogateModel.Surrogate
                 (n_samples, (int)x_input.shape[0]), // batch size
                 (input, x_input)); // features
 
-            // convert result to double array
-            double[,] result;
-            result = new double[output.shape[0], output.shape[1]];
-            for (int i = 0; i < output.shape[0]; i++)
+            // convert result to double array, reading the float output as a
+            // flat array instead of indexing the NDArray element by element
+            int numRows = output.shape[0];
+            int numCols = output.shape[1];
+            float[] flatOutput = output.ToArray<float>();
+            double[,] result = new double[numRows, numCols];
+            for (int i = 0; i < numRows; i++)
             {
-                for (int j = 0; j < output.shape[1]; j++)
+                for (int j = 0; j < numCols; j++)
                 {
-                    // need to cast twice because the model use float
-                    result[i, j] = (double)(float)output[i, j];
+                    result[i, j] = flatOutput[i * numCols + j];
                 }
             }
             return result;
@@ -416,6 +662,16 @@ namespace SurrogateModel.Surrogate
         /// </summary>
         public abstract double[,] Predict(List<LogIndividual> logIndividuals);
 
+        /// <summary>
+        /// Evaluate a batch of decks given as card counts, one row per deck
+        /// following the card index of DataProcessor, skipping the
+        /// LogIndividual conversion and one hot encoding of Predict.
+        /// </summary>
+        public double[,] Predict(int[,] cardCounts)
+        {
+            return PredictHelper(np.array(cardCounts));
+        }
+
         /// <summary>
         /// Offline fit the model using data in the offline data file.
         /// </summary>
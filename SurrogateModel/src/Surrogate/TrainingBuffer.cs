@@ -0,0 +1,133 @@
+using System;
+using NumSharp;
+
+namespace SurrogateModel.Surrogate
+{
+    /// <summary>
+    /// Encoded training data kept across trainings. Rows are stored in
+    /// preallocated matrices that double their capacity when full, so that
+    /// adding data only encodes and copies the new rows.
+    /// </summary>
+    public class TrainingBuffer
+    {
+        /// <summary>
+        /// Features, the first num_rows rows are used.
+        /// Shape: [capacity, num_features]
+        /// </summary>
+        private double[,] X;
+
+        /// <summary>
+        /// Targets, the first num_rows rows are used.
+        /// Shape: [capacity, num_targets]
+        /// </summary>
+        private double[,] y;
+
+        /// <summary>
+        /// All rows as NDArrays, built on demand and kept until rows are
+        /// added.
+        /// </summary>
+        private NDArray X_all = null;
+        private NDArray y_all = null;
+
+        /// <summary>
+        /// Number of rows in the buffer
+        /// </summary>
+        public int num_rows { get; private set; } = 0;
+
+        public int num_features { get; private set; }
+
+        public int num_targets { get; private set; }
+
+        /// <summary>
+        /// Constructor of TrainingBuffer
+        /// </summary>
+        /// <param name="num_features">Number of features of a row</param>
+        /// <param name="num_targets">Number of targets of a row</param>
+        /// <param name="capacity">Number of rows to preallocate</param>
+        public TrainingBuffer(int num_features, int num_targets, int capacity = 1024)
+        {
+            this.num_features = num_features;
+            this.num_targets = num_targets;
+            X = new double[Math.Max(capacity, 1), num_features];
+            y = new double[Math.Max(capacity, 1), num_targets];
+        }
+
+        /// <summary>
+        /// Append row `row` of the given features and targets.
+        /// </summary>
+        public void Append(int[,] features, double[,] targets, int row)
+        {
+            if (num_rows == X.GetLength(0))
+            {
+                Grow();
+            }
+
+            for (int j = 0; j < num_features; j++)
+            {
+                X[num_rows, j] = features[row, j];
+            }
+            for (int j = 0; j < num_targets; j++)
+            {
+                y[num_rows, j] = targets[row, j];
+            }
+            num_rows++;
+            X_all = null;
+            y_all = null;
+        }
+
+        /// <summary>
+        /// Double the capacity, copying the rows over.
+        /// </summary>
+        private void Grow()
+        {
+            int capacity = X.GetLength(0) * 2;
+            var newX = new double[capacity, num_features];
+            var newY = new double[capacity, num_targets];
+            Array.Copy(X, newX, num_rows * num_features);
+            Array.Copy(y, newY, num_rows * num_targets);
+            X = newX;
+            y = newY;
+        }
+
+        /// <summary>
+        /// Copy the given rows into `x_batch` and `y_batch`, which must have
+        /// rows.Length rows.
+        /// </summary>
+        public (NDArray, NDArray) Gather(
+            int[] rows, double[,] x_batch, double[,] y_batch)
+        {
+            for (int i = 0; i < rows.Length; i++)
+            {
+                System.Buffer.BlockCopy(
+                    X, rows[i] * num_features * sizeof(double),
+                    x_batch, i * num_features * sizeof(double),
+                    num_features * sizeof(double));
+                System.Buffer.BlockCopy(
+                    y, rows[i] * num_targets * sizeof(double),
+                    y_batch, i * num_targets * sizeof(double),
+                    num_targets * sizeof(double));
+            }
+            return (np.array(x_batch), np.array(y_batch));
+        }
+
+        /// <summary>
+        /// All rows of the buffer.
+        /// </summary>
+        public (NDArray, NDArray) All()
+        {
+            if (X_all == null)
+            {
+                var rows = new int[num_rows];
+                for (int i = 0; i < num_rows; i++)
+                {
+                    rows[i] = i;
+                }
+                (X_all, y_all) = Gather(
+                    rows,
+                    new double[num_rows, num_features],
+                    new double[num_rows, num_targets]);
+            }
+            return (X_all, y_all);
+        }
+    }
+}
@@ -0,0 +1,171 @@
+"""
+QD metrics computed in a single pass over the history of an archive.
+
+The history of a DeltaMapLog is walked with `iter_changes`. Keyframes reset
+the running totals from their cells with a few vectorized operations, every
+other row only updates the totals of the cells it changed. A full
+EliteMapLog holds every snapshot as flat columns already, so its metrics are
+segmented reductions over those columns.
+"""
+import collections
+import math
+import numpy as np
+
+# Metrics of every snapshot of a log, plus the running totals at the end.
+MetricsHistory = collections.namedtuple(
+    "MetricsHistory",
+    ["num_elites", "qd_scores", "max_fitness", "max_wins", "last"])
+
+
+class ArchiveMetrics:
+    """
+    Running QD score, number of elites, max fitness, max win count and CCDF
+    histogram of an archive.
+
+    The CCDF histogram counts the elites in bins of width 1 such that bin b
+    holds the elites with b < fitness <= b + 1, so the number of elites with
+    fitness > t is the suffix sum from bin t on, for every integer t in
+    [fitness_min, fitness_max].
+    """
+    def __init__(self, fitness_min, fitness_max):
+        self.fitness_min = fitness_min
+        self.fitness_max = fitness_max
+        self.reset()
+
+    def reset(self):
+        self.qd_score = 0.0
+        self.max_fitness = -np.inf
+        self.max_wins = -np.inf
+        self.ccdf_hist = np.zeros(self.fitness_max - self.fitness_min + 1,
+                                  dtype=np.int64)
+        # cell indices -> (fitness, wins). Built lazily after a keyframe, so
+        # logs that only contain keyframes never pay for it.
+        self._cells = {}
+        self._keyframe = None
+
+    @property
+    def num_elites(self):
+        if self._keyframe is not None:
+            return len(self._keyframe.fitness)
+        return len(self._cells)
+
+    def _normalize(self, fitness):
+        return (fitness - self.fitness_min) / (self.fitness_max -
+                                               self.fitness_min)
+
+    def _bin(self, fitness):
+        """Bin of the CCDF histogram of `fitness`, None if below every bin."""
+        b = math.ceil(fitness) - 1 - self.fitness_min
+        if b < 0:
+            return None
+        return min(b, len(self.ccdf_hist) - 1)
+
+    def load_keyframe(self, cells):
+        """Reset the totals to the archive of a keyframe."""
+        self.reset()
+        fitness = np.asarray(cells.fitness)
+        if len(fitness) == 0:
+            return
+        self._keyframe = cells
+        self.qd_score = float(self._normalize(fitness).sum())
+        self.max_fitness = float(fitness.max())
+        self.max_wins = float(np.max(cells.wins))
+        bins = np.ceil(fitness).astype(np.int64) - 1 - self.fitness_min
+        bins = np.minimum(bins[bins >= 0], len(self.ccdf_hist) - 1)
+        self.ccdf_hist += np.bincount(bins, minlength=len(self.ccdf_hist))
+
+    def _materialize(self):
+        if self._keyframe is None:
+            return
+        cells = self._keyframe
+        self._keyframe = None
+        self._cells = dict(
+            zip(map(tuple, np.asarray(cells.indices).tolist()),
+                zip(np.asarray(cells.fitness).tolist(),
+                    np.asarray(cells.wins).tolist())))
+
+    def update(self, key, fitness, wins):
+        """Insert or replace the elite of cell `key`."""
+        self._materialize()
+        old = self._cells.get(key)
+        self._cells[key] = (fitness, wins)
+
+        self.qd_score += self._normalize(fitness)
+        new_bin = self._bin(fitness)
+        if new_bin is not None:
+            self.ccdf_hist[new_bin] += 1
+
+        if old is not None:
+            old_fitness, old_wins = old
+            self.qd_score -= self._normalize(old_fitness)
+            old_bin = self._bin(old_fitness)
+            if old_bin is not None:
+                self.ccdf_hist[old_bin] -= 1
+            # the max can only drop if the replaced elite held it
+            if (old_fitness == self.max_fitness and fitness < old_fitness) or \
+               (old_wins == self.max_wins and wins < old_wins):
+                self.max_fitness = max(f for f, _ in self._cells.values())
+                self.max_wins = max(w for _, w in self._cells.values())
+                return
+
+        self.max_fitness = max(self.max_fitness, fitness)
+        self.max_wins = max(self.max_wins, wins)
+
+    def apply(self, changes):
+        for key, fitness, wins in zip(map(tuple, changes.indices.tolist()),
+                                      changes.fitness.tolist(),
+                                      changes.wins.tolist()):
+            self.update(key, fitness, wins)
+
+    def ccdf(self):
+        """Number of elites with fitness > t for t in [fitness_min, fitness_max]."""
+        return np.cumsum(self.ccdf_hist[::-1])[::-1]
+
+    def fitnesses(self):
+        """Fitness of every elite of the archive."""
+        if self._keyframe is not None:
+            return np.array(self._keyframe.fitness)
+        return np.array([f for f, _ in self._cells.values()])
+
+
+def compute_metrics(elite_map_log, fitness_min, fitness_max):
+    """
+    Walk the history of an EliteMapLog or DeltaMapLog once and return the
+    MetricsHistory of its snapshots.
+    """
+    if not hasattr(elite_map_log, "keyframe"):
+        return _compute_full_log_metrics(elite_map_log, fitness_min,
+                                         fitness_max)
+
+    num_rows = len(elite_map_log)
+    num_elites = np.empty(num_rows, dtype=np.int64)
+    qd_scores = np.empty(num_rows, dtype=np.float64)
+    max_fitness = np.empty(num_rows, dtype=np.float64)
+    max_wins = np.empty(num_rows, dtype=np.float64)
+
+    metrics = ArchiveMetrics(fitness_min, fitness_max)
+    for i, (keyframe, cells) in enumerate(elite_map_log.iter_changes()):
+        if keyframe:
+            metrics.load_keyframe(cells)
+        else:
+            metrics.apply(cells)
+        num_elites[i] = metrics.num_elites
+        qd_scores[i] = metrics.qd_score
+        max_fitness[i] = metrics.max_fitness
+        max_wins[i] = metrics.max_wins
+
+    return MetricsHistory(num_elites, qd_scores, max_fitness, max_wins, metrics)
+
+
+def _compute_full_log_metrics(elite_map_log, fitness_min, fitness_max):
+    metrics = ArchiveMetrics(fitness_min, fitness_max)
+    fitness = np.asarray(elite_map_log.fitness)
+    qd_scores = elite_map_log.reduce_per_snapshot(
+        metrics._normalize(fitness))
+    max_fitness = elite_map_log.reduce_per_snapshot(fitness, np.maximum,
+                                                    -np.inf)
+    max_wins = elite_map_log.reduce_per_snapshot(elite_map_log.wins,
+                                                 np.maximum, -np.inf)
+    metrics.load_keyframe(elite_map_log[-1])
+    return MetricsHistory(elite_map_log.num_elites, qd_scores, max_fitness,
+                          max_wins, metrics)
@@ -4,12 +4,13 @@ import toml
 import numpy as np
 import pandas as pd
 import argparse
-import tensorflow as tf
 import json
 import random
 from tqdm import tqdm
 from pprint import pprint
-from jacobian import get_latest_model_checkpoint, get_vec_encoding, build_model, calc_jacobian_matrix, card_index, card_name, get_order_from_jacobian
+from jacobian import load_surrogate, get_orders_from_jacobian, card_index, card_name
+from individual_log import load_individual_log
+from remove_card_analysis import load_remove_card_results
 
 
 def encode_str2encode_vec(encode_str):
@@ -18,13 +19,10 @@ def encode_str2encode_vec(encode_str):
     return np.array(encode_list_int).reshape((1, -1))
 
 
-def get_complete_deck(elite_id, log_dir):
-    ind_log_file = os.path.join(log_dir, "individual_log.csv")
-    all_inds = pd.read_csv(ind_log_file)
-    row = all_inds[all_inds["Individual"] == elite_id].iloc[0]
-    deck = row["Deck"]
-    performance = row["AverageHealthDifference"]
-    return deck.split("*"), performance
+def get_complete_deck(elite_id, individuals):
+    deck = individuals.deck(elite_id)
+    performance = individuals.get(elite_id, "AverageHealthDifference")
+    return deck, performance
 
 
 def get_removed_cards(complete_deck, incomplete_deck):
@@ -38,62 +36,34 @@ def get_removed_cards(complete_deck, incomplete_deck):
     return cards_removed
 
 
-def obtain_card_order(log_dir):
+def obtain_card_order(log_dir, n_jobs=-1):
     """
     Obtain card order from remove card analysis result of the log directory.
     """
-    remove_card_result_dir = os.path.join(log_dir, 'remove_card_analysis')
-    if not os.path.isdir(remove_card_result_dir):
-        print("Remove card analysis result directory not found")
+    try:
+        results = load_remove_card_results(log_dir, n_jobs)
+    except ValueError as e:
+        print(e)
         exit(1)
 
-    real_sim_dir = os.path.join(remove_card_result_dir, "real_sim")
-    surrogate_sim_dir = os.path.join(remove_card_result_dir, "surrogate_sim")
-
+    individuals = load_individual_log(log_dir, card_index)
     all_removed_card_orders = {}
-    for elite_dir in tqdm(os.listdir(real_sim_dir)):
+    for elite_id, elite_results in tqdm(results.groupby("Elite", sort=False)):
         # obtain complete deck
-        elite_id = int(elite_dir.split('#')[1])
         complete_deck, complete_performance = \
-            get_complete_deck(elite_id, log_dir)
-
-        # get order
-        real_sim_order = []
-        surr_sim_order = []
-        real_sim_elite_dir_full = os.path.join(real_sim_dir, elite_dir)
-        surr_sim_elite_dir_full = os.path.join(surrogate_sim_dir, elite_dir)
-        if not os.path.isdir(surrogate_sim_dir):
-            raise ValueError(
-                f"Surrogate simulation result of elite#{elite_id} does not exist."
-            )
-            exit(1)
-        for card_rm_result_file in os.listdir(real_sim_elite_dir_full):
-            # read in the result
-            card_removed = "-".join(".".join(
-                card_rm_result_file.split(".")[:-1]).split("-")[1:])
-            real_sim_result_file_full = os.path.join(real_sim_elite_dir_full,
-                                                     card_rm_result_file)
-            surr_sim_result_file_full = os.path.join(surr_sim_elite_dir_full,
-                                                     card_rm_result_file)
-            real_sim_result = toml.load(real_sim_result_file_full)
-            surr_sim_result = toml.load(surr_sim_result_file_full)
-
-            # get the removed card
-            incomplete_deck = real_sim_result["PlayerDeck"]["CardList"]
-            # card_removed_ = get_removed_cards(complete_deck, incomplete_deck)[0]
-
-            # calculate performance difference
-            real_incomp_perf = \
-                real_sim_result["OverallStats"]["AverageHealthDifference"]
-            surr_incomp_perf = surr_sim_result["AverageHealthDifference"]
-            real_perf_diff = complete_performance - real_incomp_perf
-            surr_perf_diff = complete_performance - surr_incomp_perf
-
-            # add to order list
-            real_sim_order.append((card_removed, real_perf_diff))
-            surr_sim_order.append((card_removed, surr_perf_diff))
+            get_complete_deck(elite_id, individuals)
+
+        # calculate performance difference
+        cards_removed = elite_results["CardRemoved"].tolist()
+        real_perf_diffs = (complete_performance -
+                           elite_results["RealAverageHealthDifference"]).tolist()
+        surr_perf_diffs = (
+            complete_performance -
+            elite_results["SurrogateAverageHealthDifference"]).tolist()
 
         # sort to get the order(Most to Least powerful card)
+        real_sim_order = list(zip(cards_removed, real_perf_diffs))
+        surr_sim_order = list(zip(cards_removed, surr_perf_diffs))
         real_sim_order.sort(key=lambda x: x[1], reverse=True)
         surr_sim_order.sort(key=lambda x: x[1], reverse=True)
         all_removed_card_orders[elite_id] = {}
@@ -235,22 +205,34 @@ if __name__ == "__main__":
         required=False,
         default="surrogate_train_log",
     )
+    parser.add_argument(
+        '-b',
+        '--backend',
+        help='backend computing the jacobian, `numpy` or `tf`.',
+        required=False,
+        default="numpy",
+    )
+    parser.add_argument(
+        '-j',
+        '--n_jobs',
+        help='number of processes loading remove card analysis results, -1 to use all cores.',
+        required=False,
+        default=-1,
+        type=int,
+    )
     opt = parser.parse_args()
     log_dir = opt.log_dir
     mode = opt.mode
     surr_log_dir = opt.surrogate_log_path
 
-    # read in model
-    model = build_model(log_dir, surr_log_dir)
-
-    # get latest model
-    model_checkpoint = get_latest_model_checkpoint(log_dir, surr_log_dir)
+    # read in latest model
+    model = load_surrogate(log_dir, surr_log_dir, opt.backend)
 
     if mode == "in-dist":
         # get all orders from remove card analysis
         print("Counting in distribution inversions")
         print("Getting orders from remove card analysis...")
-        rca_orders = obtain_card_order(log_dir)
+        rca_orders = obtain_card_order(log_dir, opt.n_jobs)
 
         rm_card_analysis_dir = os.path.join(log_dir, "remove_card_analysis")
         if not os.path.isdir(rm_card_analysis_dir):
@@ -258,61 +240,40 @@ if __name__ == "__main__":
             exit(1)
 
         # read in all individuals
-        individuals = pd.read_csv(os.path.join(log_dir, "individual_log.csv"))
+        individuals = load_individual_log(log_dir, card_index)
 
         # get all elites to do analysis
         real_sim_dir = os.path.join(rm_card_analysis_dir, "real_sim")
-        all_elite_decks = []
-        for elite_dir in os.listdir(real_sim_dir):
-            elite_id = int(elite_dir.split("#")[1])
-            elite_deck_str = individuals[individuals["Individual"] ==
-                                         elite_id].iloc[0]["Deck"]
-            elite_fitness = float(
-                individuals[individuals["Individual"] ==
-                            elite_id].iloc[0]["AverageHealthDifference"])
-            elite_deck = elite_deck_str.split("*")
-            all_elite_decks.append((elite_id, elite_deck, elite_fitness))
+        elite_ids = [
+            int(elite_dir.split("#")[1])
+            for elite_dir in os.listdir(real_sim_dir)
+        ]
+        elite_fitnesses = individuals.columns["AverageHealthDifference"][
+            individuals.rows_of(elite_ids)].astype(float)
 
         num_inversions = {}
         print(
             "Getting orders from jacobian analysis and counting inversions...")
-        for elite_id, elite_deck, elite_fitness in tqdm(all_elite_decks):
-            with tf.compat.v1.Session() as sess:
-                # load model params
-                saver = tf.compat.v1.train.Saver()
-                saver.restore(sess, model_checkpoint)
-
-                # encode deck
-                x = get_vec_encoding(elite_deck)
-                # print(x)
-
-                jacobian_matrix = calc_jacobian_matrix(model, x, sess)
-
-                # print("Jacobian matrix of Fitness value:")
-                # print(jacobian_matrix[0, 0])
-                # print(jacobian_matrix.shape)
-
-                card_names_by_pw, _, _ = get_order_from_jacobian(
-                    jacobian_matrix, x)
-
-                # get the order from remove card analysis
-                real_order = [
-                    card for card, _ in rca_orders[elite_id]["real_order"]
-                ]
-
-                # calculate num inversions
-                num_inversions[elite_id] = {
-                    "inversions":
-                    count_inversion(real_order, card_names_by_pw),
-                    "fitness":
-                    elite_fitness,
-                    "sum_squared_pos_shift":
-                    float(sum_squared_pos_shift(real_order, card_names_by_pw)),
-                }
-
-            # reset model
-            tf.compat.v1.reset_default_graph()
-            model = build_model(log_dir, surr_log_dir)
+        # get the jacobian of all decks in one batch
+        x = individuals.deck_counts(elite_ids).astype(float)
+        jacobian_orders = get_orders_from_jacobian(model.jacobian(x), x)
+        for elite_id, elite_fitness, card_names_by_pw in tqdm(
+                zip(elite_ids, elite_fitnesses.tolist(), jacobian_orders),
+                total=len(elite_ids)):
+            # get the order from remove card analysis
+            real_order = [
+                card for card, _ in rca_orders[elite_id]["real_order"]
+            ]
+
+            # calculate num inversions
+            num_inversions[elite_id] = {
+                "inversions":
+                count_inversion(real_order, card_names_by_pw),
+                "fitness":
+                elite_fitness,
+                "sum_squared_pos_shift":
+                float(sum_squared_pos_shift(real_order, card_names_by_pw)),
+            }
 
         with open(os.path.join(log_dir, "in-dist_inversions.json"), "w") as f:
             json.dump(num_inversions, f)
@@ -330,7 +291,8 @@ if __name__ == "__main__":
         print("Getting orders from remove card analysis...")
         all_rca_orders = {}
         for exp_log_dir in exps_to_find:
-            all_rca_orders[exp_log_dir] = obtain_card_order(exp_log_dir)
+            all_rca_orders[exp_log_dir] = obtain_card_order(
+                exp_log_dir, opt.n_jobs)
 
         with open("analysis/testing_decks_rogue.json") as f:
             testing_decks = json.load(f)
@@ -338,37 +300,31 @@ if __name__ == "__main__":
         num_inversions = {}
         print(
             "Getting orders from jacobian analysis and counting inversions...")
-        for encode_str, curr_log_dir, elite_id, elite_fitness in tqdm(
-                testing_decks):
-            with tf.compat.v1.Session() as sess:
-                # load model params
-                saver = tf.compat.v1.train.Saver()
-                saver.restore(sess, model_checkpoint)
-
-                rca_orders = all_rca_orders[curr_log_dir]
-                x = encode_str2encode_vec(encode_str)
-                jacobian_matrix = calc_jacobian_matrix(model, x, sess)
-
-                card_names_by_pw, _, _ = get_order_from_jacobian(
-                    jacobian_matrix, x)
-
-                # get the order from remove card analysis
-                real_order = [
-                    card for card, _ in rca_orders[elite_id]["real_order"]
-                ]
-
-                # calculate num inversions
-                num_inversions[elite_id] = {
-                    "inversions":
-                    count_inversion(real_order, card_names_by_pw),
-                    "fitness":
-                    elite_fitness,
-                    "sum_squared_pos_shift":
-                    float(sum_squared_pos_shift(real_order, card_names_by_pw)),
-                }
-            # reset model
-            tf.compat.v1.reset_default_graph()
-            model = build_model(log_dir, surr_log_dir)
+        # encode all decks and get their jacobian in one batch
+        x = np.concatenate([
+            encode_str2encode_vec(encode_str)
+            for encode_str, _, _, _ in testing_decks
+        ])
+        jacobian_orders = get_orders_from_jacobian(model.jacobian(x), x)
+        for (encode_str, curr_log_dir, elite_id, elite_fitness), \
+            card_names_by_pw in tqdm(zip(testing_decks, jacobian_orders),
+                                     total=len(testing_decks)):
+            rca_orders = all_rca_orders[curr_log_dir]
+
+            # get the order from remove card analysis
+            real_order = [
+                card for card, _ in rca_orders[elite_id]["real_order"]
+            ]
+
+            # calculate num inversions
+            num_inversions[elite_id] = {
+                "inversions":
+                count_inversion(real_order, card_names_by_pw),
+                "fitness":
+                elite_fitness,
+                "sum_squared_pos_shift":
+                float(sum_squared_pos_shift(real_order, card_names_by_pw)),
+            }
 
         with open(os.path.join(log_dir, "out-dist_inversions.json"), "w") as f:
             json.dump(num_inversions, f)
\ No newline at end of file
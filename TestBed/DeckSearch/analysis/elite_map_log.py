@@ -0,0 +1,549 @@
+"""
+Reader of the elite map logs (elite_map_log.csv, surrogate_elite_map_log.csv)
+written by DeckSearch/src/Logging/FrequentMapLog.cs.
+
+Every row of the log is one snapshot of the archive:
+
+    f1xf2,idx1:idx2:CellCount:IndividualID:Wins:Fitness:Feature1:Feature2,...
+
+When the search is configured with `[Log] Type = "Delta"` every row only
+holds the cells that changed since the previous row:
+
+    K|D,f1xf2,idx1:idx2:CellCount:OldIndividualID:IndividualID:Wins:Fitness:Feature1:Feature2,...
+
+"K" rows are keyframes listing the whole archive, "D" rows are deltas. Both
+formats are loaded through `load_elite_map_log`, which returns an
+EliteMapLog or a DeltaMapLog with the same interface.
+
+The log is streamed row by row and the colon-packed cells are parsed into
+flat NumPy columns. A columnar cache (one .npy file per column) is written
+next to the log and memory-mapped on later runs, so re-running an analysis
+does not re-tokenize the csv.
+"""
+import os
+import json
+import shutil
+import collections
+import numpy as np
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".cache"
+CACHE_META_FILE = "meta.json"
+
+# Columns stored by EliteMapLog, one entry per logged cell.
+CELL_COLUMNS = ["indices", "cell_count", "ind_id", "wins", "fitness", "features"]
+
+# Columns stored by DeltaMapLog, one entry per logged change.
+CHANGE_COLUMNS = [
+    "indices", "cell_count", "old_id", "ind_id", "wins", "fitness", "features"
+]
+
+DELTA_HEADER = "Type,"
+KEYFRAME = "K"
+
+# One archive snapshot. `dims` is the shape of the map, all other fields have
+# one row per filled cell.
+Snapshot = collections.namedtuple(
+    "Snapshot",
+    ["dims", "indices", "cell_count", "ind_id", "wins", "fitness", "features"])
+
+# Cells changed by one row of a delta log, one row per changed cell.
+Changes = collections.namedtuple("Changes", CHANGE_COLUMNS)
+
+
+def num_cell_fields(num_features):
+    """Number of colon separated fields of one logged cell."""
+    return 2 * num_features + 4
+
+
+def num_change_fields(num_features):
+    """Number of colon separated fields of one change of a delta log."""
+    return 2 * num_features + 5
+
+
+def is_delta_log(log_file):
+    with open(log_file, "r") as f:
+        return f.readline().startswith(DELTA_HEADER)
+
+
+def parse_row(line):
+    """
+    Parse one line of the log into the map dimensions and a
+    (num_cells, num_fields) float array of the raw cell values.
+    """
+    dims_str, _, cells_str = line.rstrip("\r\n").partition(",")
+    dims = tuple(int(d) for d in dims_str.split("x"))
+    num_fields = num_cell_fields(len(dims))
+    if cells_str:
+        values = np.array(cells_str.replace(",", ":").split(":"),
+                          dtype=np.float64).reshape(-1, num_fields)
+    else:
+        values = np.empty((0, num_fields), dtype=np.float64)
+    return dims, values
+
+
+def split_cells(dims, values):
+    """Split raw cell values returned by `parse_row` into a Snapshot."""
+    num_features = len(dims)
+    return Snapshot(
+        dims=np.asarray(dims, dtype=np.int32),
+        indices=values[:, :num_features].astype(np.int32),
+        cell_count=values[:, num_features].astype(np.int32),
+        ind_id=values[:, num_features + 1].astype(np.int64),
+        wins=values[:, num_features + 2],
+        fitness=values[:, num_features + 3],
+        features=values[:, num_features + 4:],
+    )
+
+
+def parse_delta_row(line):
+    """
+    Parse one line of a delta log into a keyframe flag, the map dimensions
+    and a (num_changes, num_fields) float array of the raw change values.
+    """
+    kind, _, line = line.partition(",")
+    dims_str, _, cells_str = line.rstrip("\r\n").partition(",")
+    dims = tuple(int(d) for d in dims_str.split("x"))
+    num_fields = num_change_fields(len(dims))
+    if cells_str:
+        values = np.array(cells_str.replace(",", ":").split(":"),
+                          dtype=np.float64).reshape(-1, num_fields)
+    else:
+        values = np.empty((0, num_fields), dtype=np.float64)
+    return kind == KEYFRAME, dims, values
+
+
+def split_changes(values, num_features):
+    """Split raw change values returned by `parse_delta_row` into Changes."""
+    return Changes(
+        indices=values[:, :num_features].astype(np.int32),
+        cell_count=values[:, num_features].astype(np.int32),
+        old_id=values[:, num_features + 1].astype(np.int64),
+        ind_id=values[:, num_features + 2].astype(np.int64),
+        wins=values[:, num_features + 3],
+        fitness=values[:, num_features + 4],
+        features=values[:, num_features + 5:],
+    )
+
+
+def _iter_lines(log_file, max_rows=None):
+    with open(log_file, "r") as f:
+        f.readline()  # header
+        for i, line in enumerate(f):
+            if max_rows is not None and i >= max_rows:
+                break
+            if not line.strip():
+                continue
+            yield line
+
+
+def iter_elite_map_log(log_file, max_rows=None):
+    """
+    Stream the snapshots of the log one at a time without keeping the whole
+    file in memory. Delta logs are replayed on the fly.
+    """
+    if not is_delta_log(log_file):
+        for line in _iter_lines(log_file, max_rows):
+            yield split_cells(*parse_row(line))
+        return
+
+    archive = None
+    for line in _iter_lines(log_file, max_rows):
+        keyframe, dims, values = parse_delta_row(line)
+        if keyframe or archive is None:
+            archive = Archive(dims)
+        archive.apply(split_changes(values, len(dims)))
+        yield archive.snapshot()
+
+
+class Archive:
+    """
+    Archive rebuilt from the changes of a delta log. Cells are kept in the
+    order they were first filled, like the Dictionary of the feature map.
+    """
+    def __init__(self, dims):
+        self.dims = tuple(dims)
+        self.num_features = len(self.dims)
+        # cell indices -> (cell_count, ind_id, wins, fitness, features)
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def apply(self, changes):
+        """Insert or replace the cells of a Changes."""
+        for key, cell_count, ind_id, wins, fitness, features in zip(
+                map(tuple, changes.indices.tolist()),
+                changes.cell_count.tolist(), changes.ind_id.tolist(),
+                changes.wins.tolist(), changes.fitness.tolist(),
+                map(tuple, changes.features.tolist())):
+            self.cells[key] = (cell_count, ind_id, wins, fitness, features)
+
+    def snapshot(self):
+        num_cells = len(self.cells)
+        cells = list(self.cells.values())
+        return Snapshot(
+            dims=np.asarray(self.dims, dtype=np.int32),
+            indices=np.array(list(self.cells.keys()), dtype=np.int32).reshape(
+                num_cells, self.num_features),
+            cell_count=np.array([c[0] for c in cells], dtype=np.int32),
+            ind_id=np.array([c[1] for c in cells], dtype=np.int64),
+            wins=np.array([c[2] for c in cells], dtype=np.float64),
+            fitness=np.array([c[3] for c in cells], dtype=np.float64),
+            features=np.array([c[4] for c in cells],
+                              dtype=np.float64).reshape(num_cells,
+                                                        self.num_features),
+        )
+
+
+class EliteMapLog:
+    """
+    All snapshots of an elite map log stored as flat columns.
+
+    Cells of snapshot i are rows offsets[i]:offsets[i+1] of every column in
+    CELL_COLUMNS. dims[i] is the shape of the map of snapshot i.
+    """
+    COLUMNS = ["dims", "offsets", *CELL_COLUMNS]
+
+    def __init__(self, dims, offsets, indices, cell_count, ind_id, wins,
+                 fitness, features):
+        self.dims = dims
+        self.offsets = offsets
+        self.indices = indices
+        self.cell_count = cell_count
+        self.ind_id = ind_id
+        self.wins = wins
+        self.fitness = fitness
+        self.features = features
+
+    @property
+    def num_features(self):
+        return self.dims.shape[1]
+
+    @property
+    def num_elites(self):
+        """Number of elites in every snapshot."""
+        return np.diff(self.offsets)
+
+    def reduce_per_snapshot(self, values, ufunc=np.add, empty=0):
+        """
+        Reduce a per-cell column (e.g. fitness) within every snapshot.
+        Snapshots without any elite get `empty`.
+        """
+        result = np.full(len(self), empty, dtype=np.float64)
+        nonempty = np.diff(self.offsets) > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(np.asarray(values),
+                                              self.offsets[:-1][nonempty])
+        return result
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("snapshot index out of range")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return Snapshot(
+            dims=self.dims[i],
+            indices=self.indices[start:end],
+            cell_count=self.cell_count[start:end],
+            ind_id=self.ind_id[start:end],
+            wins=self.wins[start:end],
+            fitness=self.fitness[start:end],
+            features=self.features[start:end],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def snapshots(self, step_size=1):
+        """Yield (index, snapshot) of every `step_size`-th snapshot."""
+        for i in range(0, len(self), step_size):
+            yield i, self[i]
+
+    def iter_changes(self):
+        """
+        Yield (keyframe, cells) of every row. Every snapshot of a full log is
+        a keyframe.
+        """
+        for snapshot in self:
+            yield True, snapshot
+
+    def head(self, num_rows):
+        """The first `num_rows` snapshots, without copying the columns."""
+        num_rows = min(num_rows, len(self))
+        end = self.offsets[num_rows]
+        return EliteMapLog(self.dims[:num_rows], self.offsets[:num_rows + 1],
+                           self.indices[:end], self.cell_count[:end],
+                           self.ind_id[:end], self.wins[:end],
+                           self.fitness[:end], self.features[:end])
+
+    def columns(self):
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    @classmethod
+    def from_csv(cls, log_file):
+        all_dims = []
+        all_values = []
+        offsets = [0]
+        for snapshot in iter_elite_map_log(log_file):
+            all_dims.append(snapshot.dims)
+            all_values.append(snapshot)
+            offsets.append(offsets[-1] + len(snapshot.fitness))
+
+        if not all_values:
+            raise ValueError(f"{log_file} does not contain any snapshot.")
+
+        return cls(
+            dims=np.stack(all_dims),
+            offsets=np.asarray(offsets, dtype=np.int64),
+            **{
+                name: np.concatenate([getattr(s, name) for s in all_values])
+                for name in CELL_COLUMNS
+            },
+        )
+
+
+class DeltaMapLog:
+    """
+    All rows of a delta elite map log stored as flat columns.
+
+    Changes of row i are rows offsets[i]:offsets[i+1] of every column in
+    CHANGE_COLUMNS. keyframe[i] tells whether row i lists the whole archive.
+    Indexing returns the Snapshot of the archive rebuilt from the last
+    keyframe, so it only costs the changes logged since that keyframe.
+    """
+    COLUMNS = ["dims", "offsets", "keyframe", *CHANGE_COLUMNS]
+
+    def __init__(self, dims, offsets, keyframe, indices, cell_count, old_id,
+                 ind_id, wins, fitness, features):
+        self.dims = dims
+        self.offsets = offsets
+        self.keyframe = keyframe
+        self.indices = indices
+        self.cell_count = cell_count
+        self.old_id = old_id
+        self.ind_id = ind_id
+        self.wins = wins
+        self.fitness = fitness
+        self.features = features
+
+    @property
+    def num_features(self):
+        return self.dims.shape[1]
+
+    def _changes(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return Changes(*(getattr(self, name)[start:end]
+                         for name in CHANGE_COLUMNS))
+
+    def _cell_keys(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return map(tuple, self.indices[start:end].tolist())
+
+    def replay(self, start=0, end=None):
+        """
+        Yield (index, archive) of every row in [start, end). The same Archive
+        object is updated in place, copy it to keep a row.
+        """
+        end = len(self) if end is None else end
+        keyframes = np.flatnonzero(self.keyframe[:start + 1])
+        first = keyframes[-1] if len(keyframes) else 0
+        archive = None
+        for i in range(first, end):
+            if self.keyframe[i] or archive is None:
+                archive = Archive(self.dims[i])
+            archive.apply(self._changes(i))
+            if i >= start:
+                yield i, archive
+
+    def archive_at(self, i):
+        """The archive after the i-th row of the log."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("snapshot index out of range")
+        for _, archive in self.replay(i, i + 1):
+            return archive
+
+    @property
+    def num_elites(self):
+        """Number of elites in every snapshot."""
+        num_elites = np.empty(len(self), dtype=np.int64)
+        filled = set()
+        for i in range(len(self)):
+            if self.keyframe[i]:
+                filled = set()
+            filled.update(self._cell_keys(i))
+            num_elites[i] = len(filled)
+        return num_elites
+
+    def reduce_per_snapshot(self, values, ufunc=np.add, empty=0):
+        """
+        Reduce a per-change column (e.g. fitness) over the archive of every
+        snapshot. Sums are updated incrementally from the changes, other
+        reductions rebuild the values of the archive at every row.
+        """
+        values = np.asarray(values)
+        result = np.full(len(self), empty, dtype=np.float64)
+        cell_values = {}
+        total = 0.0
+        for i in range(len(self)):
+            if self.keyframe[i]:
+                cell_values = {}
+                total = 0.0
+            start, end = self.offsets[i], self.offsets[i + 1]
+            for key, value in zip(self._cell_keys(i),
+                                  values[start:end].tolist()):
+                total += value - cell_values.get(key, 0.0)
+                cell_values[key] = value
+            if not cell_values:
+                continue
+            if ufunc is np.add:
+                result[i] = total
+            else:
+                result[i] = ufunc.reduce(list(cell_values.values()))
+        return result
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.archive_at(i).snapshot()
+
+    def __iter__(self):
+        for _, archive in self.replay():
+            yield archive.snapshot()
+
+    def snapshots(self, step_size=1):
+        """Yield (index, snapshot) of every `step_size`-th snapshot."""
+        for i, archive in self.replay():
+            if i % step_size == 0:
+                yield i, archive.snapshot()
+
+    def iter_changes(self):
+        """Yield (keyframe, changes) of every row."""
+        for i in range(len(self)):
+            yield bool(self.keyframe[i]), self._changes(i)
+
+    def head(self, num_rows):
+        """The first `num_rows` rows, without copying the columns."""
+        num_rows = min(num_rows, len(self))
+        end = self.offsets[num_rows]
+        return DeltaMapLog(self.dims[:num_rows], self.offsets[:num_rows + 1],
+                           self.keyframe[:num_rows],
+                           **{name: getattr(self, name)[:end]
+                              for name in CHANGE_COLUMNS})
+
+    def columns(self):
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    @classmethod
+    def from_csv(cls, log_file):
+        all_dims = []
+        all_keyframes = []
+        all_changes = []
+        offsets = [0]
+        for line in _iter_lines(log_file):
+            keyframe, dims, values = parse_delta_row(line)
+            all_dims.append(dims)
+            all_keyframes.append(keyframe)
+            all_changes.append(split_changes(values, len(dims)))
+            offsets.append(offsets[-1] + len(values))
+
+        if not all_changes:
+            raise ValueError(f"{log_file} does not contain any snapshot.")
+
+        return cls(
+            dims=np.asarray(all_dims, dtype=np.int32),
+            offsets=np.asarray(offsets, dtype=np.int64),
+            keyframe=np.asarray(all_keyframes, dtype=bool),
+            **{
+                name: np.concatenate([getattr(c, name) for c in all_changes])
+                for name in CHANGE_COLUMNS
+            },
+        )
+
+
+def _cache_dir(log_file):
+    return log_file + CACHE_SUFFIX
+
+
+def _log_signature(log_file, log_class):
+    stat = os.stat(log_file)
+    return {
+        "version": CACHE_VERSION,
+        "format": log_class.__name__,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _read_cache(log_file, log_class):
+    cache_dir = _cache_dir(log_file)
+    meta_file = os.path.join(cache_dir, CACHE_META_FILE)
+    if not os.path.isfile(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        meta = json.load(f)
+    if meta != _log_signature(log_file, log_class):
+        return None
+
+    columns = {
+        name: np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+        for name in log_class.COLUMNS
+    }
+    return log_class(**columns)
+
+
+def _write_cache(log_file, elite_map_log):
+    """
+    Write the columns first and the meta file last, so a cache interrupted
+    half way is never considered valid.
+    """
+    cache_dir = _cache_dir(log_file)
+    signature = _log_signature(log_file, type(elite_map_log))
+    try:
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.mkdir(cache_dir)
+        for name, column in elite_map_log.columns().items():
+            np.save(os.path.join(cache_dir, name + ".npy"), column)
+        tmp_meta_file = os.path.join(cache_dir, CACHE_META_FILE + ".tmp")
+        with open(tmp_meta_file, "w") as f:
+            json.dump(signature, f)
+        os.replace(tmp_meta_file, os.path.join(cache_dir, CACHE_META_FILE))
+    except OSError as e:
+        print(f"Could not write cache of {log_file}: {e}")
+
+
+def load_elite_map_log(log_file, max_rows=None, use_cache=True):
+    """
+    Load all snapshots of an elite map log. Full logs are returned as an
+    EliteMapLog, delta logs as a DeltaMapLog.
+
+    Args:
+        log_file: path to elite_map_log.csv or surrogate_elite_map_log.csv.
+        max_rows: only keep the first `max_rows` snapshots, if specified.
+        use_cache: read/write the columnar cache stored next to the log. The
+            cache is rebuilt whenever the size or mtime of the log changes.
+    """
+    log_class = DeltaMapLog if is_delta_log(log_file) else EliteMapLog
+    elite_map_log = _read_cache(log_file, log_class) if use_cache else None
+    if elite_map_log is None:
+        elite_map_log = log_class.from_csv(log_file)
+        if use_cache:
+            _write_cache(log_file, elite_map_log)
+
+    if max_rows is not None:
+        elite_map_log = elite_map_log.head(max_rows)
+    return elite_map_log
+
+
+def load_last_snapshot(log_file, use_cache=True):
+    """Snapshot of the archive at the end of the search."""
+    return load_elite_map_log(log_file, use_cache=use_cache)[-1]
@@ -1,6 +1,5 @@
 import argparse
 import os
-import csv
 import numpy as np
 import seaborn as sns
 import pandas as pd
@@ -13,6 +12,8 @@ from matplotlib.lines import Line2D
 from pprint import pprint
 from tqdm import tqdm
 from utils import get_label_color, read_in_surr_config
+from elite_map_log import load_elite_map_log
+from archive_metrics import compute_metrics
 from joblib import Parallel, delayed
 
 # turn off runtime warning
@@ -43,67 +44,31 @@ SPLIT_MODE = "split"
 COMBINE_MODE = "combine"
 
 
-def get_fitness_from_cell(cell_data):
-    splitedData = cell_data.split(":")
-    nonFeatureIdx = NUM_FEATURES
-    fitness = float(splitedData[nonFeatureIdx + 3])
-    return fitness
-
-
-def get_win_cnt_from_cell(cell_data):
-    splitedData = cell_data.split(":")
-    nonFeatureIdx = NUM_FEATURES
-    win = int(splitedData[nonFeatureIdx + 2])
-    return win
-
-
 def calculate_stats(log_dir, experiment_config, elite_map_config):
     log_file = os.path.join(log_dir, "elite_map_log.csv")
 
     # read in resolutions of elite map
     total_num_cell = np.power(elite_map_config["Map"]["StartSize"], 2)
 
-    with open(log_file, "r") as csvfile:
-        rowData = list(csv.reader(csvfile, delimiter=','))[1:NUM_EVAL + 1]
-        assert len(rowData) == NUM_EVAL
-        qd_scores = []
-        num_elites = []
-        for mapData in rowData:
-            # get number of elites
-            num_elites.append(len(mapData[1:]))
-
-            # get qd score
-            qd_score = 0
-            max_fitness = -np.inf
-            max_win = -np.inf
-            for cellData in mapData[1:]:
-                fitness = get_fitness_from_cell(cellData)
-                win = get_win_cnt_from_cell(cellData)
-                # normalize fitness to [0, 1]
-                fitness_nor = (fitness - FITNESS_MIN) \
-                            / (FITNESS_MAX - FITNESS_MIN)
-                qd_score += fitness_nor
-                if fitness > max_fitness:
-                    max_fitness = fitness
-                if win > max_win:
-                    max_win = win
-            qd_scores.append(qd_score)
-
-        max_winrate = max_win / NUM_GAME * 100
-        cell_filled = len(rowData[-1]) / total_num_cell * 100
-        last_qd_score = qd_score
-
-        # get ccdf count from the last map
-        curr_last_fitnesses = []
-        for cellData in rowData[-1][1:]:
-            fitness = get_fitness_from_cell(cellData)
-            curr_last_fitnesses.append(fitness)
-
-        percent_elites_ccdf = []
-        curr_last_fitnesses = np.asarray(curr_last_fitnesses)
-        for fitness in range(FITNESS_MIN, FITNESS_MAX + 1):
-            percent_elites_ccdf.append(
-                (curr_last_fitnesses > fitness).sum() / total_num_cell * 100)
+    elite_map_log = load_elite_map_log(log_file, max_rows=NUM_EVAL)
+    assert len(elite_map_log) == NUM_EVAL
+
+    # walk the archive history once, keeping the metrics up to date
+    history = compute_metrics(elite_map_log, FITNESS_MIN, FITNESS_MAX)
+    num_elites = history.num_elites.tolist()
+    qd_scores = history.qd_scores.tolist()
+
+    max_fitness = history.max_fitness[-1]
+    max_win = history.max_wins[-1]
+    max_winrate = max_win / NUM_GAME * 100
+    # the csv row of the map also contains the dimensions of the map
+    cell_filled = (num_elites[-1] + 1) / total_num_cell * 100
+    last_qd_score = qd_scores[-1]
+
+    # get ccdf count from the last map
+    curr_last_fitnesses = history.last.fitnesses()
+    percent_elites_ccdf = (history.last.ccdf() / total_num_cell *
+                           100).tolist()
 
     loss_log_file = os.path.join(log_dir, "surrogate_train_log",
                                  "model_losses.csv")
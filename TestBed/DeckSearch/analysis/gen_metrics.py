@@ -1,21 +1,17 @@
-from itertools import product, combinations
-import pandas as pd
-import seaborn as sns
+from itertools import combinations
 import argparse
 import toml
 import glob
-import csv
-import cv2
 import os
 import shutil
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
-import matplotlib as mpl
-from mpl_toolkits.axes_grid1.axes_divider import make_axes_locatable
 from matplotlib.ticker import MaxNLocator
 from utils import read_in_surr_config, get_label_color
 from plot_loss import plot_loss
+from elite_map_log import load_elite_map_log
+from heatmap import fitness_grid, render_image, write_heatmap_video
 
 matplotlib.use("agg")
 # matplotlib.rcParams.update({'font.size': 12})
@@ -50,7 +46,7 @@ METRICS_DIR = "metrics"
 HEAT_MAP_IMAGE_DIR = "heatmaps"
 QD_SCORE_DIR = "qd_score"
 LOSS_DIR = "surrogate_model_losses"
-COLORMAP = "viridis"  # Colormap for everything.
+COMPARISON_DIR = "comparison"
 NUM_EVAL = 10_000
 
 # max and min value of fitness
@@ -58,6 +54,8 @@ FITNESS_MIN = -30
 FITNESS_MAX = 30
 
 RESOLUTION = None
+N_JOBS = 1  # number of processes rendering the heatmap frames
+SAVE_PNGS = False  # whether to keep every frame of the movies as png
 
 # def read_in_lsi_config(exp_config_file):
 #     experiment_config = toml.load(exp_config_file)
@@ -74,166 +72,61 @@ RESOLUTION = None
 #     return experiment_config, algorithm_config, elite_map_config, None
 
 
-def createRecordList(mapData, mapDims):
-    recordList = []
-    trackRmIndexPairs = {}
-
-    # create custom indexPairs if needed:
-    indexPairs = [(x, y) for x, y in product(range(mapDims[ROW_INDEX]),
-                                             range(mapDims[COL_INDEX]))]
-    for i, cellData in enumerate(mapData):
-        # splite data from csv file
-        splitedData = cellData.split(":")
-        # re-range the bc if needed:
-        indexes = np.array([int(splitedData[i]) for i in range(NUM_FEATURES)])
-
-        cellRow = indexes[ROW_INDEX]
-        cellCol = indexes[COL_INDEX]
-        nonFeatureIdx = NUM_FEATURES
-        cellSize = int(splitedData[nonFeatureIdx])
-        indID = int(splitedData[nonFeatureIdx + 1])
-        winCount = float(splitedData[nonFeatureIdx + 2])
-        fitness = float(splitedData[nonFeatureIdx + 3])
-        f1 = float(splitedData[nonFeatureIdx + 4 + ROW_INDEX])
-        f2 = float(splitedData[nonFeatureIdx + 4 + COL_INDEX])
-
-        data = [cellRow, cellCol, cellSize, indID, winCount, fitness, f1, f2]
-        if (cellRow, cellCol) in indexPairs:
-            indexPairs.remove((cellRow, cellCol))
-            trackRmIndexPairs[str(cellRow) + '_' +
-                              str(cellCol)] = len(recordList)
-            recordList.append(data)
-        else:
-            track_idx = trackRmIndexPairs[str(cellRow) + '_' + str(cellCol)]
-            if data[5] > recordList[track_idx][5]:
-                recordList[track_idx] = data
-
-    # Put in the blank cells
-    for x, y in indexPairs:
-        recordList.append([x, y, 0, 0, np.nan, np.nan, 0, 0])
-
-    return recordList
-
-
-def createRecordMap(dataLabels, recordList):
-    dataDict = {label: [] for label in dataLabels}
-    for recordDatum in recordList:
-        for i in range(len(dataLabels)):
-            dataDict[dataLabels[i]].append(recordDatum[i])
-    return dataDict
-
-
-def createImage(rowData, filename, archive_name, dpi=100):
-    mapDims = tuple(map(int, rowData[0].split('x')))
-    mapData = rowData[1:]
-
-    dataLabels = [
-        'CellRow',
-        'CellCol',
-        'CellSize',
-        'IndividualId',
-        'WinCount',
-        'Fitness',
-        'Feature1',
-        'Feature2',
-    ]
-
-    recordList = createRecordList(mapData, mapDims)
-    dataDict = createRecordMap(dataLabels, recordList)
-
-    recordFrame = pd.DataFrame(dataDict)
-
-    # Write the map for the cell fitness
-    fitnessMap = recordFrame.pivot(index=dataLabels[1],
-                                   columns=dataLabels[0],
-                                   values='Fitness')
-    fitnessMap.sort_index(level=1, ascending=False, inplace=True)
-
-    # make the plot
-    fig, ax = plt.subplots(1, 1, figsize=(8, 8))
-    ax_divider = make_axes_locatable(ax)
-    cbar_ax = ax_divider.append_axes("right", size="7%", pad="10%")
-    sns.set(font_scale=1.8, style="ticks")
-    sns.set_style("white", {'font.family': 'serif', 'font.serif': 'Palatino'})
-    sns.heatmap(
-        fitnessMap,
-        annot=False,
-        cmap=COLORMAP,
-        fmt=".0f",
-        square=True,
-        ax=ax,
-        vmin=FITNESS_MIN,
-        vmax=FITNESS_MAX,
-        cbar_ax=cbar_ax,
-        # linewidths=0.003,
-        rasterized=False,
-        annot_kws={"size": 30},
-    )
-
-    # ax.set(title=IMAGE_TITLE)
-    ax.set_title(IMAGE_TITLE, fontdict={'fontsize': 25}, y=1.04)
-    # fig.suptitle(IMAGE_TITLE, fontsize=30)
-    # ax.tick_params(labelsize=20)
-    ax.set_xlabel(FEATURE1_LABEL, fontsize=40)
-    ax.set_ylabel(FEATURE2_LABEL, fontsize=40)
-
-    # ax.set_xticks(
-    #     [0, RESOLUTION / 4, RESOLUTION / 2, RESOLUTION * 3 / 4, RESOLUTION])
-    # ax.set_xticklabels([5, 7.5, 10, 12.5, 15], rotation=0)
-
-    ax.set_xticks(
-        [0, RESOLUTION / 2, RESOLUTION])
-    ax.set_xticklabels([5, 10, 15], rotation=0, fontsize="x-large")
-
-    ax.set_yticks([0, RESOLUTION / 2, RESOLUTION])
-    ax.set_yticklabels([1, 4, 7][::-1], fontsize="x-large")
-
-    set_spines_visible(ax)
-    ax.figure.tight_layout()
-
-    fig.savefig(filename, dpi=dpi)
-    plt.close('all')
-
-
-def createImages(stepSize, rows, filenameTemplate, archive_name):
-    for endInterval in range(0, len(rows), stepSize):
-        print('Generating : {}'.format(endInterval))
-        filename = filenameTemplate.format(endInterval)
-        createImage(rows[endInterval], filename, archive_name)
-
-
-def createMovie(folderPath, filename):
-    globStr = os.path.join(folderPath, '*.png')
-    imageFiles = sorted(glob.glob(globStr))
-
-    # Grab the dimensions of the image
-    img = cv2.imread(imageFiles[0])
-    imageDims = img.shape[:2][::-1]
-
-    # Create a video
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    frameRate = 30
-    video = cv2.VideoWriter(os.path.join(folderPath, filename), fourcc,
-                            frameRate, imageDims)
-
-    for imgFilename in imageFiles:
-        img = cv2.imread(imgFilename)
-        video.write(img)
-
-    video.release()
-
-
-def plot_qd_score(rowData, savePath, archive_name):
-    map_fitnesses = []
-    for mapData in rowData:
-        map_fitness = 0
-        for cellData in mapData[1:]:
-            splitedData = cellData.split(":")
-            nonFeatureIdx = NUM_FEATURES
-            fitness = float(splitedData[nonFeatureIdx + 3])
-            map_fitness += (fitness - FITNESS_MIN) \
-                         / (FITNESS_MAX - FITNESS_MIN)
-        map_fitnesses.append(map_fitness)
+def heatmapStyle():
+    return {
+        "title": IMAGE_TITLE,
+        "xlabel": FEATURE1_LABEL,
+        "ylabel": FEATURE2_LABEL,
+        "resolution": RESOLUTION,
+    }
+
+
+def createImage(snapshot, filename, archive_name, dpi=100):
+    grid = fitness_grid(snapshot, ROW_INDEX, COL_INDEX)
+    render_image(grid, filename, heatmapStyle(), dpi=dpi)
+
+
+def createMovie(stepSize, rows, folderPath, filename, savePngs=False):
+    frames = ((endInterval, [fitness_grid(snapshot, ROW_INDEX, COL_INDEX)])
+              for endInterval, snapshot in rows.snapshots(stepSize))
+    pngTemplate = os.path.join(folderPath,
+                               'grid_{:05d}.png') if savePngs else None
+    write_heatmap_video(frames, [heatmapStyle()],
+                        os.path.join(folderPath, filename),
+                        n_jobs=N_JOBS,
+                        png_template=pngTemplate)
+
+
+def createComparisonMovie(log_dirs, stepSize, folderPath):
+    """
+    Movie of the elite archives of several experiments side by side, one
+    panel per log dir.
+    """
+    styles = []
+    logs = []
+    for log_dir in log_dirs:
+        experiment_config, _ = read_in_surr_config(log_dir)
+        title, _ = get_label_color(experiment_config)
+        styles.append({**heatmapStyle(), "title": title})
+        logs.append(
+            load_elite_map_log(os.path.join(log_dir, "elite_map_log.csv"),
+                               max_rows=NUM_EVAL))
+
+    frames = ((panels[0][0], [
+        fitness_grid(snapshot, ROW_INDEX, COL_INDEX)
+        for _, snapshot in panels
+    ]) for panels in zip(*(log.snapshots(stepSize) for log in logs)))
+    titles = [style["title"] for style in styles]
+    movieFilename = f"heatmap_{'_vs_'.join(titles)}.avi"
+    write_heatmap_video(frames, styles,
+                        os.path.join(folderPath, movieFilename),
+                        n_jobs=N_JOBS)
+
+
+def plot_qd_score(elite_map_log, savePath, archive_name):
+    map_fitnesses = elite_map_log.reduce_per_snapshot(
+        (np.asarray(elite_map_log.fitness) - FITNESS_MIN) \
+        / (FITNESS_MAX - FITNESS_MIN))
 
     fig, ax = plt.subplots(figsize=(8, 6))
     ax.plot(map_fitnesses)
@@ -287,33 +180,31 @@ def generateAll(elite_map_logs, loss_log_file):
             raise ValueError("Invalid archive name")
 
         print("Plotting", archive_name)
-        with open(elite_map_log, 'r') as csvfile:
-            # create directory
-            curr_archive_dir = os.path.join(tmpMetricsFolder, archive_name)
-            curr_heatmap_dir = os.path.join(curr_archive_dir, "heatmap")
-            curr_qd_dir = os.path.join(curr_archive_dir, "qd_score")
-            os.mkdir(curr_archive_dir)
-            os.mkdir(curr_heatmap_dir)
-            os.mkdir(curr_qd_dir)
-
-            # # Read all the data from the csv file
-            rowData = list(csv.reader(csvfile, delimiter=','))[1:NUM_EVAL + 1]
-
-            # generate the movie
-            template = os.path.join(curr_heatmap_dir, 'grid_{:05d}.png')
-            createImages(step_size, rowData, template, archive_name)
-            movieFilename = f"heatmap_{IMAGE_TITLE}.avi"
-            createMovie(curr_heatmap_dir, movieFilename)
-
-            # Create the final image we need
-            imageFilename = f"heatmap_{IMAGE_TITLE}.pdf"
-            createImage(rowData[-1],
-                        os.path.join(curr_heatmap_dir, imageFilename),
-                        archive_name, dpi=1200)
-
-            # plot QD score
-            plot_qd_score(rowData, os.path.join(curr_qd_dir, "qd-score.pdf"),
-                          archive_name)
+        # create directory
+        curr_archive_dir = os.path.join(tmpMetricsFolder, archive_name)
+        curr_heatmap_dir = os.path.join(curr_archive_dir, "heatmap")
+        curr_qd_dir = os.path.join(curr_archive_dir, "qd_score")
+        os.mkdir(curr_archive_dir)
+        os.mkdir(curr_heatmap_dir)
+        os.mkdir(curr_qd_dir)
+
+        # Read all the snapshots from the log
+        rowData = load_elite_map_log(elite_map_log, max_rows=NUM_EVAL)
+
+        # generate the movie
+        movieFilename = f"heatmap_{IMAGE_TITLE}.avi"
+        createMovie(step_size, rowData, curr_heatmap_dir, movieFilename,
+                    savePngs=SAVE_PNGS)
+
+        # Create the final image we need
+        imageFilename = f"heatmap_{IMAGE_TITLE}.pdf"
+        createImage(rowData[-1],
+                    os.path.join(curr_heatmap_dir, imageFilename),
+                    archive_name, dpi=1200)
+
+        # plot QD score
+        plot_qd_score(rowData, os.path.join(curr_qd_dir, "qd-score.pdf"),
+                      archive_name)
 
 
 def clearDir(dirToClear):
@@ -323,11 +214,6 @@ def clearDir(dirToClear):
         os.remove(curFile)
 
 
-def set_spines_visible(ax: mpl.axis.Axis):
-    for pos in ["top", "right", "bottom", "left"]:
-        ax.spines[pos].set_visible(True)
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-l',
@@ -349,6 +235,23 @@ if __name__ == "__main__":
                         help='step size of the animation to generate',
                         required=False,
                         default=1)
+    parser.add_argument('-j',
+                        '--n_jobs',
+                        help='number of processes rendering the heatmaps, '
+                        '-1 to use all cores',
+                        required=False,
+                        default=1)
+    parser.add_argument('-p',
+                        '--save_png',
+                        help='also write every frame of the movies as png',
+                        action='store_true')
+    parser.add_argument('-c',
+                        '--compare_log_dirs',
+                        help='only generate a movie of the elite archive of '
+                        'log_dir side by side with those of these log dirs',
+                        nargs='+',
+                        required=False,
+                        default=None)
     opt = parser.parse_args()
 
     # read in the name of the algorithm and features to plot
@@ -358,15 +261,21 @@ if __name__ == "__main__":
 
     # read in parameters
     NUM_FEATURES = len(features)
+    N_JOBS = int(opt.n_jobs)
+    SAVE_PNGS = opt.save_png
     RESOLUTION = elite_map_config["Map"]["StartSize"]
 
     # Clear out the previous images
     tmpMetricsFolder = os.path.join(opt.log_dir, METRICS_DIR)
     tmpLossFolder = os.path.join(tmpMetricsFolder, LOSS_DIR)
-    if os.path.isdir(tmpMetricsFolder):
-        shutil.rmtree(tmpMetricsFolder, ignore_errors=True)
-    os.mkdir(tmpMetricsFolder)
-    os.mkdir(tmpLossFolder)
+    tmpComparisonFolder = os.path.join(tmpMetricsFolder, COMPARISON_DIR)
+    if opt.compare_log_dirs is not None:
+        os.makedirs(tmpComparisonFolder, exist_ok=True)
+    else:
+        if os.path.isdir(tmpMetricsFolder):
+            shutil.rmtree(tmpMetricsFolder, ignore_errors=True)
+        os.mkdir(tmpMetricsFolder)
+        os.mkdir(tmpLossFolder)
 
     for ROW_INDEX, COL_INDEX in combinations(range(NUM_FEATURES), 2):
         STEP_SIZE = int(opt.step_size)
@@ -403,4 +312,8 @@ if __name__ == "__main__":
 
         FEATURE1_LABEL = feature_name2label[features[ROW_INDEX]['Name']]
         FEATURE2_LABEL = feature_name2label[features[COL_INDEX]['Name']]
-        generateAll(ELITE_MAP_LOG_FILE_NAMES, loss_log_file)
+        if opt.compare_log_dirs is not None:
+            createComparisonMovie([opt.log_dir] + opt.compare_log_dirs,
+                                  STEP_SIZE, tmpComparisonFolder)
+        else:
+            generateAll(ELITE_MAP_LOG_FILE_NAMES, loss_log_file)
@@ -4,63 +4,66 @@ Find testing deck set for inversion counting.
 import os
 import json
 import numpy as np
-import pandas as pd
 from pprint import pprint
 from utils import read_in_paladin_card_index, read_in_rogue_card_index
+from elite_map_log import load_last_snapshot
+from individual_log import load_individual_log
 
 # card_index, card_name = read_in_paladin_card_index()
 card_index, card_name = read_in_rogue_card_index()
 
 
-def deck_str2encode(deck_str):
-    card_names = deck_str.split("*")
-    deck_encode = np.zeros(len(card_index), dtype=np.int32)
-    for card in card_names:
-        deck_encode[card_index[card]] += 1
-    return "".join([str(digit) for digit in deck_encode.tolist()])
+def deck_encode2str(deck_encode):
+    """Digit string of a deck encoding, e.g. "0102..." with one digit per card."""
+    return (deck_encode + ord("0")).astype(np.uint8).tobytes().decode()
+
+
+def deck_encode_keys(deck_encodes):
+    """
+    Hashable key of every row of a (num_decks, num_cards) uint8 deck encoding
+    matrix, namely the raw bytes of the row.
+    """
+    deck_encodes = np.ascontiguousarray(deck_encodes, dtype=np.uint8)
+    rows = deck_encodes.view(np.dtype((np.void, deck_encodes.shape[1])))
+    return rows.ravel().tolist()
 
 
 def get_inds(log_dirs):
+    """
+    Deck encodings of all individuals of the experiments as a
+    (num_individuals, num_cards) uint8 matrix, and their (log_dir, ID).
+    """
     inds = []
     ind_ids = []
     for log_dir in log_dirs:
-        inds_csv = os.path.join(log_dir, "individual_log.csv")
-        inds_pd = pd.read_csv(inds_csv)
-        all_inds = inds_pd["Deck"].tolist()
-        inds_id = inds_pd["Individual"].tolist()
-        for deck_str in all_inds:
-            deck_encode = deck_str2encode(deck_str)
-            inds.append(deck_encode)
+        individuals = load_individual_log(log_dir, card_index)
+        inds.append(np.asarray(individuals.decks))
+        ind_ids.extend((log_dir, ind_id) for ind_id in individuals.ids.tolist())
 
-        for ind_id in inds_id:
-            ind_ids.append((log_dir, ind_id))
-
-    return inds, ind_ids
+    return np.concatenate(inds), ind_ids
 
 
 def get_elites(log_dirs):
+    """
+    Deck encodings of the elites of the last archive of the experiments as a
+    (num_elites, num_cards) uint8 matrix, their (log_dir, ID) and fitnesses.
+    """
     elites = []
     elite_ids = []
     elite_fitnesses = []
     for log_dir in log_dirs:
-        inds_csv = os.path.join(log_dir, "individual_log.csv")
-        inds_pd = pd.read_csv(inds_csv)
+        individuals = load_individual_log(log_dir, card_index)
         archive_path = os.path.join(log_dir, "elite_map_log.csv")
-        with open(archive_path) as f:
-            archive = f.readlines()
-        elites_cells = archive[-1].strip().split(",")[1:]
-        for cell_data in elites_cells:
-            elite_id = int(cell_data.split(":")[3])
-            ind = inds_pd[inds_pd["Individual"] == elite_id].iloc[0]
-            deck_str = ind["Deck"]
-            elite_fitness = float(ind["AverageHealthDifference"])
-
-            # add to result
-            elite_ids.append((log_dir, elite_id))
-            elites.append(deck_str2encode(deck_str))
-            elite_fitnesses.append(elite_fitness)
+        last_map = load_last_snapshot(archive_path)
+        ids = last_map.ind_id.tolist()
+        rows = individuals.rows_of(ids)
+        elites.append(individuals.decks[rows])
+        elite_ids.extend((log_dir, elite_id) for elite_id in ids)
+        elite_fitnesses.extend(
+            individuals.columns["AverageHealthDifference"][rows].astype(
+                float).tolist())
 
-    return elites, elite_ids, elite_fitnesses
+    return np.concatenate(elites), elite_ids, elite_fitnesses
 
 
 if __name__ == '__main__':
@@ -73,6 +76,7 @@ if __name__ == '__main__':
     ]
 
     training_inds, _ = get_inds(log_dirs_training)
+    training_keys = set(deck_encode_keys(training_inds))
 
     # Find elites from specified experiments that are not a part of
     # training elites
@@ -88,11 +92,12 @@ if __name__ == '__main__':
         get_elites(exps_to_find)
 
     testing_elites = []
-    for candidate_elite, candidate_elite_id, candidate_fitness in zip(
-            candidate_elites, candidate_elite_ids, candidate_fitnesses):
-        if candidate_elite not in training_inds:
-            testing_elites.append(
-                (candidate_elite, *candidate_elite_id, candidate_fitness))
+    for candidate_elite, candidate_key, candidate_elite_id, candidate_fitness \
+            in zip(candidate_elites, deck_encode_keys(candidate_elites),
+                   candidate_elite_ids, candidate_fitnesses):
+        if candidate_key not in training_keys:
+            testing_elites.append((deck_encode2str(candidate_elite),
+                                   *candidate_elite_id, candidate_fitness))
 
     with open("analysis/testing_decks_rogue.json", "w") as f:
         json.dump(testing_elites, f)
\ No newline at end of file
@@ -1,12 +1,12 @@
 import argparse
 import os
-import csv
 import numpy as np
 import scipy.stats as st
 import matplotlib.pyplot as plt
 import warnings
 import dataclasses
 from utils import read_in_surr_config
+from elite_map_log import load_last_snapshot
 
 # turn off runtime warning
 warnings.filterwarnings("ignore", category=RuntimeWarning)
@@ -35,12 +35,11 @@ class Individual:
 
 def read_in_elites(archive):
     elites = []
-    for cell_data in archive:
-        splited_data = cell_data.split(":")
+    for i in range(len(archive.ind_id)):
         ind = Individual()
-        ind.f1_idx = int(splited_data[0])
-        ind.f2_idx = int(splited_data[1])
-        ind.ID = int(splited_data[3])
+        ind.f1_idx = int(archive.indices[i, 0])
+        ind.f2_idx = int(archive.indices[i, 1])
+        ind.ID = int(archive.ind_id[i])
         elites.append(ind)
     return elites
 
@@ -73,10 +72,8 @@ if __name__ == "__main__":
                                             "surrogate_elite_map_log.csv")
         solution_archive_path = os.path.join(log_dir, "elite_map_log.csv")
 
-        with open(surrogate_archive_path, "r") as f:
-            surrogate_archive = list(csv.reader(f, delimiter=','))[-1][1:]
-        with open(solution_archive_path, "r") as f:
-            solution_archive = list(csv.reader(f, delimiter=','))[-1][1:]
+        surrogate_archive = load_last_snapshot(surrogate_archive_path)
+        solution_archive = load_last_snapshot(solution_archive_path)
 
         surr_elites = read_in_elites(surrogate_archive)
         sol_elites = read_in_elites(solution_archive)
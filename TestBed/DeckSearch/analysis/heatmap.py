@@ -0,0 +1,225 @@
+"""
+Heatmap rendering of elite map snapshots for gen_metrics.
+
+The figure, axes and colorbar are created once per map shape and every frame
+only replaces the colors of the persistent pcolormesh, which is what
+seaborn.heatmap draws as well. Animation frames are rendered by a pool of
+worker processes, each holding its own figures, and their canvas buffers are
+streamed in order straight into a cv2.VideoWriter. Frames of several archives
+can be placed side by side to compare algorithms in a single video.
+"""
+import multiprocessing
+import cv2
+import numpy as np
+import matplotlib
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import seaborn as sns
+from mpl_toolkits.axes_grid1.axes_divider import make_axes_locatable
+
+matplotlib.use("agg")
+
+# set matplotlib params
+plt.rcParams.update({
+    "pdf.fonttype": 42,
+    "ps.fonttype": 42,
+    "font.family": "serif",
+    "font.serif": ["Palatino"],
+    "axes.unicode_minus": False,
+})
+
+COLORMAP = "viridis"  # Colormap for everything.
+
+# max and min value of fitness
+FITNESS_MIN = -30
+FITNESS_MAX = 30
+
+FRAME_RATE = 30
+FOURCC = "XVID"
+
+# number of frames handed to a worker at once
+CHUNK_SIZE = 4
+
+
+def fitness_grid(snapshot, row_index, col_index):
+    """
+    Fitness of the cells of a snapshot projected on two features, laid out
+    like the seaborn heatmap: feature `row_index` on the x axis and feature
+    `col_index` on the y axis with the largest index at the top. Empty cells
+    are NaN and cells sharing a position keep the best fitness.
+    """
+    num_cols, num_rows = snapshot.dims[row_index], snapshot.dims[col_index]
+    grid = np.full((num_rows, num_cols), np.nan)
+    np.fmax.at(grid, (num_rows - 1 - snapshot.indices[:, col_index],
+                      snapshot.indices[:, row_index]), snapshot.fitness)
+    return grid
+
+
+def set_spines_visible(ax: mpl.axis.Axis):
+    for pos in ["top", "right", "bottom", "left"]:
+        ax.spines[pos].set_visible(True)
+
+
+class HeatmapRenderer:
+    """Heatmap figure whose cell colors are replaced for every frame."""
+    def __init__(self, shape, title, xlabel, ylabel, resolution):
+        num_rows, num_cols = shape
+
+        sns.set(font_scale=1.8, style="ticks")
+        sns.set_style("white", {
+            'font.family': 'serif',
+            'font.serif': 'Palatino'
+        })
+        self.fig, ax = plt.subplots(1, 1, figsize=(8, 8))
+        ax_divider = make_axes_locatable(ax)
+        cbar_ax = ax_divider.append_axes("right", size="7%", pad="10%")
+
+        self.mesh = ax.pcolormesh(np.arange(num_cols + 1),
+                                  np.arange(num_rows + 1),
+                                  np.ma.masked_all(shape),
+                                  cmap=COLORMAP,
+                                  vmin=FITNESS_MIN,
+                                  vmax=FITNESS_MAX)
+        cbar = self.fig.colorbar(self.mesh, cax=cbar_ax)
+        cbar.outline.set_linewidth(0)
+
+        ax.set(xlim=(0, num_cols), ylim=(num_rows, 0))
+        ax.set_aspect("equal")
+
+        ax.set_title(title, fontdict={'fontsize': 25}, y=1.04)
+        ax.set_xlabel(xlabel, fontsize=40)
+        ax.set_ylabel(ylabel, fontsize=40)
+
+        ax.set_xticks([0, resolution / 2, resolution])
+        ax.set_xticklabels([5, 10, 15], rotation=0, fontsize="x-large")
+
+        ax.set_yticks([0, resolution / 2, resolution])
+        ax.set_yticklabels([1, 4, 7][::-1], fontsize="x-large")
+
+        set_spines_visible(ax)
+        self.fig.tight_layout()
+
+    def update(self, grid):
+        self.mesh.set_array(np.ma.masked_invalid(grid).ravel())
+
+    def save(self, filename, dpi=100):
+        self.fig.savefig(filename, dpi=dpi)
+
+    def to_bgr(self):
+        """Draw the figure and return its canvas as a BGR image for cv2."""
+        self.fig.canvas.draw()
+        rgba = np.asarray(self.fig.canvas.buffer_rgba())
+        return np.ascontiguousarray(rgba[:, :, 2::-1])
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def render_image(grid, filename, style, dpi=100):
+    renderer = HeatmapRenderer(grid.shape, **style)
+    renderer.update(grid)
+    renderer.save(filename, dpi=dpi)
+    renderer.close()
+
+
+# Styles of the panels and renderers of the current process, set up by
+# _init_worker in every process of the pool.
+_styles = None
+_renderers = {}
+
+
+def _init_worker(styles):
+    global _styles
+    _styles = styles
+    _close_renderers()
+
+
+def _close_renderers():
+    for renderer in _renderers.values():
+        renderer.close()
+    _renderers.clear()
+
+
+def _render_frame(task):
+    """Render the panels of a frame next to each other."""
+    png_file, grids = task
+    panels = []
+    for panel, grid in enumerate(grids):
+        key = (panel, grid.shape)
+        if key not in _renderers:
+            _renderers[key] = HeatmapRenderer(grid.shape, **_styles[panel])
+        _renderers[key].update(grid)
+        panels.append(_renderers[key].to_bgr())
+    image = np.hstack(panels) if len(panels) > 1 else panels[0]
+    if png_file is not None:
+        cv2.imwrite(png_file, image)
+    return image
+
+
+def _same_grids(grids, other_grids):
+    return other_grids is not None and len(grids) == len(other_grids) and \
+        all(g.shape == o.shape and np.array_equal(g, o, equal_nan=True)
+            for g, o in zip(grids, other_grids))
+
+
+def write_heatmap_video(frames, styles, video_file, n_jobs=1,
+                        png_template=None):
+    """
+    Render an animation of heatmaps directly into a video.
+
+    Args:
+        frames: iterable of (frame index, grids), with one grid per panel.
+        styles: keyword arguments of HeatmapRenderer (except the shape) of
+            every panel.
+        video_file: path of the video to write.
+        n_jobs: number of rendering processes, -1 to use all cores.
+        png_template: if given, every frame is also written to
+            png_template.format(frame index).
+
+    A frame whose grids are identical to those of the previous frame is not
+    rendered again, the previous image is written to the video instead.
+    """
+    # group consecutive identical frames
+    groups = []
+    for i, grids in frames:
+        if groups and _same_grids(grids, groups[-1][1]):
+            groups[-1][2].append(i)
+        else:
+            groups.append((i, grids, [i]))
+    tasks = ((None if png_template is None else png_template.format(i),
+              grids) for i, grids, _ in groups)
+
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+    pool = None
+    if n_jobs > 1 and len(groups) > 1:
+        pool = multiprocessing.Pool(n_jobs, _init_worker, (styles, ))
+        images = pool.imap(_render_frame, tasks, chunksize=CHUNK_SIZE)
+    else:
+        _init_worker(styles)
+        images = map(_render_frame, tasks)
+
+    video = None
+    try:
+        for (_, _, indices), image in zip(groups, images):
+            if video is None:
+                height, width = image.shape[:2]
+                video = cv2.VideoWriter(video_file,
+                                        cv2.VideoWriter_fourcc(*FOURCC),
+                                        FRAME_RATE, (width, height))
+            for i in indices:
+                video.write(image)
+                if png_template is not None and i != indices[0]:
+                    cv2.imwrite(png_template.format(i), image)
+    finally:
+        if video is not None:
+            video.release()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        else:
+            _close_renderers()
+
+    num_frames = sum(len(indices) for _, _, indices in groups)
+    print(f"Rendered {len(groups)} frames, "
+          f"{num_frames - len(groups)} unchanged frames reused")
@@ -0,0 +1,235 @@
+"""
+Indexed reader of individual_log.csv written by
+DeckSearch/src/Logging/RunningIndividualLog.cs.
+
+The log is parsed once and indexed by the Individual column, so looking up an
+individual is a hash lookup instead of a scan over the whole table. Decks
+are kept as a (num_individuals, num_cards) uint8 matrix of card counts
+following the card index, instead of "*" joined card names.
+
+Like the elite map logs, a cache (one .npy file per column, plus the deck
+matrix) is written next to the log and memory-mapped on later runs.
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache"
+CACHE_META_FILE = "meta.json"
+IND_LOG_FILE = "individual_log.csv"
+ID_COLUMN = "Individual"
+DECK_COLUMN = "Deck"
+
+
+def encode_decks(decks, card_index):
+    """
+    Encode "*" joined decks into a (num_decks, num_cards) uint8 matrix of
+    card counts in a single pass over all card names.
+    """
+    decks = list(decks)
+    num_cards = len(card_index)
+    lengths = np.fromiter((deck.count("*") + 1 for deck in decks),
+                          dtype=np.int64,
+                          count=len(decks))
+    codes, names = pd.factorize(pd.Series("*".join(decks).split("*")))
+    name_index = np.array([card_index[name] for name in names],
+                          dtype=np.int64)
+    rows = np.repeat(np.arange(len(decks), dtype=np.int64), lengths)
+    flat_index = rows * num_cards + name_index[codes]
+    counts = np.bincount(flat_index, minlength=len(decks) * num_cards)
+    return counts.reshape(len(decks), num_cards).astype(np.uint8)
+
+
+class IndividualLog:
+    """
+    Columns of individual_log.csv indexed by individual ID.
+
+    Args:
+        ids: the Individual column, without duplicates.
+        columns: dict of column name -> array of every other column except
+            the deck.
+        decks: (num_individuals, num_cards) card counts, None if the log has
+            no deck or no card index was given.
+        card_index: dict of card name -> column of `decks`.
+    """
+    def __init__(self, ids, columns, decks=None, card_index=None):
+        self.ids = ids
+        self.columns = columns
+        self.decks = decks
+        self.card_index = card_index
+        self._index = pd.Index(ids)
+        self.card_name = None
+        if card_index is not None:
+            self.card_name = {idx: name for name, idx in card_index.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, ind_id):
+        return ind_id in self._index
+
+    def row_of(self, ind_id):
+        """Row of an individual, raises KeyError if it is not logged."""
+        return self._index.get_loc(ind_id)
+
+    def rows_of(self, ind_ids):
+        rows = self._index.get_indexer(ind_ids)
+        if (rows < 0).any():
+            missing = np.asarray(ind_ids)[rows < 0]
+            raise KeyError(f"Individuals {missing.tolist()} are not logged.")
+        return rows
+
+    def get(self, ind_id, column):
+        """Value of `column` of an individual."""
+        return self.columns[column][self.row_of(ind_id)]
+
+    def row(self, ind_id):
+        """All columns (except the deck) of an individual as a Series."""
+        row = self.row_of(ind_id)
+        return pd.Series({name: col[row] for name, col in self.columns.items()})
+
+    def deck_counts(self, ind_ids):
+        """Card counts of one individual, or of a list of individuals."""
+        if self.decks is None:
+            raise ValueError("Decks were not loaded, pass a card index.")
+        if np.ndim(ind_ids) == 0:
+            return self.decks[self.row_of(ind_ids)]
+        return self.decks[self.rows_of(ind_ids)]
+
+    def deck(self, ind_id):
+        """List of the card names of the deck of an individual."""
+        counts = self.deck_counts(ind_id)
+        return [
+            self.card_name[idx] for idx in np.flatnonzero(counts)
+            for _ in range(counts[idx])
+        ]
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.columns)
+        frame.insert(0, ID_COLUMN, self.ids)
+        return frame
+
+    @classmethod
+    def from_csv(cls, log_file, card_index=None):
+        """
+        An individual redispatched from an overtime worker may be logged
+        twice, only its first row is kept.
+        """
+        frame = pd.read_csv(log_file)
+        duplicated = pd.Index(frame[ID_COLUMN]).duplicated(keep="first")
+        if duplicated.any():
+            print(f"Ignoring {duplicated.sum()} rows of {log_file} "
+                  "with an individual logged before.")
+            frame = frame[~duplicated].reset_index(drop=True)
+        decks = None
+        if DECK_COLUMN in frame.columns:
+            if card_index is not None:
+                decks = encode_decks(frame[DECK_COLUMN], card_index)
+            frame = frame.drop(columns=DECK_COLUMN)
+        ids = frame[ID_COLUMN].to_numpy()
+        columns = {
+            name: _to_array(frame[name])
+            for name in frame.columns if name != ID_COLUMN
+        }
+        return cls(ids, columns, decks, card_index)
+
+
+def _to_array(series):
+    array = series.to_numpy()
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
+
+
+def _cache_dir(log_file):
+    return log_file + CACHE_SUFFIX
+
+
+def _log_signature(log_file):
+    stat = os.stat(log_file)
+    return {
+        "version": CACHE_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _read_cache(log_file, card_index):
+    cache_dir = _cache_dir(log_file)
+    meta_file = os.path.join(cache_dir, CACHE_META_FILE)
+    if not os.path.isfile(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        meta = json.load(f)
+    if meta["signature"] != _log_signature(log_file):
+        return None
+    # decks encoded with another card index can not be reused, while a
+    # cache with decks serves callers that do not need them as well
+    if card_index is not None and meta["card_index"] != card_index:
+        return None
+
+    def load(name):
+        return np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+
+    ids = np.asarray(load("ids"))
+    columns = {
+        name: load(f"col{i}")
+        for i, name in enumerate(meta["columns"])
+    }
+    decks = None
+    if card_index is not None and meta["has_decks"]:
+        decks = load("decks")
+    return IndividualLog(ids, columns, decks, card_index)
+
+
+def _write_cache(log_file, individual_log, card_index):
+    """
+    Write the columns first and the meta file last, so a cache interrupted
+    half way is never considered valid.
+    """
+    cache_dir = _cache_dir(log_file)
+    meta = {
+        "signature": _log_signature(log_file),
+        "card_index": card_index,
+        "columns": list(individual_log.columns.keys()),
+        "has_decks": individual_log.decks is not None,
+    }
+    try:
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.mkdir(cache_dir)
+        np.save(os.path.join(cache_dir, "ids.npy"), individual_log.ids)
+        for i, column in enumerate(individual_log.columns.values()):
+            np.save(os.path.join(cache_dir, f"col{i}.npy"), column)
+        if individual_log.decks is not None:
+            np.save(os.path.join(cache_dir, "decks.npy"), individual_log.decks)
+        tmp_meta_file = os.path.join(cache_dir, CACHE_META_FILE + ".tmp")
+        with open(tmp_meta_file, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta_file, os.path.join(cache_dir, CACHE_META_FILE))
+    except OSError as e:
+        print(f"Could not write cache of {log_file}: {e}")
+
+
+def load_individual_log(log_dir, card_index=None, use_cache=True):
+    """
+    Load the individual log of an experiment.
+
+    Args:
+        log_dir: experiment log directory containing individual_log.csv.
+        card_index: dict of card name -> index used to encode the decks. The
+            decks are not loaded if None.
+        use_cache: read/write the cache stored next to the log. The cache is
+            rebuilt whenever the log changes or the decks are needed with
+            another card index.
+    """
+    log_file = os.path.join(log_dir, IND_LOG_FILE)
+    individual_log = _read_cache(log_file, card_index) if use_cache else None
+    if individual_log is None:
+        individual_log = IndividualLog.from_csv(log_file, card_index)
+        if use_cache:
+            _write_cache(log_file, individual_log, card_index)
+    return individual_log
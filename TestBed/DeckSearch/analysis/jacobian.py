@@ -5,10 +5,9 @@ import json
 import toml
 import copy
 import argparse
-import tensorflow as tf
 import pandas as pd
 import numpy as np
-from surrogate_model import FCNN, LinearModel
+from numpy_surrogate import SurrogateMLP
 from tqdm import tqdm
 from pprint import pprint
 from utils import read_in_paladin_card_index, read_in_rogue_card_index
@@ -36,49 +35,119 @@ def get_vec_encoding(deck):
     return x.reshape((1, -1))
 
 
-def build_model(log_dir, surrogate_log_dir="surrogate_train_log"):
-    # read in model
+def get_vec_encodings(decks):
+    """Encode a list of decks into a (num_decks, num_cards) array."""
+    x = np.zeros((len(decks), len(card_index)))
+    for i, deck in enumerate(decks):
+        for card in deck:
+            x[i, card_index[card]] += 1
+    return x
+
+
+def get_model_type(log_dir, surrogate_log_dir="surrogate_train_log"):
+    """Type of the surrogate model of the experiment in `log_dir`."""
     exp_config = toml.load(os.path.join(log_dir, "experiment_config.tml"))
-    model = None
     if exp_config["Search"]["Category"] == "Surrogated":
         model_type = exp_config["Surrogate"]["Type"]
-        if model_type == "FullyConnectedNN":
-            model = FCNN()
-        elif model_type == "LinearModel":
-            model = LinearModel()
-        else:
+        if model_type not in ["FullyConnectedNN", "LinearModel"]:
             raise ValueError("Unsupported model type.")
-            exit(1)
-    else:
-        fcnn_path = os.path.join(log_dir, "surrogate_train_log_FCNN")
-        linear_path = os.path.join(log_dir, "surrogate_train_log_Linear")
-        if os.path.isdir(fcnn_path) and \
-            surrogate_log_dir == "surrogate_train_log_FCNN":
-            model = FCNN()
-        elif os.path.isdir(linear_path) and \
-            surrogate_log_dir == "surrogate_train_log_Linear":
-            model = LinearModel()
-        else:
-            raise ValueError("Not DSA-ME or no existing model.")
-            exit(1)
-    return model
+        return model_type
+
+    fcnn_path = os.path.join(log_dir, "surrogate_train_log_FCNN")
+    linear_path = os.path.join(log_dir, "surrogate_train_log_Linear")
+    if os.path.isdir(fcnn_path) and \
+        surrogate_log_dir == "surrogate_train_log_FCNN":
+        return "FullyConnectedNN"
+    elif os.path.isdir(linear_path) and \
+        surrogate_log_dir == "surrogate_train_log_Linear":
+        return "LinearModel"
+    raise ValueError("Not DSA-ME or no existing model.")
+
+
+def build_model(log_dir, surrogate_log_dir="surrogate_train_log"):
+    # TensorFlow is only imported if the TensorFlow graph is needed
+    from surrogate_model import FCNN, LinearModel
+    model_type = get_model_type(log_dir, surrogate_log_dir)
+    if model_type == "FullyConnectedNN":
+        return FCNN()
+    return LinearModel()
+
+
+def get_jacobian_op(model):
+    """
+    (batch, num_outputs, num_inputs) jacobian of the model output with respect
+    to its input. The gradient ops are built on the first call only and kept
+    on the model.
+    """
+    import tensorflow as tf
+    if getattr(model, "jacobian_op", None) is None:
+        num_outputs = model.output.shape[-1]
+        model.jacobian_op = tf.stack([
+            tf.gradients(model.output[:, i], model.input)[0]
+            for i in range(num_outputs)
+        ], axis=1)
+    return model.jacobian_op
 
 
 def calc_jacobian_matrix(model, x, sess):
     """
-    Calculates the jacobian matrix of the model with input x.
+    Calculates the jacobian matrix of the model for every row of x in a
+    single run, returned as a (batch, num_outputs, num_inputs) array.
+    """
+    return sess.run(get_jacobian_op(model), feed_dict={model.input: x})
+
+
+class TFSurrogate:
+    """
+    TensorFlow graph of a surrogate model restored once in a session, with the
+    same interface as numpy_surrogate.SurrogateMLP.
+    """
+    def __init__(self, model, model_checkpoint):
+        import tensorflow as tf
+        self.model = model
+        get_jacobian_op(model)
+        self.sess = tf.compat.v1.Session()
+        saver = tf.compat.v1.train.Saver()
+        saver.restore(self.sess, model_checkpoint)
+
+    def forward(self, x):
+        return self.sess.run(self.model.output,
+                             feed_dict={self.model.input: x})
+
+    def jacobian(self, x):
+        return calc_jacobian_matrix(self.model, x, self.sess)
+
+
+def load_surrogate(log_dir,
+                   surrogate_log_dir="surrogate_train_log",
+                   backend="numpy"):
+    """
+    Latest surrogate model of the experiment in `log_dir`, providing batched
+    `forward(x)` and `jacobian(x)`.
+
+    Args:
+        backend: "numpy" reads the weights from the checkpoint without
+            TensorFlow, "tf" restores the TensorFlow graph.
     """
-    jacobian_matrix = []
-    for i in range(3):
-        grad = tf.gradients(model.output[:, i], model.input)
-        gradients = sess.run(grad, feed_dict={model.input: x})
-        ori_shape = gradients[0].shape
-        new_shape = (ori_shape[0], 1, *ori_shape[1:])
-        curr_grad = gradients[0].reshape(new_shape)
-        jacobian_matrix.append(curr_grad)
-
-    jacobian_matrix = np.concatenate(jacobian_matrix, axis=1)
-    return jacobian_matrix
+    model_checkpoint = get_latest_model_checkpoint(log_dir, surrogate_log_dir)
+    if backend == "numpy":
+        # make sure the experiment has a supported model
+        get_model_type(log_dir, surrogate_log_dir)
+        return SurrogateMLP.from_checkpoint(model_checkpoint)
+    elif backend == "tf":
+        model = build_model(log_dir, surrogate_log_dir)
+        return TFSurrogate(model, model_checkpoint)
+    raise ValueError(f"Unsupported backend {backend}.")
+
+
+def get_orders_from_jacobian(jacobian_matrix, x):
+    """Card order of every row of x from a batch of jacobian matrices."""
+    card_orders = []
+    for i in range(len(x)):
+        card_names_by_pw, _, _ = get_order_from_jacobian(
+            jacobian_matrix[i:i + 1], x[i:i + 1])
+        card_orders.append(card_names_by_pw)
+    return card_orders
 
 
 def get_order_from_jacobian(jacobian_matrix, x):
@@ -0,0 +1,218 @@
+"""
+NumPy implementation of the surrogate models of surrogate_model.py.
+
+The weights are read straight from the model.ckpt checkpoints written by the
+surrogate model (SurrogateModel/src/Surrogate/SurrogateBaseModel.cs), so
+evaluating the surrogate or its jacobian does not need TensorFlow.
+
+Both FullyConnectedNN and LinearModel are chains of fully connected layers
+fc1, fc2, ... with an elu activation between two layers, which is what
+SurrogateMLP computes.
+"""
+import struct
+import numpy as np
+
+# magic number at the end of the SSTable of the checkpoint index
+TABLE_MAGIC = 0xdb4775248b80fb57
+TABLE_FOOTER_SIZE = 48
+
+# TensorFlow DataType enum -> numpy dtype
+TF_DTYPES = {
+    1: np.float32,
+    2: np.float64,
+    3: np.int32,
+    4: np.uint8,
+    6: np.int8,
+    9: np.int64,
+    10: np.bool_,
+}
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _parse_proto(buf):
+    """
+    Parse a serialized protobuf message into {field number: [values]}.
+    Length delimited fields are returned as bytes.
+    """
+    fields = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire_type == 5:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}.")
+        fields.setdefault(field, []).append(value)
+    return fields
+
+
+def _read_block(buf, handle):
+    offset, pos = _read_varint(handle, 0)
+    size, _ = _read_varint(handle, pos)
+    compression = buf[offset + size]
+    if compression != 0:
+        raise ValueError("Compressed checkpoint index is not supported.")
+    return buf[offset:offset + size]
+
+
+def _iter_block(block):
+    """Yield the (key, value) entries of an SSTable block."""
+    num_restarts, = struct.unpack_from("<I", block, len(block) - 4)
+    end = len(block) - 4 - 4 * num_restarts
+    pos = 0
+    key = b""
+    while pos < end:
+        shared, pos = _read_varint(block, pos)
+        non_shared, pos = _read_varint(block, pos)
+        value_length, pos = _read_varint(block, pos)
+        key = key[:shared] + block[pos:pos + non_shared]
+        pos += non_shared
+        yield key, block[pos:pos + value_length]
+        pos += value_length
+
+
+def _read_index(index_file):
+    with open(index_file, "rb") as f:
+        buf = f.read()
+    footer = buf[-TABLE_FOOTER_SIZE:]
+    magic, = struct.unpack_from("<Q", footer, TABLE_FOOTER_SIZE - 8)
+    if magic != TABLE_MAGIC:
+        raise ValueError(f"{index_file} is not a checkpoint index.")
+
+    # skip the metaindex handle, then read the index handle
+    _, pos = _read_varint(footer, 0)
+    _, pos = _read_varint(footer, pos)
+    index_handle = footer[pos:]
+
+    entries = {}
+    for _, data_handle in _iter_block(_read_block(buf, index_handle)):
+        for key, value in _iter_block(_read_block(buf, data_handle)):
+            entries[key.decode()] = value
+    return entries
+
+
+def read_checkpoint(model_checkpoint):
+    """
+    Read every tensor of a TensorFlow (V2) checkpoint.
+
+    Args:
+        model_checkpoint: checkpoint prefix, e.g. .../model0/model.ckpt
+
+    Returns:
+        dict of variable name (e.g. "fc1/w") -> numpy array
+    """
+    entries = _read_index(model_checkpoint + ".index")
+    header = _parse_proto(entries.pop(""))
+    num_shards = header.get(1, [1])[0]
+
+    shards = {}
+    tensors = {}
+    for name, entry in entries.items():
+        entry = _parse_proto(entry)
+        dtype = TF_DTYPES[entry.get(1, [0])[0]]
+        shape = ()
+        if 2 in entry:
+            dims = _parse_proto(entry[2][0]).get(2, [])
+            shape = tuple(_parse_proto(dim).get(1, [0])[0] for dim in dims)
+        shard_id = entry.get(3, [0])[0]
+        offset = entry.get(4, [0])[0]
+        size = entry.get(5, [0])[0]
+
+        if shard_id not in shards:
+            data_file = "{}.data-{:05d}-of-{:05d}".format(
+                model_checkpoint, shard_id, num_shards)
+            with open(data_file, "rb") as f:
+                shards[shard_id] = f.read()
+        tensors[name] = np.frombuffer(shards[shard_id], dtype=dtype,
+                                      count=size // np.dtype(dtype).itemsize,
+                                      offset=offset).reshape(shape)
+    return tensors
+
+
+def elu(x, alpha=1.0):
+    return np.where(x >= 0, x, alpha * (np.exp(np.minimum(x, 0)) - 1))
+
+
+def elu_derivative(x, alpha=1.0):
+    return np.where(x >= 0, 1.0, alpha * np.exp(np.minimum(x, 0)))
+
+
+class SurrogateMLP:
+    """
+    Chain of fully connected layers with elu activations in between, i.e.
+    FullyConnectedNN (four layers) or LinearModel (one layer).
+    """
+    def __init__(self, weights, biases):
+        self.weights = [np.asarray(w, dtype=np.float64) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float64) for b in biases]
+
+    @classmethod
+    def from_checkpoint(cls, model_checkpoint):
+        tensors = read_checkpoint(model_checkpoint)
+        weights = []
+        biases = []
+        while f"fc{len(weights) + 1}/w" in tensors:
+            weights.append(tensors[f"fc{len(weights) + 1}/w"])
+            biases.append(tensors[f"fc{len(biases) + 1}/b"])
+        if not weights:
+            raise ValueError(
+                f"No fully connected layer found in {model_checkpoint}.")
+        return cls(weights, biases)
+
+    @property
+    def num_inputs(self):
+        return self.weights[0].shape[0]
+
+    @property
+    def num_outputs(self):
+        return self.weights[-1].shape[1]
+
+    def _pre_activations(self, x):
+        pre_activations = []
+        out = np.asarray(x, dtype=np.float64)
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            out = out @ w + b
+            if i < len(self.weights) - 1:
+                pre_activations.append(out)
+                out = elu(out)
+        return pre_activations, out
+
+    def forward(self, x):
+        """(batch, num_outputs) output for a (batch, num_inputs) input."""
+        return self._pre_activations(x)[1]
+
+    def jacobian(self, x):
+        """
+        (batch, num_outputs, num_inputs) jacobian of the output with respect
+        to the input, computed by backpropagating through the layers.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        pre_activations, _ = self._pre_activations(x)
+        jacobian = np.broadcast_to(self.weights[-1].T,
+                                   (len(x), *self.weights[-1].T.shape))
+        for w, z in zip(reversed(self.weights[:-1]),
+                        reversed(pre_activations)):
+            jacobian = (jacobian * elu_derivative(z)[:, None, :]) @ w.T
+        return np.array(jacobian)
@@ -0,0 +1,201 @@
+"""
+Loader of the results of the remove card analysis (Analysis/src/
+RemoveCardAnalysisManager.cs).
+
+For every elite, the analysis writes one TOML file per removed card in
+remove_card_analysis/real_sim/elite#<ID>/ (results of the games). The
+predictions of the surrogate model are written to
+remove_card_analysis/surrogate_sim.csv, one row per elite and removed card,
+and to one TOML file per removed card in
+remove_card_analysis/surrogate_sim/elite#<ID>/ by older analyses (or with
+--surrogate-toml). Only the AverageHealthDifference of each file is needed, so
+the files are scanned line by line for it instead of being fully parsed, elite
+directories are loaded by a pool of processes, and the results are
+consolidated into a single table cached in the analysis directory.
+"""
+import os
+import json
+import multiprocessing
+import toml
+import pandas as pd
+
+ANALYSIS_DIR = "remove_card_analysis"
+REAL_SIM_DIR = "real_sim"
+SURR_SIM_DIR = "surrogate_sim"
+SURR_SIM_FILE = "surrogate_sim.csv"
+CACHE_FILE = "results.csv"
+CACHE_META_FILE = "results_meta.json"
+CACHE_VERSION = 3
+
+RESULT_COLUMNS = [
+    "Elite",
+    "CardRemoved",
+    "RealAverageHealthDifference",
+    "SurrogateAverageHealthDifference",
+]
+
+# (table, key) of the AverageHealthDifference in the result files
+REAL_SIM_FIELD = ("OverallStats", "AverageHealthDifference")
+SURR_SIM_FIELD = ("", "AverageHealthDifference")
+
+
+def read_toml_field(toml_file, table, key):
+    """
+    Value of `key` of `table` ("" being the root table) of a TOML file,
+    without parsing the rest of the file. Returns None if not found.
+    """
+    curr_table = ""
+    with open(toml_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("["):
+                curr_table = line.strip("[]").strip()
+            elif curr_table == table and line.split("=", 1)[0].strip() == key:
+                return toml.loads(line)[key]
+    return None
+
+
+def get_card_removed(result_file):
+    """Card removed of a result file named remove_card-<card>.tml"""
+    return "-".join(".".join(result_file.split(".")[:-1]).split("-")[1:])
+
+
+def read_surrogate_results(analysis_dir):
+    """
+    Surrogate predictions of surrogate_sim.csv as
+    {elite ID: {card removed: AverageHealthDifference}}, None if the analysis
+    only wrote TOML files.
+    """
+    surr_sim_file = os.path.join(analysis_dir, SURR_SIM_FILE)
+    if not os.path.isfile(surr_sim_file):
+        return None
+    table = pd.read_csv(surr_sim_file, keep_default_na=False)
+    surr_results = {}
+    for elite_id, card, perf in zip(table["Elite"], table["CardRemoved"],
+                                    table[SURR_SIM_FIELD[1]]):
+        surr_results.setdefault(int(elite_id), {})[card] = perf
+    return surr_results
+
+
+def _load_elite(analysis_dir, elite_dir, surr_results=None):
+    """
+    Rows of an elite. `surr_results` are its surrogate predictions by card
+    removed, read from its TOML files if None.
+    """
+    elite_id = int(elite_dir.split("#")[1])
+    real_sim_elite_dir = os.path.join(analysis_dir, REAL_SIM_DIR, elite_dir)
+    surr_sim_elite_dir = os.path.join(analysis_dir, SURR_SIM_DIR, elite_dir)
+    if surr_results is None and not os.path.isdir(surr_sim_elite_dir):
+        raise ValueError(
+            f"Surrogate simulation result of elite#{elite_id} does not exist.")
+
+    rows = []
+    for result_file in os.listdir(real_sim_elite_dir):
+        card_removed = get_card_removed(result_file)
+        real_perf = read_toml_field(
+            os.path.join(real_sim_elite_dir, result_file), *REAL_SIM_FIELD)
+        if surr_results is not None:
+            surr_perf = surr_results.get(card_removed)
+        else:
+            surr_perf = read_toml_field(
+                os.path.join(surr_sim_elite_dir, result_file),
+                *SURR_SIM_FIELD)
+        rows.append((elite_id, card_removed, real_perf, surr_perf))
+    return rows
+
+
+def _load_elite_task(args):
+    return _load_elite(*args)
+
+
+def _signature(analysis_dir):
+    """
+    Modification time and size of every result file, by elite directory. The
+    adaptive analysis rewrites the result of a deck in place after each round,
+    which does not change the modification time of its directory.
+    """
+    signature = {"version": CACHE_VERSION}
+    for sim_dir in [REAL_SIM_DIR, SURR_SIM_DIR]:
+        if not os.path.isdir(os.path.join(analysis_dir, sim_dir)):
+            continue
+        elites = {}
+        with os.scandir(os.path.join(analysis_dir, sim_dir)) as it:
+            for elite_entry in it:
+                if not elite_entry.is_dir():
+                    continue
+                with os.scandir(elite_entry.path) as files:
+                    elites[elite_entry.name] = sorted(
+                        [entry.name,
+                         entry.stat().st_mtime_ns,
+                         entry.stat().st_size] for entry in files)
+        signature[sim_dir] = elites
+    surr_sim_file = os.path.join(analysis_dir, SURR_SIM_FILE)
+    if os.path.isfile(surr_sim_file):
+        signature[SURR_SIM_FILE] = os.stat(surr_sim_file).st_mtime_ns
+    return signature
+
+
+def _read_cache(analysis_dir, signature):
+    meta_file = os.path.join(analysis_dir, CACHE_META_FILE)
+    if not os.path.isfile(meta_file):
+        return None
+    with open(meta_file, "r") as f:
+        if json.load(f) != signature:
+            return None
+    return pd.read_csv(os.path.join(analysis_dir, CACHE_FILE),
+                       keep_default_na=False)
+
+
+def _write_cache(analysis_dir, signature, results):
+    try:
+        results.to_csv(os.path.join(analysis_dir, CACHE_FILE), index=False)
+        with open(os.path.join(analysis_dir, CACHE_META_FILE), "w") as f:
+            json.dump(signature, f)
+    except OSError as e:
+        print(f"Could not cache remove card analysis results: {e}")
+
+
+def load_remove_card_results(log_dir, n_jobs=-1, use_cache=True):
+    """
+    Results of the remove card analysis of an experiment, one row per elite
+    and removed card, with the columns RESULT_COLUMNS.
+
+    Args:
+        log_dir: experiment log directory.
+        n_jobs: number of processes parsing the elite directories, -1 to use
+            all cores.
+        use_cache: read/write the consolidated table cached in the remove
+            card analysis directory. The table is rebuilt whenever a result
+            file changes.
+    """
+    analysis_dir = os.path.join(log_dir, ANALYSIS_DIR)
+    if not os.path.isdir(analysis_dir):
+        raise ValueError("Remove card analysis result directory not found")
+
+    signature = _signature(analysis_dir)
+    if use_cache:
+        results = _read_cache(analysis_dir, signature)
+        if results is not None:
+            return results
+
+    surr_results = read_surrogate_results(analysis_dir)
+    tasks = []
+    for elite_dir in os.listdir(os.path.join(analysis_dir, REAL_SIM_DIR)):
+        elite_surr_results = None
+        if surr_results is not None:
+            elite_surr_results = surr_results.get(
+                int(elite_dir.split("#")[1]), {})
+        tasks.append((analysis_dir, elite_dir, elite_surr_results))
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+    if n_jobs > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(n_jobs, len(tasks))) as pool:
+            elite_rows = pool.map(_load_elite_task, tasks)
+    else:
+        elite_rows = map(_load_elite_task, tasks)
+
+    results = pd.DataFrame([row for rows in elite_rows for row in rows],
+                           columns=RESULT_COLUMNS)
+    if use_cache:
+        _write_cache(analysis_dir, signature, results)
+    return results
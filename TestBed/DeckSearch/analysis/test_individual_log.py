@@ -0,0 +1,22 @@
+"""
+Checks of individual_log.py, run with `python -m pytest` from this directory.
+"""
+from individual_log import load_individual_log
+
+CARD_INDEX = {"Backstab": 0, "Eviscerate": 1}
+
+
+def test_load_log_with_repeated_id(tmp_path):
+    # individual 1 was redispatched and its old worker returned as well
+    (tmp_path / "individual_log.csv").write_text(
+        "Individual,Fitness,Deck\n"
+        "0,1.5,Backstab*Backstab\n"
+        "1,2.5,Backstab*Eviscerate\n"
+        "1,3.5,Eviscerate*Eviscerate\n")
+
+    for _ in range(2):  # from the csv, then from the cache
+        individual_log = load_individual_log(str(tmp_path), CARD_INDEX)
+        assert len(individual_log) == 2
+        assert individual_log.get(1, "Fitness") == 2.5
+        assert individual_log.deck(1) == ["Backstab", "Eviscerate"]
+        assert individual_log.rows_of([1, 0]).tolist() == [1, 0]
@@ -1,11 +1,16 @@
 CONFIG="$1"
 NUM_WORKERS="$2"
-PARAM="$3"
 DRY_RUN=""
-if [ "$PARAM" = "DRY_RUN" ]; then
-	echo "Using DRY RUN"
-	DRY_RUN="1"
-fi
+RESUME=""
+for PARAM in "${@:3}"; do
+	if [ "$PARAM" = "DRY_RUN" ]; then
+		echo "Using DRY RUN"
+		DRY_RUN="1"
+	elif [ "$PARAM" = "RESUME" ]; then
+		echo "Resuming from the latest checkpoint of the config"
+		RESUME="--resume"
+	fi
+done
 
 DATE="$(date +'%Y-%m-%d_%H-%M-%S')"
 LOGDIR="./slurm/logs/slurm_${DATE}"
@@ -57,7 +62,7 @@ echo \"========== Setup ==========\"
 
 echo
 echo \"========== Starting Singularity .NET script ==========\"
-singularity exec --cleanenv singularity/ubuntu_dotnet dotnet bin/DeckSearch.dll $CONFIG
+singularity exec --cleanenv singularity/ubuntu_dotnet dotnet bin/DeckSearch.dll $CONFIG $RESUME
 
 echo
 echo \"========== Done ==========\"